@@ -0,0 +1,110 @@
+"""In-memory date -> authorized ids store with write-behind persistence"""
+from __future__ import annotations
+import asyncio
+import atexit
+import json
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set
+
+from wechaty_puppet import get_logger
+
+
+logger = get_logger('AuthorizationStore')
+
+
+def _today() -> str:
+    return datetime.today().strftime('%Y-%m-%d')
+
+
+class AuthorizationStore:
+    """Keep the authorized ids of every date in memory, and write them to the json file behind.
+
+    The file keeps the original format: {"2022-05-03": ["id", "id", ...]}.
+
+    All of the changes happen synchronously in the event loop thread, so the changes from
+    concurrent coroutines are never lost. The writings are debounced by `flush_delay_seconds`,
+    and the file is replaced atomically. The dates before today are pruned since they are expired.
+    """
+    def __init__(self, file: str, flush_delay_seconds: float = 1.0) -> None:
+        self.file = file
+        self.flush_delay_seconds = flush_delay_seconds
+
+        self._dates: Dict[str, Set[str]] = self._load()
+        self._today = ''
+        self._dirty = False
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+        self.prune()
+        atexit.register(self.flush)
+
+    def _load(self) -> Dict[str, Set[str]]:
+        if not os.path.exists(self.file):
+            return {}
+        try:
+            with open(self.file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as error:
+            logger.error(f'can not load the authorization file<{self.file}>: {error}')
+            return {}
+        return {date: set(ids) for date, ids in data.items()}
+
+    def prune(self, today: Optional[str] = None) -> None:
+        """remove the expired dates"""
+        self._today = today or _today()
+        expired = [date for date in self._dates if date < self._today]
+        for date in expired:
+            self._dates.pop(date)
+        if expired:
+            self._mark_dirty()
+
+    def is_valid(self, contact_id: str, date: Optional[str] = None) -> bool:
+        """check if the id is authorized at the date, which is today by default"""
+        today = _today()
+        if today != self._today:
+            self.prune(today)
+        return contact_id in self._dates.get(date or today, ())
+
+    def authorize(self, date: str, contact_ids: Iterable[str]) -> None:
+        """authorize the ids at the date"""
+        self._dates.setdefault(date, set()).update(contact_ids)
+        self._mark_dirty()
+
+    def unauthorize(self, date: str, contact_ids: Iterable[str]) -> None:
+        """remove the authorization of the ids at the date"""
+        if date not in self._dates:
+            return
+        self._dates[date].difference_update(contact_ids)
+        self._mark_dirty()
+
+    def _mark_dirty(self) -> None:
+        self._dirty = True
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # there is no event loop, eg: in scripts, so write it through
+            self.flush()
+            return
+        self._flush_handle = loop.call_later(self.flush_delay_seconds, self.flush)
+
+    def flush(self) -> None:
+        """write the changes to the file atomically"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._dirty:
+            return
+
+        data = {date: sorted(ids) for date, ids in sorted(self._dates.items())}
+        os.makedirs(os.path.dirname(self.file) or '.', exist_ok=True)
+        tmp_file = f'{self.file}.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.file)
+        except OSError as error:
+            logger.error(f'can not save the authorization file<{self.file}>: {error}')
+            return
+        self._dirty = False
@@ -47,6 +47,8 @@ from wechaty import (
 )
 from wechaty_puppet import get_logger
 
+from antigen_bot.name_cache import name_cache
+
 
 logger = get_logger('AntigenBot', 'bot.log')
 
@@ -192,6 +194,7 @@ class AntigenBot(Wechaty):
                 if alias != await contact.alias():
                     try:
                         await contact.alias(alias)
+                        name_cache.invalidate(contact.contact_id)
                         print(f"更新{contact.name}的备注成功!")
                     except Exception:
                         print(f"更新{contact.name}的备注失败~")
@@ -0,0 +1,386 @@
+"""Persistent and resumable broadcast jobs
+
+Every broadcast is stored as a job in a local sqlite file before the first send, with the state of every target.
+The job key is `<plugin>:<message_id>`, so the same message is never broadcast twice, and the unfinished jobs
+are resumed after restarting for the targets which are not sent yet.
+"""
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Union
+
+from wechaty import Contact, FileBox, Message, Room
+from wechaty_puppet import get_logger
+
+from antigen_bot.delivery import BroadcastRecord, delivery_tracker
+from antigen_bot.media_cache import MediaFile, media_cache
+from antigen_bot.pacer import AdaptivePacer, send_pacer
+
+
+logger = get_logger('Broadcaster')
+
+JOB_DB_FILE = '.wechaty/broadcast_jobs.db'
+
+PAYLOAD_TEXT = 'text'
+PAYLOAD_FILE = 'file'
+PAYLOAD_FORWARD = 'forward'
+
+STATE_PENDING = 'pending'
+STATE_SENT = 'sent'
+STATE_FAILED = 'failed'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    job_key TEXT PRIMARY KEY,
+    plugin TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    reply_id TEXT NOT NULL,
+    reply_type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS targets (
+    job_key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    target_id TEXT NOT NULL,
+    target_type TEXT NOT NULL,
+    target_name TEXT NOT NULL,
+    state TEXT NOT NULL,
+    error TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (job_key, target_id)
+);
+CREATE INDEX IF NOT EXISTS jobs_unfinished ON jobs (plugin, finished_at);
+'''
+
+
+@dataclass
+class BroadcastTarget:
+    """the room or contact to receive the broadcast"""
+    id: str
+    name: str = ''
+    type: str = 'Room'
+
+
+@dataclass
+class BroadcastJob:
+    """the broadcast with its pending targets"""
+    key: str
+    plugin: str
+    message_id: str
+    reply_id: str
+    reply_type: str
+    payload: Dict[str, Any]
+    targets: List[BroadcastTarget] = field(default_factory=list)
+    finished: bool = False
+
+
+def make_job_key(plugin: str, message_id: str) -> str:
+    """the idempotency key of the broadcast"""
+    return f'{plugin}:{message_id}'
+
+
+class BroadcastJobStore:
+    """store the broadcast jobs in sqlite, the finished jobs are removed after `keep_seconds`"""
+    _instance: Optional[BroadcastJobStore] = None
+
+    def __init__(self, db_file: str = JOB_DB_FILE, keep_seconds: float = 7 * 24 * 3600) -> None:
+        self.db_file = db_file
+        self.keep_seconds = keep_seconds
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def instance(cls) -> BroadcastJobStore:
+        """singleton pattern for BroadcastJobStore"""
+        if cls._instance is None:
+            cls._instance = BroadcastJobStore()
+        return cls._instance
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """open the database when it's used for the first time"""
+        if self._connection is None:
+            directory = os.path.dirname(self.db_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.db_file)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+            self.prune()
+        return self._connection
+
+    def close(self) -> None:
+        """close the database"""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def prune(self, now: Optional[float] = None) -> None:
+        """remove the expired finished jobs"""
+        expired_at = (now or time.time()) - self.keep_seconds
+        with self.connection as connection:
+            connection.execute(
+                'DELETE FROM targets WHERE job_key IN '
+                '(SELECT job_key FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?)',
+                (expired_at,)
+            )
+            connection.execute('DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?', (expired_at,))
+
+    def create(
+        self,
+        plugin: str,
+        message_id: str,
+        reply_to: Union[Room, Contact],
+        payload: Dict[str, Any],
+        targets: Sequence[BroadcastTarget]
+    ) -> Optional[BroadcastJob]:
+        """create the job with all of the targets pending
+
+        Returns:
+            Optional[BroadcastJob]: None if the job of the message already exists
+        """
+        key = make_job_key(plugin, message_id)
+        reply_type = 'Room' if isinstance(reply_to, Room) else 'Contact'
+        reply_id = reply_to.room_id if isinstance(reply_to, Room) else reply_to.contact_id
+        try:
+            with self.connection as connection:
+                connection.execute(
+                    'INSERT INTO jobs (job_key, plugin, message_id, reply_id, reply_type, payload, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (key, plugin, message_id, reply_id, reply_type, json.dumps(payload, ensure_ascii=False), time.time())
+                )
+                connection.executemany(
+                    'INSERT OR IGNORE INTO targets (job_key, position, target_id, target_type, target_name, state) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    [
+                        (key, position, target.id, target.type, target.name, STATE_PENDING)
+                        for position, target in enumerate(targets)
+                    ]
+                )
+        except sqlite3.IntegrityError:
+            logger.warning(f'broadcast job<{key}> already exists')
+            return None
+        return self.get(key)
+
+    def get(self, key: str) -> Optional[BroadcastJob]:
+        """get the job with the pending targets"""
+        row = self.connection.execute(
+            'SELECT job_key, plugin, message_id, reply_id, reply_type, payload, finished_at FROM jobs WHERE job_key = ?',
+            (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        targets = [
+            BroadcastTarget(id=target_id, name=target_name, type=target_type)
+            for target_id, target_name, target_type in self.connection.execute(
+                'SELECT target_id, target_name, target_type FROM targets '
+                'WHERE job_key = ? AND state = ? ORDER BY position',
+                (key, STATE_PENDING)
+            )
+        ]
+        return BroadcastJob(
+            key=row[0], plugin=row[1], message_id=row[2], reply_id=row[3], reply_type=row[4],
+            payload=json.loads(row[5]), targets=targets, finished=row[6] is not None,
+        )
+
+    def get_unfinished(self, plugin: str) -> List[BroadcastJob]:
+        """get the unfinished jobs of the plugin, the oldest first"""
+        keys = [
+            key for key, in self.connection.execute(
+                'SELECT job_key FROM jobs WHERE plugin = ? AND finished_at IS NULL ORDER BY created_at',
+                (plugin,)
+            )
+        ]
+        return [job for job in map(self.get, keys) if job is not None]
+
+    def mark(self, key: str, target_id: str, state: str, error: str = '') -> None:
+        """save the state of the target right after it's sent"""
+        with self.connection as connection:
+            connection.execute(
+                'UPDATE targets SET state = ?, error = ? WHERE job_key = ? AND target_id = ?',
+                (state, error, key, target_id)
+            )
+
+    def finish(self, key: str) -> None:
+        """mark the job as finished"""
+        with self.connection as connection:
+            connection.execute('UPDATE jobs SET finished_at = ? WHERE job_key = ?', (time.time(), key))
+
+
+def file_payload(media_file: MediaFile, message_id: str) -> Dict[str, Any]:
+    """the payload to say the media file"""
+    return dict(kind=PAYLOAD_FILE, path=media_file.path, name=media_file.name, message_id=message_id)
+
+
+def text_payload(text: str) -> Dict[str, Any]:
+    """the payload to say the text"""
+    return dict(kind=PAYLOAD_TEXT, text=text)
+
+
+def forward_payload(message_id: str) -> Dict[str, Any]:
+    """the payload to forward the message"""
+    return dict(kind=PAYLOAD_FORWARD, message_id=message_id)
+
+
+class UploadOnceFile:
+    """send the file to the first target, and forward the sent message to the other targets
+
+    So the bytes are uploaded once instead of once per target. It falls back to uploading when the puppet
+    doesn't return the sent message or the forwarding fails.
+    """
+    def __init__(self, file_box: FileBox, enabled: bool = True) -> None:
+        self.file_box = file_box
+        self.enabled = enabled
+        self._sent: Optional[Message] = None
+        self.uploads = 0
+        self.forwards = 0
+
+    async def __call__(self, target: Union[Room, Contact]) -> None:
+        if self._sent is not None:
+            try:
+                await self._sent.forward(target)
+                self.forwards += 1
+                return
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning(f'can not forward the sent file<{self.file_box.name}>, upload it again: {error}')
+                self._sent = None
+
+        sent = await target.say(self.file_box)
+        self.uploads += 1
+        if self.enabled and isinstance(sent, Message):
+            self._sent = sent
+
+
+class Broadcaster:
+    """run the broadcast jobs of the plugin"""
+    def __init__(
+        self,
+        plugin: str,
+        store: Optional[BroadcastJobStore] = None,
+        pacer: Optional[AdaptivePacer] = None,
+        upload_once: bool = True,
+    ) -> None:
+        self.plugin = plugin
+        self.store = store or broadcast_job_store
+        self.pacer = pacer or send_pacer
+        self.upload_once = upload_once
+        self._running: Set[str] = set()
+
+    async def _load_message(self, bot: Any, message_id: str) -> Message:
+        msg = bot.Message.load(message_id)
+        await msg.ready()
+        return msg
+
+    async def _build_send(
+        self, bot: Any, payload: Dict[str, Any], msg: Optional[Message] = None
+    ) -> Callable[[Union[Room, Contact]], Awaitable]:
+        """build the send function from the payload, which loads the message or file at most once"""
+        kind = payload['kind']
+        if msg is not None and msg.message_id != payload.get('message_id'):
+            msg = None
+        if kind == PAYLOAD_TEXT:
+            return lambda target: target.say(payload['text'])
+
+        if kind == PAYLOAD_FILE:
+            if os.path.exists(payload['path']):
+                file_box = FileBox.from_file(payload['path'], name=payload['name'])
+            else:
+                # the file is evicted from the media cache, so download it again
+                msg = msg or await self._load_message(bot, payload['message_id'])
+                file_box = await media_cache.get_file_box(msg)
+            return UploadOnceFile(file_box, enabled=self.upload_once)
+
+        if kind == PAYLOAD_FORWARD:
+            msg = msg or await self._load_message(bot, payload['message_id'])
+            return msg.forward
+
+        raise ValueError(f'unknown broadcast payload<{kind}>')
+
+    def _load_target(self, bot: Any, target_id: str, target_type: str) -> Union[Room, Contact]:
+        if target_type == 'Room':
+            return bot.Room.load(target_id)
+        return bot.Contact.load(target_id)
+
+    async def submit(
+        self,
+        bot: Any,
+        msg: Message,
+        reply_to: Union[Room, Contact],
+        payload: Dict[str, Any],
+        targets: Sequence[BroadcastTarget],
+    ) -> Optional[BroadcastRecord]:
+        """store the job of the message and run it
+
+        Returns:
+            Optional[BroadcastRecord]: None if the message has been broadcast
+        """
+        job = self.store.create(self.plugin, msg.message_id, reply_to, payload, targets)
+        if job is None:
+            return None
+        return await self.run(bot, job, msg=msg)
+
+    async def run(self, bot: Any, job: BroadcastJob, msg: Optional[Message] = None) -> BroadcastRecord:
+        """send to the pending targets of the job, and save the state of every target
+
+        Returns:
+            BroadcastRecord: the receipts of the sends
+        """
+        self._running.add(job.key)
+        try:
+            return await self._run(bot, job, msg)
+        finally:
+            self._running.discard(job.key)
+
+    async def _run(self, bot: Any, job: BroadcastJob, msg: Optional[Message]) -> BroadcastRecord:
+        record = delivery_tracker.start(self.plugin, job.message_id, len(job.targets))
+        try:
+            send = await self._build_send(bot, job.payload, msg)
+        except Exception as error:  # pylint: disable=broad-except
+            # the message can not be loaded any more, so the job will never succeed
+            logger.error(f'can not load the payload of broadcast job<{job.key}>: {error}')
+            for target in job.targets:
+                record.fail(target.id, target.name, f'{type(error).__name__}: {error}')
+                self.store.mark(job.key, target.id, STATE_FAILED, str(error))
+            self.store.finish(job.key)
+            record.finish()
+            return record
+
+        for target in job.targets:
+            conversation = self._load_target(bot, target.id, target.type)
+            await self.pacer.wait()
+            success = await record.deliver(target.id, target.name, lambda conversation=conversation: send(conversation))
+            attempt = record.attempts[-1]
+            self.pacer.record(attempt.seconds, success)
+            self.store.mark(job.key, target.id, STATE_SENT if success else STATE_FAILED, attempt.error)
+
+        self.store.finish(job.key)
+        record.finish()
+        logger.info(
+            f'broadcast job<{job.key}> sent<{len(record.sent)}/{record.total_targets}> '
+            f'speed<{record.sends_per_minute:.1f}/min> gap<{self.pacer.gap_seconds:.2f}s>'
+        )
+        return record
+
+    async def resume(self, bot: Any) -> List[BroadcastRecord]:
+        """resume the unfinished jobs of the plugin, and send the summary to the admin"""
+        records = []
+        for job in self.store.get_unfinished(self.plugin):
+            if job.key in self._running:
+                continue
+            logger.info(f'resume broadcast job<{job.key}> with pending targets<{len(job.targets)}>')
+            record = await self.run(bot, job)
+            records.append(record)
+            try:
+                reply_to = self._load_target(bot, job.reply_id, job.reply_type)
+                await reply_to.say('【断点续发】\n' + record.summary())
+            except Exception as error:  # pylint: disable=broad-except
+                logger.error(f'can not send the summary of broadcast job<{job.key}>: {error}')
+        return records
+
+
+broadcast_job_store = BroadcastJobStore.instance()
@@ -0,0 +1,99 @@
+"""Index the rooms by (community pre_fix, building number) from the room directory"""
+from __future__ import annotations
+import re
+from typing import Dict, Iterable, Optional, Pattern, Set, Tuple
+
+from wechaty import Room
+
+from antigen_bot.room_directory import RoomDirectory, room_directory
+
+
+_DIGITS = re.compile(r'\d+')
+
+BuildingKey = Tuple[str, str]
+
+
+class BuildingIndex:
+    """Map (pre_fix, building number) to the room ids, eg: ('嘉怡', '3') -> {'嘉怡小区3号楼' room id}.
+
+    A room is indexed under the number when the topic matches `{pre_fix}.*\\D(number)\\D.*`, which is the rule of
+    OnCallNoticePlugin. The topics are parsed once when the rooms are added or renamed in the room directory,
+    so resolving the buildings is a union of dict lookups.
+    """
+    _instance: Optional[BuildingIndex] = None
+
+    def __init__(self, directory: Optional[RoomDirectory] = None) -> None:
+        self.directory = directory if directory is not None else room_directory
+        self._prefixes: Dict[str, Pattern] = {}
+        self._room_ids: Dict[BuildingKey, Set[str]] = {}
+        self._keys_by_room: Dict[str, Set[BuildingKey]] = {}
+        self.directory.add_listener(self.on_room_changed)
+
+    @classmethod
+    def instance(cls) -> BuildingIndex:
+        """singleton pattern for BuildingIndex"""
+        if cls._instance is None:
+            cls._instance = BuildingIndex()
+        return cls._instance
+
+    @staticmethod
+    def parse_numbers(pattern: Pattern, topic: str) -> Set[str]:
+        """get the building numbers after the pre_fix, which are surrounded by the non-digit characters"""
+        match = pattern.search(topic)
+        if match is None:
+            return set()
+        return {
+            number.group() for number in _DIGITS.finditer(topic, match.end())
+            if number.start() > match.end() and number.end() < len(topic)
+        }
+
+    def add_prefix(self, pre_fix: str) -> None:
+        """index the rooms of the community"""
+        if pre_fix in self._prefixes:
+            return
+        pattern = re.compile(pre_fix)
+        self._prefixes[pre_fix] = pattern
+        for room_id, topic in self.directory.topics.items():
+            self._add_keys(room_id, pre_fix, self.parse_numbers(pattern, topic))
+
+    def _add_keys(self, room_id: str, pre_fix: str, numbers: Iterable[str]) -> None:
+        for number in numbers:
+            key = (pre_fix, number)
+            self._room_ids.setdefault(key, set()).add(room_id)
+            self._keys_by_room.setdefault(room_id, set()).add(key)
+
+    def _remove_room(self, room_id: str) -> None:
+        for key in self._keys_by_room.pop(room_id, ()):
+            room_ids = self._room_ids.get(key)
+            if room_ids is not None:
+                room_ids.discard(room_id)
+                if not room_ids:
+                    self._room_ids.pop(key)
+
+    def on_room_changed(self, room: Room, topic: Optional[str], old_topic: Optional[str]) -> None:
+        """the listener of the room directory"""
+        self._remove_room(room.room_id)
+        if topic is None:
+            return
+        for pre_fix, pattern in self._prefixes.items():
+            self._add_keys(room.room_id, pre_fix, self.parse_numbers(pattern, topic))
+
+    def find(self, pre_fix: str, numbers: Iterable[str]) -> Set[str]:
+        """get the ids of the rooms with any of the building numbers"""
+        self.add_prefix(pre_fix)
+        room_ids: Set[str] = set()
+        for number in numbers:
+            room_ids.update(self._room_ids.get((pre_fix, number), ()))
+        # the rooms which are left before relogin are not removed by the events
+        return {room_id for room_id in room_ids if room_id in self.directory}
+
+    def scan(self, pre_fix: str, words: Iterable[str]) -> Set[str]:
+        """match the topics in memory with the words which are not building numbers, eg: 商铺"""
+        words = [re.escape(word) for word in words]
+        if not words:
+            return set()
+        regex = re.compile(r"{0}.*\D({1})\D.*".format(pre_fix, "|".join(words)))
+        return {room_id for room_id, topic in list(self.directory.topics.items()) if regex.search(topic)}
+
+
+building_index = BuildingIndex.instance()
@@ -0,0 +1,165 @@
+"""Track the outbound sends of every broadcast"""
+from __future__ import annotations
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, List, Optional
+
+from wechaty_puppet import get_logger
+
+
+logger = get_logger('DeliveryTracker')
+
+_broadcast_ids = itertools.count(1)
+
+
+@dataclass
+class DeliveryAttempt:
+    """one send to the target"""
+    target_id: str
+    target_name: str
+    started_at: float
+    finished_at: float = 0.0
+    success: bool = False
+    error: str = ''
+
+    @property
+    def seconds(self) -> float:
+        """the latency of the send"""
+        return max(self.finished_at - self.started_at, 0.0)
+
+    def to_dict(self) -> dict:
+        """get the dict of attempt"""
+        return dict(
+            target_id=self.target_id,
+            target_name=self.target_name,
+            success=self.success,
+            error=self.error,
+            ms=round(self.seconds * 1000, 3),
+        )
+
+
+@dataclass
+class BroadcastRecord:
+    """the receipts of one broadcast"""
+    plugin: str
+    message_id: str
+    total_targets: int
+    broadcast_id: int = field(default_factory=lambda: next(_broadcast_ids))
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    attempts: List[DeliveryAttempt] = field(default_factory=list)
+
+    async def deliver(self, target_id: str, target_name: str, send: Callable[[], Awaitable[Any]]) -> bool:
+        """run the send to the target and record the result, the failure will not be raised
+
+        Returns:
+            bool: if the send succeeds
+        """
+        attempt = DeliveryAttempt(target_id=target_id, target_name=target_name, started_at=time.time())
+        self.attempts.append(attempt)
+        try:
+            await send()
+            attempt.success = True
+        except Exception as error:  # pylint: disable=broad-except
+            attempt.error = f'{type(error).__name__}: {error}'
+            logger.error(f'broadcast<{self.broadcast_id}> failed to send to <{target_name}>: {attempt.error}')
+        attempt.finished_at = time.time()
+        return attempt.success
+
+    def fail(self, target_id: str, target_name: str, error: str) -> None:
+        """record the target which can not be sent at all"""
+        now = time.time()
+        self.attempts.append(DeliveryAttempt(
+            target_id=target_id, target_name=target_name, started_at=now, finished_at=now, error=error
+        ))
+
+    def finish(self) -> None:
+        """mark the broadcast as finished"""
+        self.finished_at = time.time()
+
+    @property
+    def sent(self) -> List[DeliveryAttempt]:
+        """the succeeded sends"""
+        return [attempt for attempt in self.attempts if attempt.success]
+
+    @property
+    def failed(self) -> List[DeliveryAttempt]:
+        """the failed sends"""
+        return [attempt for attempt in self.attempts if not attempt.success]
+
+    @property
+    def seconds(self) -> float:
+        """the duration of the broadcast until now or finished"""
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def sends_per_minute(self) -> float:
+        """the effective throughput of the broadcast"""
+        if not self.attempts or self.seconds <= 0:
+            return 0.0
+        return len(self.attempts) * 60 / self.seconds
+
+    def summary(self) -> str:
+        """the summary of the sent and failed targets for the admin"""
+        sent = sorted(attempt.target_name for attempt in self.sent)
+        failed = sorted(f'{attempt.target_name}（{attempt.error}）' for attempt in self.failed)
+        info = [f'已发送的群<{len(sent)}>:', *sent]
+        if failed:
+            info.extend(['===========', f'未发送的群<{len(failed)}>:', *failed])
+        info.append(f'耗时<{self.seconds:.1f}s>，速度<{self.sends_per_minute:.1f}条/分钟>')
+        return '\n'.join(info)
+
+    def to_dict(self, with_attempts: bool = False) -> dict:
+        """get the dict of broadcast"""
+        data = dict(
+            broadcast_id=self.broadcast_id,
+            plugin=self.plugin,
+            message_id=self.message_id,
+            total_targets=self.total_targets,
+            sent=len(self.sent),
+            failed=len(self.failed),
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            seconds=round(self.seconds, 3),
+            sends_per_minute=round(self.sends_per_minute, 2),
+        )
+        if with_attempts:
+            data['attempts'] = [attempt.to_dict() for attempt in self.attempts]
+        return data
+
+
+class DeliveryTracker:
+    """keep the records of the last `max_records` broadcasts"""
+    _instance: Optional[DeliveryTracker] = None
+
+    def __init__(self, max_records: int = 100) -> None:
+        self.records: Deque[BroadcastRecord] = deque(maxlen=max_records)
+
+    @classmethod
+    def instance(cls) -> DeliveryTracker:
+        """singleton pattern for DeliveryTracker"""
+        if cls._instance is None:
+            cls._instance = DeliveryTracker()
+        return cls._instance
+
+    def start(self, plugin: str, message_id: str, total_targets: int) -> BroadcastRecord:
+        """start to record the broadcast"""
+        record = BroadcastRecord(plugin=plugin, message_id=message_id, total_targets=total_targets)
+        self.records.append(record)
+        return record
+
+    def get(self, broadcast_id: int) -> Optional[BroadcastRecord]:
+        """get the record of broadcast"""
+        for record in self.records:
+            if record.broadcast_id == broadcast_id:
+                return record
+        return None
+
+    def to_dict(self) -> dict:
+        """get the summaries of the recent broadcasts, the latest first"""
+        return dict(broadcasts=[record.to_dict() for record in reversed(self.records)])
+
+
+delivery_tracker = DeliveryTracker.instance()
@@ -1,14 +1,29 @@
 """Define the forward configuration"""
 from __future__ import annotations
-from datetime import datetime
+import asyncio
+from concurrent.futures import Executor
+import inspect
 import os
-from typing import Dict, Optional, List, Set, Tuple, Union
+import pickle
+import unicodedata
+from typing import Any, Callable, Dict, FrozenSet, Mapping, Optional, List, Tuple, Union
 import hashlib
 from dataclasses import dataclass, field
 
 from pandas import DataFrame, read_excel
 from dataclasses_json import dataclass_json
 from wechaty import Contact, Room
+from wechaty_puppet import get_logger
+
+
+logger = get_logger('ForwardConfig')
+
+# the snapshots are saved next to the excel file by default
+SNAPSHOT_DIR_NAME = '.snapshots'
+# the mtime of the missing config file, so the failure is only logged once until the file is created
+MISSING_MTIME = -1.0
+# bump the version when the structure of Conv2ConvsConfig changes
+SNAPSHOT_VERSION = 1
 
 @dataclass_json
 @dataclass
@@ -23,6 +38,30 @@ class Conversation:
         """get the simple info"""
         return f'[{self.type}]\t名称：{self.name}\t\t编号：[{self.id}]'
 
+
+def normalize_target_key(value: Any) -> str:
+    """normalize the number or name of conversation, eg: 3.0 -> '3', '３号楼' -> '3号楼'"""
+    if value is None or value != value:
+        # None or NaN of the empty cell
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return unicodedata.normalize('NFKC', str(value)).strip()
+
+
+TargetIndex = Mapping[str, Tuple[Conversation, ...]]
+
+
+def build_target_index(conversations: List[Conversation]) -> Dict[str, Tuple[Conversation, ...]]:
+    """build the index of number & name -> conversations"""
+    index: Dict[str, List[Conversation]] = {}
+    for conversation in conversations:
+        for key in {normalize_target_key(conversation.no), normalize_target_key(conversation.name)}:
+            if key:
+                index.setdefault(key, []).append(conversation)
+    return {key: tuple(values) for key, values in index.items()}
+
+
 @dataclass_json
 @dataclass
 class Conv2ConvsConfig:
@@ -53,20 +92,20 @@ class Conv2ConvsConfig:
         """
         return self.target_conversations.get(conv_id, [])
 
+    def get_target_index(self) -> TargetIndex:
+        """get the index of number & name -> target conversations, which is built once"""
+        index = self.__dict__.get('_target_index')
+        if index is None:
+            index = self.__dict__['_target_index'] = build_target_index(list(self.target_conversations.values()))
+        return index
+
     def get_names_or_nos(self) -> List[str]:
         """get the names or numbers of the target conversations
 
         Returns:
             List[str]: the names or numbers of the target conversations
         """
-        names_or_nos = set()
-        for conversation in self.target_conversations.values():
-            names_or_nos.add(conversation.name)
-
-        for conversation in self.target_conversations.values():
-            names_or_nos.add(conversation.no)
-
-        return [str(item) for item in names_or_nos]
+        return list(self.get_target_index().keys())
     
     def add_admin(self, conversation: Conversation) -> None:
         """add the conversation to admin conversation
@@ -77,84 +116,308 @@ class Conv2ConvsConfig:
         self.admins[conversation.id] = conversation
 
 
-def load_from_excel(file: str) -> List[Conv2ConvsConfig]:
-    """load the configuration from excel file"""
+def _group_conversations(df: DataFrame) -> Dict[str, Dict[str, Conversation]]:
+    """group the conversations by group_name in one pass over the columns"""
+    groups: Dict[str, Dict[str, Conversation]] = {}
+    columns = [df[column].tolist() for column in ('group_name', 'name', 'id', 'type', 'no')]
+    for group_name, name, conv_id, conv_type, no in zip(*columns):
+        if group_name != group_name:
+            # skip the rows without group_name (NaN)
+            continue
+        groups.setdefault(group_name, {})[str(conv_id)] = Conversation(
+            name=name,
+            id=conv_id,
+            type=conv_type,
+            no=no
+        )
+    return groups
+
+
+def build_configs(group_df: DataFrame, admin_df: DataFrame) -> List[Conv2ConvsConfig]:
+    """build the configuration from the group & admin sheets"""
+    targets = _group_conversations(group_df)
+    admins = _group_conversations(admin_df)
+    return [
+        Conv2ConvsConfig(
+            name=group_name,
+            admins=admins.get(group_name, {}),
+            target_conversations=target_conversations
+        )
+        for group_name, target_conversations in targets.items()
+    ]
+
+
+def _parse_excel(file: str) -> List[Conv2ConvsConfig]:
     # 1. load configuration from excel file
     group_df: DataFrame = read_excel(file, sheet_name='group')
     admin_df: DataFrame = read_excel(file, sheet_name='admins')
 
     # 2. build the configuration
-    configs: List[Conv2ConvsConfig] = []
-    group_names = list(set(group_df.group_name))
-
-    for group_name in group_names:
-        config: Conv2ConvsConfig = Conv2ConvsConfig(name=group_name)
-
-        group_df_group_name = group_df[group_df.group_name == group_name]
-        for _, row in group_df_group_name.iterrows():
-            config.target_conversations[str(row.id)] = Conversation(
-                name=row['name'],
-                id=row['id'],
-                type=row['type'],
-                no=row['no']
-            )
-        admin_df_group_name = admin_df[admin_df.group_name == group_name]
-        for _, row in admin_df_group_name.iterrows():
-            config.admins[str(row.id)] = Conversation(
-                name=row['name'],
-                id=row['id'],
-                type=row['type'],
-                no=row['no']
+    return build_configs(group_df, admin_df)
+
+
+def get_file_hash(file: str) -> str:
+    """get the sha256 of the file content"""
+    with open(file, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def get_snapshot_dir(file: str) -> str:
+    """get the default snapshot directory of the excel file"""
+    return os.path.join(os.path.dirname(os.path.abspath(file)), SNAPSHOT_DIR_NAME)
+
+
+def get_snapshot_file(file: str, snapshot_dir: str = '') -> str:
+    """get the sidecar snapshot file of the excel file, which is in the default snapshot directory if not specified"""
+    snapshot_dir = snapshot_dir or get_snapshot_dir(file)
+    path_hash = hashlib.md5(os.path.abspath(file).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(snapshot_dir, f'{os.path.basename(file)}.{path_hash}.pkl')
+
+
+def load_snapshot(snapshot_file: str, file_hash: str) -> Optional[List[Conv2ConvsConfig]]:
+    """load the parsed configs from snapshot, which is None if it's missing or stale"""
+    try:
+        with open(snapshot_file, 'rb') as f:
+            snapshot = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+    if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('hash') != file_hash:
+        return None
+    return snapshot['configs']
+
+
+def save_snapshot(snapshot_file: str, file_hash: str, configs: List[Conv2ConvsConfig]) -> None:
+    """save the parsed configs into snapshot atomically"""
+    try:
+        os.makedirs(os.path.dirname(snapshot_file) or '.', exist_ok=True)
+        tmp_file = f'{snapshot_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(
+                dict(version=SNAPSHOT_VERSION, hash=file_hash, configs=configs),
+                f, protocol=pickle.HIGHEST_PROTOCOL
             )
-        configs.append(config)
+        os.replace(tmp_file, snapshot_file)
+    except OSError as error:
+        logger.warning(f'can not save the snapshot<{snapshot_file}>: {error}')
+
+
+def load_from_excel(file: str, snapshot_dir: Optional[str] = '') -> List[Conv2ConvsConfig]:
+    """load the configuration from excel file
+
+    The parsed configs are saved into a sidecar snapshot keyed by the hash of the excel file,
+    so the workbook is only parsed when it's changed.
+
+    Args:
+        file (str): the path of excel file
+        snapshot_dir (Optional[str]): the directory of snapshots, empty for the `.snapshots` directory next to
+            the excel file, None to disable the snapshot.
+    """
+    if snapshot_dir is None:
+        return _parse_excel(file)
+
+    file_hash = get_file_hash(file)
+    snapshot_file = get_snapshot_file(file, snapshot_dir)
+    configs = load_snapshot(snapshot_file, file_hash)
+    if configs is None:
+        configs = _parse_excel(file)
+        save_snapshot(snapshot_file, file_hash, configs)
     return configs
 
 
+@dataclass(frozen=True)
+class Receivers:
+    """the receivers of admin conversation"""
+    room_ids: Tuple[str, ...] = ()
+    contact_ids: Tuple[str, ...] = ()
+    config_names: Tuple[str, ...] = ()
+    conversations: Tuple[Conversation, ...] = ()
+    targets: TargetIndex = field(default_factory=dict, compare=False)
+
+    def __bool__(self) -> bool:
+        return len(self.conversations) > 0
+
+    def resolve(self, keys: List[str]) -> List[Conversation]:
+        """get the conversations of the numbers or names with dictionary lookups"""
+        conversations: Dict[int, Conversation] = {}
+        for key in keys:
+            for conversation in self.targets.get(key, ()):
+                conversations.setdefault(id(conversation), conversation)
+        return list(conversations.values())
+
+
+class ReceiverIndex:
+    """the immutable index of admin id -> receivers, which is built once when configs are loaded"""
+    def __init__(self, configs: List[Conv2ConvsConfig]) -> None:
+        conversations: Dict[str, Dict[str, Conversation]] = {}
+        config_names: Dict[str, List[str]] = {}
+        for config in configs:
+            for admin_id in config.admins.keys():
+                conversations.setdefault(admin_id, {}).update(
+                    (str(conversation.id), conversation) for conversation in config.target_conversations.values()
+                )
+                config_names.setdefault(admin_id, []).append(config.name)
+
+        self._receivers: Dict[str, Receivers] = {}
+        for admin_id, targets in conversations.items():
+            self._receivers[admin_id] = Receivers(
+                room_ids=tuple(conv_id for conv_id, conv in targets.items() if conv.type == 'Room'),
+                contact_ids=tuple(conv_id for conv_id, conv in targets.items() if conv.type == 'Contact'),
+                config_names=tuple(config_names[admin_id]),
+                conversations=tuple(targets.values()),
+                targets=build_target_index(list(targets.values())),
+            )
+        self.admin_ids: FrozenSet[str] = frozenset(self._receivers)
+
+    def get(self, admin_id: str) -> Receivers:
+        """get the receivers of admin conversation, which is empty if it's not admin"""
+        return self._receivers.get(str(admin_id), _EMPTY_RECEIVERS)
+
+    def __len__(self) -> int:
+        return len(self._receivers)
+
+
+_EMPTY_RECEIVERS = Receivers()
+
+
+ConfigSnapshot = Tuple[List[Conv2ConvsConfig], ReceiverIndex]
+
+
+def build_config_snapshot(file: str, snapshot_dir: Optional[str] = '') -> ConfigSnapshot:
+    """load the configs and build the index, which runs in the executor"""
+    configs = load_from_excel(file, snapshot_dir)
+    return configs, ReceiverIndex(configs)
+
+
+def _get_conv_id(conv: Union[Contact, Room, str]) -> str:
+    if isinstance(conv, Contact):
+        return conv.contact_id
+    if isinstance(conv, Room):
+        return conv.room_id
+    if isinstance(conv, str):
+        return conv
+    raise TypeError(f'conv type is expected with <Contact, Room, str>, but receive <{type(conv)}>')
+
+
 class ConfigFactory:
-    """Config Factory"""
-    def __init__(self, config_file: str) -> None:
+    """Config Factory
+
+    The configs and the ReceiverIndex built from them are swapped together as one snapshot.
+    The file is only loaded by `reload_async`, which is called by the polling task of ConfigRegistry,
+    so reading configs never touches the file system. The first access in the event loop schedules the loading
+    and gets the empty snapshot until it's ready, and the first access without the loop loads the file in place.
+
+    Args:
+        config_file (str): the path of excel file
+        snapshot_dir (Optional[str]): the directory of snapshots, empty for the `.snapshots` directory next to
+            the excel file, None to disable the snapshot.
+    """
+    def __init__(self, config_file: str, snapshot_dir: Optional[str] = '') -> None:
         self.file = config_file
-        self.mtime = self._get_mtime()
+        self.snapshot_dir = snapshot_dir
+        self.mtime: Optional[float] = None
+        self._failed_mtime: Optional[float] = None
+        self._loading: Optional[asyncio.Task] = None
 
-        self._configs: List[Conv2ConvsConfig] = []
-        self._admin_ids = set()
+        self._snapshot: ConfigSnapshot = ([], ReceiverIndex([]))
     
-    def _get_mtime(self) -> datetime:
-        """get the md5 sum of the configuration file"""
-        return os.path.getmtime(self.file)
+    def _get_mtime(self) -> float:
+        """get the modified time of the configuration file, which is MISSING_MTIME if the file doesn't exist"""
+        try:
+            return os.path.getmtime(self.file)
+        except FileNotFoundError:
+            return MISSING_MTIME
     
     def config_changed(self) -> bool:
         """check that if the config file changes"""
         return self._get_mtime() != self.mtime
 
+    def _get_changed_mtime(self) -> Optional[float]:
+        mtime = self._get_mtime()
+        if mtime in (self.mtime, self._failed_mtime):
+            return None
+        return mtime
+
+    def _on_load_failed(self, mtime: Optional[float], error: Exception) -> None:
+        # the same broken file will not be parsed again until it changes
+        self._failed_mtime = mtime
+        logger.error(f'can not load the config file<{self.file}>, keep the previous config: {error}')
+
+    def reload(self) -> bool:
+        """reload the configuration in the current thread if the file changes
+
+        Returns:
+            bool: if the configuration is reloaded
+        """
+        mtime = None
+        try:
+            mtime = self._get_changed_mtime()
+            if mtime is None:
+                return False
+            snapshot = build_config_snapshot(self.file, self.snapshot_dir)
+        except Exception as error:  # pylint: disable=broad-except
+            self._on_load_failed(mtime, error)
+            return False
+
+        self._snapshot, self.mtime = snapshot, mtime
+        return True
+
+    async def reload_async(self, executor: Optional[Executor] = None) -> bool:
+        """reload the configuration in the executor if the file changes
+
+        The readers keep getting the previous snapshot until the new one is ready.
+
+        Args:
+            executor (Optional[Executor]): the thread or process pool, the default executor of loop if None.
+
+        Returns:
+            bool: if the configuration is reloaded
+        """
+        mtime = None
+        try:
+            mtime = self._get_changed_mtime()
+            if mtime is None:
+                return False
+            loop = asyncio.get_event_loop()
+            snapshot = await loop.run_in_executor(executor, build_config_snapshot, self.file, self.snapshot_dir)
+        except Exception as error:  # pylint: disable=broad-except
+            self._on_load_failed(mtime, error)
+            return False
+
+        self._snapshot, self.mtime = snapshot, mtime
+        return True
+
+    def _get_snapshot(self) -> ConfigSnapshot:
+        if self.mtime is None and self._failed_mtime is None and self._loading is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # nothing is blocked before the event loop runs, eg: constructing the plugins
+                self.reload()
+            else:
+                self._loading = loop.create_task(self.reload_async())
+                self._loading.add_done_callback(self._on_loaded)
+        return self._snapshot
+
+    def _on_loaded(self, task: asyncio.Task) -> None:
+        self._loading = None
+
     def get_configs(self) -> List[Conv2ConvsConfig]:
         """get the instance the configuration"""
-        if not self._configs or self.config_changed():
-            self._configs = load_from_excel(self.file)
-        return self._configs
+        return self._get_snapshot()[0]
+
+    def get_index(self) -> ReceiverIndex:
+        """get the admin id -> receivers index of the configuration"""
+        return self._get_snapshot()[1]
     
-    def get_admin_ids(self) -> Set[str]:
-        # 1. return the cached admin ids
-        if not self.config_changed() and len(self._admin_ids) > 0:
-            return self._admin_ids
-        
-        # 2. load admin ids
-        self._admin_ids.clear()
-        for config in self.get_configs():
-            for admin_id in config.admins.keys():
-                self._admin_ids.add(admin_id)
-            
-        return self._admin_ids
+    def get_admin_ids(self) -> FrozenSet[str]:
+        """get the ids of all admin conversations"""
+        return self.get_index().admin_ids
     
     async def is_admin(self, conv: Union[Contact, Room]) -> bool:
-        admin_ids = self.get_admin_ids()
-        if isinstance(conv, Contact):
-            return conv.contact_id in admin_ids
-        if isinstance(conv, Room):
-            return conv.room_id in admin_ids
-        raise TypeError(f'conv type is expected with <Contact, Room>, but receive <{type(conv)}>')
+        return _get_conv_id(conv) in self.get_admin_ids()
     
-    async def get_receivers(self, conv: Union[Contact, Room, str]) -> Tuple[List[str], List[str]]:
+    async def get_receivers(self, conv: Union[Contact, Room, str]) -> Receivers:
         """get receivers by conv id
 
         Args:
@@ -164,28 +427,96 @@ class ConfigFactory:
                 if is Room, it present the instance of Room
 
         Returns:
-            Tuple[List[str], List[str]]: List[Room], List[Contact]
+            Receivers: the room ids, contact ids, config names and conversations of the admin
         """
-        # 1. init the conv data
-        if isinstance(Contact):
-            conv = conv.contact_id
-        elif isinstance(Room):
-            conv = conv.room_id
-        
-        configs = self.get_configs()
-
-        # 2. get room ids & contact ids
-        room_ids, contact_ids = [], []
-        for config in configs:
-            if config.is_admin(conv):
-                for conversation in config.get_target_conversation(conv):
-                    if conversation.type == 'Contact':
-                        contact_ids.append(conversation.id)
-                    elif conversation.type == 'Room':
-                        room_ids.append(conversation.id)
-    
-        return room_ids, contact_ids
-        
+        return self.get_index().get(_get_conv_id(conv))
+
+
+ConfigListener = Callable[[ConfigFactory], Any]
+
+
+class ConfigRegistry:
+    """share one ConfigFactory per config file in the process
+
+    All of the registered files are watched by one polling task, and the listeners
+    subscribed to a file are notified after it's reloaded.
+    """
+    _instance: Optional[ConfigRegistry] = None
+
+    def __init__(
+        self,
+        poll_interval_seconds: float = 5.0,
+        executor: Optional[Executor] = None,
+        snapshot_dir: Optional[str] = '',
+    ) -> None:
+        self.poll_interval_seconds = poll_interval_seconds
+        self.executor = executor
+        self.snapshot_dir = snapshot_dir
+        self.factories: Dict[str, ConfigFactory] = {}
+        self.listeners: Dict[str, List[ConfigListener]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def instance(cls) -> ConfigRegistry:
+        """singleton pattern for ConfigRegistry"""
+        if cls._instance is None:
+            cls._instance = ConfigRegistry()
+        return cls._instance
+
+    def get_factory(self, config_file: str) -> ConfigFactory:
+        """get the shared ConfigFactory of the config file"""
+        path = os.path.abspath(config_file)
+        factory = self.factories.get(path)
+        if factory is None:
+            factory = self.factories[path] = ConfigFactory(config_file, snapshot_dir=self.snapshot_dir)
+        return factory
+
+    def subscribe(self, config_file: str, listener: ConfigListener) -> ConfigFactory:
+        """notify the listener with the factory after the config file is reloaded"""
+        factory = self.get_factory(config_file)
+        self.listeners.setdefault(os.path.abspath(config_file), []).append(listener)
+        return factory
+
+    async def poll(self) -> List[ConfigFactory]:
+        """reload the changed config files and notify the listeners
+
+        Returns:
+            List[ConfigFactory]: the reloaded factories
+        """
+        reloaded = []
+        for path, factory in list(self.factories.items()):
+            if not await factory.reload_async(self.executor):
+                continue
+
+            logger.info(f'config file<{path}> is reloaded')
+            reloaded.append(factory)
+            for listener in self.listeners.get(path, []):
+                try:
+                    result = listener(factory)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception as error:  # pylint: disable=broad-except
+                    logger.error(f'config listener of <{path}> failed: {error}')
+        return reloaded
+
+    async def _watch(self) -> None:
+        while True:
+            await self.poll()
+            await asyncio.sleep(self.poll_interval_seconds)
+
+    def start(self) -> None:
+        """start the polling task in the running event loop, which is shared by all plugins
+
+        The first polling loads the config files in the executor.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self._watch())
+
+    def stop(self) -> None:
+        """stop the polling task"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
 
-        
-                    
\ No newline at end of file
+config_registry = ConfigRegistry.instance()
@@ -1,26 +1,32 @@
 """Base matcher for finding"""
 from __future__ import annotations
+import asyncio
 import re
+import time
 from re import Pattern
 import json
 import hashlib
 from inspect import isfunction, iscoroutinefunction
 from typing import (
+    Iterable,
     Union,
     List,
     Optional,
-    Literal
+    Literal,
+    Set,
+    Tuple
 )
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from dataclasses_json import dataclass_json
 
-from wechaty import ContactPayload, FileBox
+from wechaty import FileBox
 from wechaty_plugin_contrib.config import (
     Room,
     Contact,
     Message
 )
 
+from antigen_bot.name_cache import name_cache
 
 
 class Conversation:
@@ -47,12 +53,7 @@ class Conversation:
         Returns:
             str: the name of target
         """
-        await self.target.ready()
-        if isinstance(self.target, Contact):
-            payload: ContactPayload = self.target.payload
-            return payload.alias or payload.name
-
-        return self.target.payload.topic
+        return await name_cache.get_name(self.target)
 
     async def say(self, msg: Union[FileBox, Message]):
         """send the message to target
@@ -73,10 +74,19 @@ class MatcherOption:
     def __init__(self, text, type, **kwargs) -> None:
         self.text = text
         self.type = type
+        self._pattern: Optional[Pattern] = None
+        self._md5: Optional[str] = None
 
     text: Optional[str] = None
     type: Literal['id_or_name', 'regex', 'method'] = 'id_or_name'
 
+    @property
+    def pattern(self) -> Pattern:
+        """get the compiled pattern of regex option"""
+        if self._pattern is None:
+            self._pattern = re.compile(self.text)
+        return self._pattern
+
     async def match(self, target: Conversation) -> bool:
         """match the conversation
 
@@ -90,7 +100,7 @@ class MatcherOption:
             return self.text == target.get_id() or self.text == await target.get_name()
         
         if self.type == 'regex':
-            pattern: Pattern = re.Pattern(self.text)
+            pattern: Pattern = self.pattern
             if pattern.match(target.get_id()) is not None:
                 return True
             name = await target.get_name()
@@ -124,8 +134,10 @@ class MatcherOption:
         Returns:
             str: the md5 of matcher option
         """
-        present_str = self.union_str()
-        return hashlib.md5(present_str.encode(encoding='utf-8')).hexdigest()
+        if self._md5 is None:
+            present_str = self.union_str()
+            self._md5 = hashlib.md5(present_str.encode(encoding='utf-8')).hexdigest()
+        return self._md5
     
     def to_dict(self) -> dict:
         """get the dict of matcher option
@@ -140,19 +152,94 @@ class MatcherOption:
         )
 
     def __eq__(self, option: object) -> bool:
-        if not option or isinstance(option, MatcherOption):
+        if not option or not isinstance(option, MatcherOption):
             return False
         return self.union_str() == option.union_str()
 
 
+_UNCOMBINABLE_REGEX: Pattern = re.compile(r'\\[1-9]|\(\?P=|\(\?[aiLmsux]+\)')
+
+
+def compile_regex_options(options: List[MatcherOption]) -> List[Pattern]:
+    """compile the regex options into one alternation pattern
+
+    The patterns with global flags or back references can not be combined,
+    so they are compiled separately.
+    """
+    combinable = [option for option in options if not _UNCOMBINABLE_REGEX.search(option.text)]
+    patterns = [option.pattern for option in options if _UNCOMBINABLE_REGEX.search(option.text)]
+    if len(combinable) == 1:
+        patterns.insert(0, combinable[0].pattern)
+    elif combinable:
+        try:
+            patterns.insert(0, re.compile('|'.join(f'(?:{option.text})' for option in combinable)))
+        except re.error:
+            # eg: the same group name is defined in different patterns
+            patterns = [option.pattern for option in options]
+    return patterns
+
+
+@dataclass
+class MatchResult:
+    """the result of `Matcher.match_many`"""
+    conversations: List[Conversation] = field(default_factory=list)
+    total: int = 0
+    load_seconds: float = 0.0
+    match_seconds: float = 0.0
+
+    @property
+    def targets(self) -> List[Union[Contact, Room]]:
+        """get the matched Contacts or Rooms"""
+        return [conversation.target for conversation in self.conversations]
+
+    @property
+    def ids(self) -> Set[str]:
+        """get the ids of the matched conversations"""
+        return {conversation.get_id() for conversation in self.conversations}
+
+    def __len__(self) -> int:
+        return len(self.conversations)
+
+
 class Matcher:
-    """handle the Conversation Match logic"""
+    """handle the Conversation Match logic
+
+    The options are compiled once into:
+        1. a set of the ids and names of `id_or_name` options
+        2. the alternation pattern of `regex` options
+        3. the `method` options
+    """
     def __init__(self, option: Union[MatcherOption, List[MatcherOption]]) -> None:
-        if isinstance(option, list):
-            self.options = option
+        if isinstance(option, (list, tuple)):
+            self.options: Tuple[MatcherOption, ...] = tuple(option)
         else:
-            self.options = [option]
-    
+            self.options = (option,)
+
+        for matcher_option in self.options:
+            if matcher_option.type not in ('id_or_name', 'regex', 'method'):
+                raise ValueError(
+                    f'{matcher_option.type} is not a valid type, which should be one of [id_or_name, regex, method]'
+                )
+
+        self._ids_or_names: Set[str] = {
+            option.text for option in self.options if option.type == 'id_or_name'
+        }
+        self._patterns: List[Pattern] = compile_regex_options(
+            [option for option in self.options if option.type == 'regex']
+        )
+        self._method_options: List[MatcherOption] = [
+            option for option in self.options if option.type == 'method'
+        ]
+        self._md5: Optional[str] = None
+
+    def _match_text(self, text: str) -> bool:
+        if text in self._ids_or_names:
+            return True
+        for pattern in self._patterns:
+            if pattern.match(text) is not None:
+                return True
+        return False
+
     async def match(self, target: Union[Contact, Room, Message, Conversation]) -> bool:
         """match the conversation
 
@@ -162,14 +249,102 @@ class Matcher:
         Returns:
             bool: if match the conversation
         """
-        if not isinstance(Conversation):
-            conversation: Conversation = Conversation(target)
+        if isinstance(target, Conversation):
+            conversation = target
+        else:
+            conversation = Conversation(target)
 
-        for option in self.options:
+        if self._ids_or_names or self._patterns:
+            if self._match_text(conversation.get_id()):
+                return True
+            if self._match_text(await conversation.get_name()):
+                return True
+
+        for option in self._method_options:
             result = await option.match(conversation)
             if result:
                 return True
         return False
+
+    async def match_with_name(self, target: Union[Contact, Room, Message, Conversation], name: str) -> bool:
+        """match the conversation whose name is already known, without loading the payload
+
+        Args:
+            target (Union[Contact, Room, Message, Conversation]): the target conversation
+            name (str): the name of the conversation
+
+        Returns:
+            bool: if match the conversation
+        """
+        if isinstance(target, Conversation):
+            conversation = target
+        else:
+            conversation = Conversation(target)
+
+        if self._match_text(conversation.get_id()) or self._match_text(name):
+            return True
+        for option in self._method_options:
+            if await option.match(conversation):
+                return True
+        return False
+
+    async def match_many(
+        self,
+        targets: Iterable[Union[Contact, Room, Message, Conversation]],
+        concurrency: int = 16
+    ) -> MatchResult:
+        """match the conversations in batch
+
+        The names of the conversations which are not matched by id are loaded concurrently,
+        at most `concurrency` payloads at the same time, then all of the options are evaluated in one pass.
+
+        Args:
+            targets (Iterable[Union[Contact, Room, Message, Conversation]]): the target conversations
+            concurrency (int, optional): the max number of the concurrent payload loadings. Defaults to 16.
+
+        Returns:
+            MatchResult: the matched conversations with the timing stats
+        """
+        conversations = [
+            target if isinstance(target, Conversation) else Conversation(target) for target in targets
+        ]
+        result = MatchResult(total=len(conversations))
+        matched = [False] * len(conversations)
+
+        # 1. match by id which needs no payload
+        start = time.perf_counter()
+        if self._ids_or_names or self._patterns:
+            for index, conversation in enumerate(conversations):
+                matched[index] = self._match_text(conversation.get_id())
+        result.match_seconds += time.perf_counter() - start
+
+        # 2. load the names of the rest conversations concurrently
+        start = time.perf_counter()
+        names: List[Optional[str]] = [None] * len(conversations)
+        if self._ids_or_names or self._patterns:
+            semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+            async def load_name(index: int) -> None:
+                async with semaphore:
+                    names[index] = await conversations[index].get_name()
+
+            await asyncio.gather(*[load_name(index) for index in range(len(conversations)) if not matched[index]])
+        result.load_seconds = time.perf_counter() - start
+
+        # 3. evaluate the names and method options in one pass
+        start = time.perf_counter()
+        for index, conversation in enumerate(conversations):
+            if not matched[index] and names[index] is not None:
+                matched[index] = self._match_text(names[index])
+            if not matched[index]:
+                for option in self._method_options:
+                    if await option.match(conversation):
+                        matched[index] = True
+                        break
+            if matched[index]:
+                result.conversations.append(conversation)
+        result.match_seconds += time.perf_counter() - start
+        return result
     
     def md5(self) -> str:
         """get the md5 presentation string
@@ -177,8 +352,10 @@ class Matcher:
         Returns:
             str: the md5 string
         """
-        md5_strings = set([option.md5() for option in self.options])
-        return ','.join(md5_strings)
+        if self._md5 is None:
+            md5_strings = sorted(set(option.md5() for option in self.options))
+            self._md5 = ','.join(md5_strings)
+        return self._md5
 
     def __eq__(self, other_matcher: object) -> bool:
         if not other_matcher:
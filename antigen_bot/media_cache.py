@@ -0,0 +1,204 @@
+"""Content-addressed cache of the media files in messages, shared by all plugins"""
+from __future__ import annotations
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from uuid import uuid4
+
+from wechaty import FileBox, Message
+from wechaty_puppet import get_logger
+
+from antigen_bot.ttl_store import TTLStore
+
+
+logger = get_logger('MediaCache')
+
+
+@dataclass(frozen=True)
+class MediaFile:
+    """the cached media file with the original name"""
+    path: str
+    name: str
+    digest: str
+    size: int
+
+    def to_file_box(self) -> FileBox:
+        """load the file into FileBox with the original name"""
+        return FileBox.from_file(self.path, name=self.name)
+
+
+def _hash_file(path: str) -> Tuple[str, int]:
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(chunk)
+            size += len(chunk)
+    return sha256.hexdigest(), size
+
+
+class MediaCache:
+    """Store the media files by the sha256 of content, with LRU eviction under `max_bytes`.
+
+    The files are indexed by message id (and remote url if any), so the same message handled
+    by several plugins is only downloaded once, and the same poster forwarded again only takes
+    the disk once.
+    """
+    _instance: Optional[MediaCache] = None
+
+    def __init__(
+        self,
+        cache_dir: str = '.wechaty/media',
+        max_bytes: int = 512 * 1024 * 1024,
+        alias_ttl_seconds: float = 7 * 24 * 60 * 60,
+        max_aliases: int = 20_000,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+        # digest -> (path, size) in the LRU order
+        self._entries: OrderedDict[str, Tuple[str, int]] = OrderedDict()
+        # message id / url -> (digest, name)
+        self._aliases = TTLStore(ttl_seconds=alias_ttl_seconds, max_size=max_aliases)
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._loaded = False
+
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.duplicates = 0
+        self.evictions = 0
+
+    @classmethod
+    def instance(cls) -> MediaCache:
+        """singleton pattern for MediaCache"""
+        if cls._instance is None:
+            cls._instance = MediaCache()
+        return cls._instance
+
+    def _ensure_loaded(self) -> None:
+        """index the files cached by the previous process, the least recently accessed first"""
+        if self._loaded:
+            return
+        self._loaded = True
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        files = []
+        for file_name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, file_name)
+            if file_name.startswith('.') or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_atime, os.path.splitext(file_name)[0], path, stat.st_size))
+
+        for _, digest, path, size in sorted(files):
+            self._entries[digest] = (path, size)
+            self.total_bytes += size
+        self._evict()
+
+    def _lookup(self, key: str) -> Optional[MediaFile]:
+        alias = self._aliases.get(key)
+        if alias is None:
+            return None
+        digest, name = alias
+        entry = self._entries.get(digest)
+        if entry is None or not os.path.exists(entry[0]):
+            return None
+        self._entries.move_to_end(digest)
+        return MediaFile(path=entry[0], name=name, digest=digest, size=entry[1])
+
+    async def get_file(self, msg: Message) -> MediaFile:
+        """get the cached media file of message, which is only downloaded when it's not cached"""
+        self._ensure_loaded()
+        key = f'message:{msg.message_id}'
+        media_file = self._lookup(key)
+        if media_file is not None:
+            self.hits += 1
+            return media_file
+
+        # the other plugins are downloading the same message
+        future = self._pending.get(key)
+        if future is None:
+            self.misses += 1
+            future = asyncio.ensure_future(self._download(msg, key))
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        else:
+            self.hits += 1
+        return await asyncio.shield(future)
+
+    async def get_file_box(self, msg: Message) -> FileBox:
+        """get the FileBox of message from the cache"""
+        media_file = await self.get_file(msg)
+        return media_file.to_file_box()
+
+    async def _download(self, msg: Message, key: str) -> MediaFile:
+        file_box = await msg.to_file_box()
+        name = file_box.name
+        url_key = f'url:{file_box.remoteUrl}' if getattr(file_box, 'remoteUrl', None) else None
+        if url_key:
+            media_file = self._lookup(url_key)
+            if media_file is not None:
+                self._aliases.set(key, (media_file.digest, name))
+                return MediaFile(path=media_file.path, name=name, digest=media_file.digest, size=media_file.size)
+
+        tmp_path = os.path.join(self.cache_dir, f'.{uuid4().hex}.tmp')
+        await file_box.to_file(tmp_path, overwrite=True)
+        loop = asyncio.get_event_loop()
+        digest, size = await loop.run_in_executor(None, _hash_file, tmp_path)
+
+        entry = self._entries.get(digest)
+        if entry is not None and os.path.exists(entry[0]):
+            os.remove(tmp_path)
+            self.duplicates += 1
+            self._entries.move_to_end(digest)
+            path = entry[0]
+        else:
+            if entry is not None:
+                # the file is removed outside
+                self._entries.pop(digest)
+                self.total_bytes -= entry[1]
+            path = os.path.join(self.cache_dir, f'{digest}{os.path.splitext(name)[1]}')
+            os.replace(tmp_path, path)
+            self._entries[digest] = (path, size)
+            self.total_bytes += size
+            self._evict(keep=digest)
+
+        self._aliases.set(key, (digest, name))
+        if url_key:
+            self._aliases.set(url_key, (digest, name))
+        return MediaFile(path=path, name=name, digest=digest, size=size)
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        while self.total_bytes > self.max_bytes and self._entries:
+            digest = next(iter(self._entries))
+            if digest == keep:
+                break
+            path, size = self._entries.pop(digest)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            logger.info(f'evict media file<{path}> size<{size}>')
+
+    def stats(self) -> dict:
+        """get the statistics of the cache"""
+        requests = self.hits + self.misses
+        return dict(
+            entries=len(self._entries),
+            total_bytes=self.total_bytes,
+            max_bytes=self.max_bytes,
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=round(self.hits / requests, 4) if requests else 0.0,
+            duplicates=self.duplicates,
+            evictions=self.evictions,
+        )
+
+
+media_cache = MediaCache.instance()
@@ -1,22 +1,121 @@
 from __future__ import annotations
 import os
-from typing import Dict, List, Optional, Union
+from typing import Callable, Collection, Dict, Optional, Set, Tuple, Union
 import functools
-from copy import deepcopy
+import time
+from dataclasses import dataclass
 
 from wechaty import Message, Wechaty, WechatyPlugin
-from wechaty_puppet import get_logger
+from wechaty_puppet import MessageType, get_logger
 
+from antigen_bot.metrics import HandlerMetrics
+from antigen_bot.plugin_worker import IsolationOptions, PluginWorker
+from antigen_bot.ttl_store import SqliteBackend, TTLStore
+
+
+IdsProvider = Union[Collection[str], Callable[[WechatyPlugin], Collection[str]]]
+
+
+@dataclass(frozen=True)
+class MessageFeatures:
+    """the cheap features of message which are computed once for all plugins"""
+    message_id: str
+    is_self: bool
+    talker_id: str
+    room_id: Optional[str]
+    type: MessageType
+    text: str
+
+    @classmethod
+    def from_message(cls, msg: Message) -> MessageFeatures:
+        """extract the features from the message payload"""
+        room = msg.room()
+        return cls(
+            message_id=msg.message_id,
+            is_self=msg.is_self(),
+            talker_id=msg.talker().contact_id,
+            room_id=room.room_id if room else None,
+            type=msg.type(),
+            text=msg.text(),
+        )
+
+
+def _resolve_ids(ids: IdsProvider, plugin: WechatyPlugin) -> Collection[str]:
+    if callable(ids):
+        return ids(plugin)
+    return ids
+
+
+@dataclass(frozen=True)
+class MessageFilter:
+    """the prefilter declared by plugin, the message will be skipped if not matched
+
+    Attributes:
+        room: True for room messages only, False for private messages only, None for both
+        types: the message types the plugin handles
+        self_message: if the plugin handles the messages sent by the bot itself
+        admins: the talker ids (or a function of plugin returning them) the plugin handles
+        conversation_ids: the ids of room, or talker of private message, the plugin handles
+        room_ids: the room ids the plugin handles, which implies room messages only
+        prefixes: the text prefixes the plugin handles
+    """
+    room: Optional[bool] = None
+    types: Optional[Tuple[MessageType, ...]] = None
+    self_message: bool = False
+    admins: Optional[IdsProvider] = None
+    conversation_ids: Optional[IdsProvider] = None
+    room_ids: Optional[IdsProvider] = None
+    prefixes: Optional[Tuple[str, ...]] = None
+
+    def match(self, plugin: WechatyPlugin, features: MessageFeatures) -> bool:
+        """check if the plugin is interested in the message"""
+        if features.is_self and not self.self_message:
+            return False
+        if self.room is not None and self.room != (features.room_id is not None):
+            return False
+        if self.types is not None and features.type not in self.types:
+            return False
+        if self.prefixes is not None and not features.text.startswith(self.prefixes):
+            return False
+        if self.room_ids is not None:
+            if features.room_id is None or features.room_id not in _resolve_ids(self.room_ids, plugin):
+                return False
+        if self.admins is not None and features.talker_id not in _resolve_ids(self.admins, plugin):
+            return False
+        if self.conversation_ids is not None:
+            conversation_id = features.room_id or features.talker_id
+            if conversation_id not in _resolve_ids(self.conversation_ids, plugin):
+                return False
+        return True
 
 
 class MessageController:
     """Store the Message Id Container"""
     _instance: Optional[MessageController] = None
 
-    def __init__(self) -> None:
-        self.ids = set()
-        self.plugin_names: List[str] = []
-        self.disabled_plugins: Dict[str, List[str]] = {}
+    def __init__(
+        self,
+        ttl_seconds: float = 24 * 60 * 60,
+        max_size: int = 200_000,
+        slow_handler_seconds: float = 1.0
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+
+        self.ids = TTLStore(ttl_seconds=ttl_seconds, max_size=max_size)
+        # the plugins which have handled the message, it's kept in memory only
+        self.handled_plugins = TTLStore(ttl_seconds=ttl_seconds, max_size=max_size)
+        self.plugin_names: Tuple[str, ...] = ()
+        self.disabled_plugins = TTLStore(ttl_seconds=ttl_seconds, max_size=max_size)
+
+        self.enable_filters: bool = True
+        self._features: Optional[MessageFeatures] = None
+
+        self.metrics = HandlerMetrics()
+        self.slow_handler_seconds = slow_handler_seconds
+
+        self.isolation: Optional[IsolationOptions] = None
+        self.workers: Dict[str, PluginWorker] = {}
 
         self.logger = get_logger("MessageController", file='.wechaty/message_controller.log')
     
@@ -29,11 +128,71 @@ class MessageController:
         Returns:
             bool: if the message is the first message
         """
-        if message_id in self.ids:
+        return self.ids.add(message_id)
+
+    def is_duplicate(self, message_id: str, plugin_name: str) -> bool:
+        """check if the plugin has handled the message, and mark it as handled
+
+        The message id is deduplicated once for all of plugins, so the duplicate message which is
+        emitted again after restarting is skipped by every plugin.
+
+        Args:
+            message_id (str): the identifier of message
+            plugin_name (str): the name of plugin
+
+        Returns:
+            bool: if the message is a duplicate for the plugin
+        """
+        handled: Optional[Set[str]] = self.handled_plugins.get(message_id)
+        if handled is None:
+            if self.exist(message_id):
+                return True
+            handled = set()
+            self.handled_plugins[message_id] = handled
+        elif plugin_name in handled:
             return True
-        self.ids.add(message_id)
+        handled.add(plugin_name)
         return False
-    
+
+    def persist_to(self, file: str) -> None:
+        """keep the emitted message ids in sqlite file, so that the duplicate
+        events replayed after restarting can also be suppressed
+
+        Args:
+            file (str): the path of sqlite file
+        """
+        self.ids.close()
+        self.ids = TTLStore(
+            ttl_seconds=self.ttl_seconds,
+            max_size=self.max_size,
+            backend=SqliteBackend(file)
+        )
+
+    def isolate_plugins(self, options: Optional[IsolationOptions] = None) -> None:
+        """run the message handler of every plugin in its own bounded queue and worker,
+        so that one slow plugin can not stall the others.
+
+        The messages are still handled in order within each plugin. The disabled state is
+        checked again before the handler runs, but since plugins run concurrently,
+        `disable_all_plugins` can not stop the plugins which have already started.
+
+        Args:
+            options (Optional[IsolationOptions]): the queue size, timeout and overflow policy
+        """
+        self.isolation = options or IsolationOptions()
+
+    def _get_worker(self, plugin: WechatyPlugin) -> PluginWorker:
+        worker = self.workers.get(plugin.name)
+        if worker is None:
+            worker = PluginWorker(plugin.name, self.isolation, self.metrics.get(plugin.name), self.logger)
+            self.workers[plugin.name] = worker
+        return worker
+
+    def is_disabled(self, plugin: WechatyPlugin, msg: Message) -> bool:
+        """check if the plugin is disabled under the message"""
+        disabled_plugins = self.disabled_plugins.get(msg.message_id)
+        return disabled_plugins is not None and plugin.name in disabled_plugins
+
     @classmethod
     def instance(cls) -> MessageController:
         """singleton pattern for MessageIdContainer"""
@@ -46,7 +205,7 @@ class MessageController:
         if self.plugin_names:
             return
         plugin_map: Dict[str, WechatyPlugin] = wechaty._plugin_manager._plugins
-        self.plugin_names = list(plugin_map.keys())
+        self.plugin_names = tuple(plugin_map.keys())
 
     @staticmethod
     def disable_all_plugins(msg: Union[Message, str]) -> None:
@@ -56,17 +215,80 @@ class MessageController:
         if isinstance(msg, Message):
             msg = msg.message_id
     
-        instance.disabled_plugins[msg] = deepcopy(instance.plugin_names)
+        instance.disabled_plugins[msg] = instance.plugin_names
     
+    def get_features(self, msg: Message) -> MessageFeatures:
+        """get the features of message, which is computed only once for all of plugins"""
+        features = self._features
+        if features is None or features.message_id != msg.message_id:
+            features = MessageFeatures.from_message(msg)
+            self._features = features
+        return features
+
+    @staticmethod
+    def subscribe(**kwargs):
+        """decorator for declaring the MessageFilter of plugin message handler,
+        which should be placed above the `may_disable_message` decorator
+
+        Examples:
+            @message_controller.subscribe(room=False, types=(MessageType.MESSAGE_TYPE_TEXT,))
+            @message_controller.may_disable_message
+            async def on_message(self, msg: Message) -> None:
+                ...
+        """
+        message_filter = MessageFilter(**kwargs)
+
+        def decorator(func):
+            func.__message_filter__ = message_filter
+            return func
+        return decorator
+
     def may_disable_message(self, func):
         """decorator for disable the message"""
         @functools.wraps(func)
         async def wrapper(plugin: WechatyPlugin, msg: Message):
-            if msg.message_id in self.disabled_plugins and plugin.name in self.disabled_plugins[msg.message_id]:
+            message_filter: Optional[MessageFilter] = getattr(wrapper, '__message_filter__', None)
+            if message_filter is not None and self.enable_filters:
+                if not message_filter.match(plugin, self.get_features(msg)):
+                    return
+
+            if self.is_disabled(plugin, msg):
                 self.logger.info(f'disable plugin: {plugin}')
                 self.logger.info(f'disable under message<{msg.message_id}>: {msg}\n')
                 return
-            await func(plugin, msg)
+            if self.is_duplicate(msg.message_id, plugin.name):
+                self.logger.info(f'skip duplicate message<{msg.message_id}> for plugin: {plugin.name}')
+                return
+
+            if self.isolation is not None:
+                await self._get_worker(plugin).submit(lambda: self._run_isolated_handler(func, plugin, msg))
+                return
+            await self._run_handler(func, plugin, msg)
         return wrapper
 
+    async def _run_isolated_handler(self, func, plugin: WechatyPlugin, msg: Message) -> None:
+        """run the message handler in the worker of plugin"""
+        if self.is_disabled(plugin, msg):
+            self.logger.info(f'disable plugin: {plugin} under message<{msg.message_id}>')
+            return
+        await self._run_handler(func, plugin, msg)
+
+    async def _run_handler(self, func, plugin: WechatyPlugin, msg: Message) -> None:
+        """run the message handler of plugin and record the latency"""
+        start = time.perf_counter()
+        failed = False
+        try:
+            await func(plugin, msg)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            slow = seconds >= self.slow_handler_seconds
+            self.metrics.get(plugin.name).record(seconds, failed=failed, slow=slow)
+            if slow:
+                self.logger.warning(
+                    f'slow handler: plugin<{plugin.name}> took {seconds * 1000:.1f}ms on message<{msg.message_id}>'
+                )
+
 message_controller = MessageController.instance()
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""Latency and error metrics of plugin message handlers"""
+from __future__ import annotations
+from collections import deque
+from typing import Deque, Dict, List
+
+
+def _percentile(sorted_latencies: List[float], percent: float) -> float:
+    if not sorted_latencies:
+        return 0.0
+    index = min(len(sorted_latencies) - 1, int(len(sorted_latencies) * percent / 100))
+    return sorted_latencies[index]
+
+
+class HandlerStats:
+    """the call count, exception count and recent latencies of one handler"""
+    def __init__(self, window_size: int = 2048) -> None:
+        self.calls: int = 0
+        self.exceptions: int = 0
+        self.slow_calls: int = 0
+        self.timeouts: int = 0
+        self.dropped: int = 0
+        self.total_seconds: float = 0.0
+        self.max_seconds: float = 0.0
+        self.latencies: Deque[float] = deque(maxlen=window_size)
+
+    def record(self, seconds: float, failed: bool = False, slow: bool = False) -> None:
+        """record one call of the handler"""
+        self.calls += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.latencies.append(seconds)
+        if failed:
+            self.exceptions += 1
+        if slow:
+            self.slow_calls += 1
+
+    def percentile(self, percent: float) -> float:
+        """get the percentile latency of the recent calls"""
+        return _percentile(sorted(self.latencies), percent)
+
+    def to_dict(self) -> dict:
+        """get the summary of the handler stats, latencies are in milliseconds"""
+        latencies = sorted(self.latencies)
+        return dict(
+            calls=self.calls,
+            exceptions=self.exceptions,
+            slow_calls=self.slow_calls,
+            timeouts=self.timeouts,
+            dropped=self.dropped,
+            mean_ms=self.total_seconds / self.calls * 1000 if self.calls else 0.0,
+            p50_ms=_percentile(latencies, 50) * 1000,
+            p95_ms=_percentile(latencies, 95) * 1000,
+            p99_ms=_percentile(latencies, 99) * 1000,
+            max_ms=self.max_seconds * 1000,
+        )
+
+
+class HandlerMetrics:
+    """the stats of all plugin handlers"""
+    def __init__(self, window_size: int = 2048) -> None:
+        self.window_size = window_size
+        self.handlers: Dict[str, HandlerStats] = {}
+
+    def get(self, name: str) -> HandlerStats:
+        """get or create the stats of handler"""
+        stats = self.handlers.get(name)
+        if stats is None:
+            stats = HandlerStats(self.window_size)
+            self.handlers[name] = stats
+        return stats
+
+    def to_dict(self) -> Dict[str, dict]:
+        """get the summary of all handlers"""
+        return {name: stats.to_dict() for name, stats in self.handlers.items()}
@@ -0,0 +1,89 @@
+"""Shared id -> name/alias/topic cache of Contacts and Rooms"""
+from __future__ import annotations
+from typing import NamedTuple, Optional, Union
+
+from wechaty import Contact, Room
+
+from antigen_bot.ttl_store import TTLStore
+
+
+class NameEntry(NamedTuple):
+    """the names of Contact or Room, `name` is the topic for Room"""
+    name: str
+    alias: str = ''
+
+    @property
+    def display_name(self) -> str:
+        """the alias first, then the name"""
+        return self.alias or self.name
+
+
+def _get_id(target: Union[Contact, Room]) -> str:
+    if isinstance(target, Contact):
+        return target.contact_id
+    return target.room_id
+
+
+def _entry_from_payload(target: Union[Contact, Room]) -> NameEntry:
+    if isinstance(target, Contact):
+        return NameEntry(name=target.payload.name or '', alias=target.payload.alias or '')
+    return NameEntry(name=target.payload.topic or '')
+
+
+class NameCache:
+    """Cache the names of conversations, so that name lookups in the hot path are dict reads.
+
+    The entries are updated by room-topic events (see NameCachePlugin), invalidated when the
+    bot changes an alias, and expired after `ttl_seconds` as the fallback.
+    """
+    _instance: Optional[NameCache] = None
+
+    def __init__(self, ttl_seconds: float = 6 * 60 * 60, max_size: int = 50_000) -> None:
+        self.store = TTLStore(ttl_seconds=ttl_seconds, max_size=max_size)
+
+    @classmethod
+    def instance(cls) -> NameCache:
+        """singleton pattern for NameCache"""
+        if cls._instance is None:
+            cls._instance = NameCache()
+        return cls._instance
+
+    async def get(self, target: Union[Contact, Room]) -> NameEntry:
+        """get the names of target, which only loads the payload when it's not cached"""
+        conv_id = _get_id(target)
+        entry: Optional[NameEntry] = self.store.get(conv_id)
+        if entry is not None:
+            return entry
+
+        await target.ready()
+        entry = _entry_from_payload(target)
+        self.store.set(conv_id, entry)
+        return entry
+
+    async def get_name(self, target: Union[Contact, Room]) -> str:
+        """get the alias or name of Contact, or the topic of Room"""
+        entry = await self.get(target)
+        return entry.display_name
+
+    async def get_topic(self, room: Room) -> str:
+        """get the topic of Room"""
+        entry = await self.get(room)
+        return entry.name
+
+    def observe(self, target: Union[Contact, Room]) -> None:
+        """populate the cache from the loaded payload, without any puppet call"""
+        conv_id = _get_id(target)
+        if conv_id in self.store or not target.is_ready():
+            return
+        self.store.set(conv_id, _entry_from_payload(target))
+
+    def set_topic(self, room_id: str, topic: str) -> None:
+        """update the topic of Room"""
+        self.store.set(room_id, NameEntry(name=topic))
+
+    def invalidate(self, conv_id: str) -> None:
+        """remove the cached names, eg: when the alias of Contact changes"""
+        self.store.pop(conv_id)
+
+
+name_cache = NameCache.instance()
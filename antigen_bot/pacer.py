@@ -0,0 +1,100 @@
+"""Adaptive pacing of the outbound sends"""
+from __future__ import annotations
+import asyncio
+import time
+from typing import Optional
+
+from wechaty_puppet import get_logger
+
+
+logger = get_logger('AdaptivePacer')
+
+
+class AdaptivePacer:
+    """AIMD on the gap between the sends of the account.
+
+    The gap is decreased by `decrease_step_seconds` after every fast & successful send, and multiplied by
+    `increase_factor` after a failed or slow send, so the fan-out speeds up while the puppet is healthy and
+    backs off as soon as WeChat starts throttling. The gap is always kept in [min_gap_seconds, max_gap_seconds].
+
+    It's shared by the plugins, because the throttling is applied to the account instead of the plugin.
+    """
+    _instance: Optional[AdaptivePacer] = None
+
+    def __init__(
+        self,
+        min_gap_seconds: float = 0.3,
+        max_gap_seconds: float = 10.0,
+        initial_gap_seconds: float = 1.0,
+        decrease_step_seconds: float = 0.1,
+        increase_factor: float = 2.0,
+        slow_send_seconds: float = 5.0,
+    ) -> None:
+        if not 0 <= min_gap_seconds <= max_gap_seconds:
+            raise ValueError('the gap should be 0 <= min_gap_seconds <= max_gap_seconds')
+        if increase_factor <= 1:
+            raise ValueError('increase_factor should be greater than 1')
+
+        self.min_gap_seconds = min_gap_seconds
+        self.max_gap_seconds = max_gap_seconds
+        self.decrease_step_seconds = decrease_step_seconds
+        self.increase_factor = increase_factor
+        self.slow_send_seconds = slow_send_seconds
+
+        self.gap_seconds = min(max(initial_gap_seconds, min_gap_seconds), max_gap_seconds)
+        self._next_send_at = 0.0
+
+        self.sends = 0
+        self.failures = 0
+        self.slow_sends = 0
+
+    @classmethod
+    def instance(cls) -> AdaptivePacer:
+        """singleton pattern for AdaptivePacer"""
+        if cls._instance is None:
+            cls._instance = AdaptivePacer()
+        return cls._instance
+
+    async def wait(self) -> None:
+        """wait for the slot of the next send, the concurrent broadcasts are spaced by the gap too"""
+        now = time.monotonic()
+        send_at = max(now, self._next_send_at)
+        # reserve the slot before sleeping
+        self._next_send_at = send_at + self.gap_seconds
+        if send_at > now:
+            await asyncio.sleep(send_at - now)
+
+    def record(self, seconds: float, success: bool) -> None:
+        """adjust the gap with the latency and result of the send"""
+        self.sends += 1
+        if not success or seconds >= self.slow_send_seconds:
+            if success:
+                self.slow_sends += 1
+            else:
+                self.failures += 1
+            self.gap_seconds = min(self.gap_seconds * self.increase_factor, self.max_gap_seconds)
+            logger.warning(f'back off the sends with gap<{self.gap_seconds:.2f}s>')
+        else:
+            self.gap_seconds = max(self.gap_seconds - self.decrease_step_seconds, self.min_gap_seconds)
+
+        # the gap is counted from the end of the send
+        self._next_send_at = max(self._next_send_at, time.monotonic() + self.gap_seconds)
+
+    @property
+    def sends_per_minute(self) -> float:
+        """the max sends/min under the current gap"""
+        return 60 / self.gap_seconds if self.gap_seconds > 0 else float('inf')
+
+    def stats(self) -> dict:
+        """get the stats of the pacer"""
+        return dict(
+            gap_seconds=round(self.gap_seconds, 3),
+            min_gap_seconds=self.min_gap_seconds,
+            max_gap_seconds=self.max_gap_seconds,
+            sends=self.sends,
+            failures=self.failures,
+            slow_sends=self.slow_sends,
+        )
+
+
+send_pacer = AdaptivePacer.instance()
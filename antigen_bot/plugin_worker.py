@@ -0,0 +1,95 @@
+"""Run the message handlers of every plugin in its own bounded queue"""
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass
+from logging import Logger
+from typing import Awaitable, Callable, Literal, Optional
+
+from antigen_bot.metrics import HandlerStats
+
+
+Job = Callable[[], Awaitable[None]]
+
+
+@dataclass
+class IsolationOptions:
+    """options for running plugins in isolated workers
+
+    Attributes:
+        queue_size: the max number of pending messages of each plugin
+        timeout_seconds: the max seconds of one handler call, which will be cancelled after that
+        overflow: what to do when the queue is full,
+            drop_newest: drop the incoming message
+            drop_oldest: drop the oldest pending message
+            block: wait until the queue has space, which slows down the dispatching of all plugins
+    """
+    queue_size: int = 100
+    timeout_seconds: float = 60
+    overflow: Literal['drop_newest', 'drop_oldest', 'block'] = 'drop_oldest'
+
+
+class PluginWorker:
+    """consume the messages of one plugin in order, with timeout for each of them"""
+    def __init__(self, name: str, options: IsolationOptions, stats: HandlerStats, logger: Logger) -> None:
+        if options.overflow not in ('drop_newest', 'drop_oldest', 'block'):
+            raise ValueError(f'{options.overflow} is not a valid overflow policy')
+
+        self.name = name
+        self.options = options
+        self.stats = stats
+        self.logger = logger
+
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=options.queue_size)
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self._consume())
+
+    async def submit(self, job: Job) -> bool:
+        """put the job into the queue
+
+        Returns:
+            bool: if the job is accepted
+        """
+        self._ensure_started()
+
+        if self.options.overflow == 'block':
+            await self.queue.put(job)
+            return True
+
+        if self.queue.full():
+            self.stats.dropped += 1
+            if self.options.overflow == 'drop_newest':
+                self.logger.warning(f'queue of plugin<{self.name}> is full, drop the incoming message')
+                return False
+
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.logger.warning(f'queue of plugin<{self.name}> is full, drop the oldest message')
+
+        self.queue.put_nowait(job)
+        return True
+
+    async def _consume(self) -> None:
+        while True:
+            job = await self.queue.get()
+            try:
+                await asyncio.wait_for(job(), timeout=self.options.timeout_seconds)
+            except asyncio.TimeoutError:
+                self.stats.timeouts += 1
+                self.logger.error(f'plugin<{self.name}> handler timeout after {self.options.timeout_seconds}s')
+            except Exception:   # pylint: disable=broad-except
+                self.logger.exception(f'plugin<{self.name}> handler failed')
+            finally:
+                self.queue.task_done()
+
+    async def join(self) -> None:
+        """wait until all of pending jobs are done"""
+        await self.queue.join()
+
+    def stop(self) -> None:
+        """cancel the consumer task"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -1,4 +1,5 @@
 """basic ding-dong bot for the wechaty plugin"""
+import asyncio
 import os
 from typing import List, Optional
 
@@ -9,6 +10,7 @@ import requests
 
 from dataclasses import dataclass, field
 
+from antigen_bot.media_cache import media_cache
 from antigen_bot.message_controller import message_controller
 
 
@@ -30,6 +32,11 @@ class AntigenImagesPlugin(WechatyPlugin):
         self.admin_status = {}
         self.endpoint = endpoint or os.environ.get('antigen_image_endpoint', None)
 
+    def _post_image(self, file_path: str) -> dict:
+        """post the image to the antigen endpoint, which blocks the thread"""
+        with open(file_path, 'rb') as f:
+            return requests.post(self.endpoint, files={'antigen': f}).json()
+
     @message_controller.may_disable_message
     async def on_message(self, msg: Message) -> None:
         """listen message event"""
@@ -52,11 +59,9 @@ class AntigenImagesPlugin(WechatyPlugin):
         if msg.type() in [MessageType.MESSAGE_TYPE_IMAGE, MessageType.MESSAGE_TYPE_ATTACHMENT] and talker.contact_id in self.admin_status:
             message_controller.disable_all_plugins(msg)
 
-            file_box = await msg.to_file_box()
-            target_file = os.path.join(self.cache_dir, file_box.name)
-            
-            await file_box.to_file(target_file, overwrite=True)
-            result = requests.post(self.endpoint, files={'antigen': open(target_file, 'rb')}).json()
+            media_file = await media_cache.get_file(msg)
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(None, self._post_image, media_file.path)
             
             antigen_response: AntigenResponse = AntigenResponse(**result['data'])
 
@@ -1,9 +1,10 @@
 """Committee Plugin which provide more"""
+import asyncio
 import os
 from typing import Dict, Optional, Set
 from logging import Logger
 
-from wechaty import FileBox, Message, MessageType, WechatyPluginOptions
+from wechaty import FileBox, Message, MessageType, Wechaty, WechatyPluginOptions
 from wechaty.plugin import WechatyPlugin
 from wechaty_puppet import get_logger
 
@@ -12,7 +13,8 @@ from group_purchase.community.jia_yi_shui_an import JiaYiShuiAn
 from group_purchase.purchase_deliver.parser_mng import get_excel_parser
 from group_purchase.utils.utils import *
 
-from antigen_bot.forward_config import ConfigFactory
+from antigen_bot.forward_config import config_registry
+from antigen_bot.media_cache import media_cache
 from antigen_bot.message_controller import message_controller
 
 
@@ -51,7 +53,7 @@ class CommitteePlugin(WechatyPlugin):
                     f'file<config.json> under cache dir: {self.cache_dir}'
                 )
         self.config_file = config_file
-        self.config_factory = ConfigFactory(self.config_file)
+        self.config_factory = config_registry.get_factory(self.config_file)
         self._admin_ids = set()
 
         self.status: Dict[str, str] = {}
@@ -60,10 +62,21 @@ class CommitteePlugin(WechatyPlugin):
         self.cancel_word = '取消'
 
     
+    async def init_plugin(self, wechaty: Wechaty) -> None:
+        config_registry.start()
+        return await super().init_plugin(wechaty)
+
     def remove_status(self, contact_id: str):
         if contact_id in self.status:
             self.status.pop(contact_id)
 
+    def _parse_excel(self, command_name: str, file_path: str):
+        """parse the excel file, which blocks the thread"""
+        with open(file_path, 'rb') as f:
+            parser = get_excel_parser(command_name)(f)
+            return parser.parse_for_community(self.community)
+
+    @message_controller.subscribe(room=False, admins=lambda plugin: plugin.config_factory.get_admin_ids())
     @message_controller.may_disable_message
     async def on_message(self, msg: Message) -> None:
         """listen message event"""
@@ -88,22 +101,22 @@ class CommitteePlugin(WechatyPlugin):
         if contact_id in self.status:
             message_controller.disable_all_plugins(msg)
             if msg.type() == MessageType.MESSAGE_TYPE_ATTACHMENT:
-                file_box = await msg.to_file_box()
+                media_file = await media_cache.get_file(msg)
 
-                self.logger.info(f'contact<{talker}> receive file_box<{file_box.name}> ...')
-                if not file_box.name.endswith('.xlsx'):
+                self.logger.info(f'contact<{talker}> receive file_box<{media_file.name}> ...')
+                if not media_file.name.endswith('.xlsx'):
                     await talker.say('请上传Excel相关文件')
                     return
 
-                file_path = os.path.join(self.file_cache_dir, f'{file_box.name}')
-                await file_box.to_file(file_path, overwrite=True)
-                parser = get_excel_parser(self.status[contact_id])(open(file_path, 'rb'))
-
-                file_name_path, _ = os.path.splitext(file_path)
-                pdf_file = f'{file_name_path}.pdf'
+                file_path = media_file.path
+                file_name, _ = os.path.splitext(media_file.name)
+                pdf_file = os.path.join(self.file_cache_dir, f'{file_name}.pdf')
                 self.logger.info('start to parse excel file ...')
+                loop = asyncio.get_event_loop()
                 try:
-                    result, errors = parser.parse_for_community(self.community)
+                    result, errors = await loop.run_in_executor(
+                        None, self._parse_excel, self.status[contact_id], file_path
+                    )
                 except:
                     await msg.say('Excel文件格式解析错误，情先确保文件的格式，请联系管理员')
                     return
@@ -113,7 +126,7 @@ class CommitteePlugin(WechatyPlugin):
                     await msg.say(f'单元格:{",".join(errors)} 数据错误，情检查后再上传')
                     return
                 try:
-                    result.print_to_pdf(pdf_file, self.community.has_area)
+                    await loop.run_in_executor(None, result.print_to_pdf, pdf_file, self.community.has_area)
                 except Exception as e:
                     self.logger.error(f'error: {e}')
 
@@ -124,7 +137,6 @@ class CommitteePlugin(WechatyPlugin):
                 self.remove_status(contact_id)
                 
                 # delete the temp file
-                os.remove(file_name_path)
                 os.remove(pdf_file)
 
             elif msg.type() in [MessageType.MESSAGE_TYPE_UNSPECIFIED]:
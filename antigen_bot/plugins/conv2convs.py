@@ -1,12 +1,14 @@
 """"""
+import asyncio
 import os
 import re
+import unicodedata
 from typing import (
-    Dict, Optional, List, Set, Tuple, Union
+    Collection, Dict, Iterator, Optional, List, Tuple, Union
 )
 from wechaty import (
+    Wechaty,
     Contact,
-    FileBox,
     MessageType,
     WechatyPlugin,
     Room,
@@ -15,42 +17,88 @@ from wechaty import (
 )
 from wechaty_puppet import get_logger
 
-from antigen_bot.forward_config import Conversation, ConfigFactory
+from antigen_bot.broadcast import BroadcastTarget, Broadcaster, file_payload, forward_payload, text_payload
+from antigen_bot.forward_config import Conversation, ConfigFactory, TargetIndex, config_registry
+from antigen_bot.media_cache import media_cache
+from antigen_bot.pacer import AdaptivePacer
 from antigen_bot.utils import remove_at_info
 from antigen_bot.message_controller import message_controller
 
 
-def split_number_and_words(text: str, pretrained_numbers: Set[str]) -> Tuple[List[str], List[str]]:
+# a range of numbers followed by a separator, eg: 3-8, 3 - 8, ３～８, or any other token between the separators,
+# so `5-10日停水通知` is a token of the content instead of the range 5-10
+_TARGET_TOKEN = re.compile(r'[0-9０-９]+\s*[-~－～—]\s*[0-9０-９]+(?=[\s,，、;；]|$)|[^\s,，、;；]+')
+_TARGET_SEPARATORS = re.compile(r'[\s,，、;；]*')
+_NUMBER_RANGE = re.compile(r'(\d+)\s*[-~—]\s*(\d+)')
+MAX_RANGE_SIZE = 1000
+
+
+def _expand_range(token: str) -> Optional[List[str]]:
+    """expand the range token, eg: 3-5 -> ['3', '4', '5']"""
+    match = _NUMBER_RANGE.fullmatch(token)
+    if match is None:
+        return None
+    start, end = sorted(int(number) for number in match.groups())
+    if end - start >= MAX_RANGE_SIZE:
+        return None
+    return [str(number) for number in range(start, end + 1)]
+
+
+def _iter_target_tokens(text: str) -> Iterator[Tuple[int, str]]:
+    """iterate the (offset, normalized token) of text in one pass"""
+    position = _TARGET_SEPARATORS.match(text).end()
+    while position < len(text):
+        match = _TARGET_TOKEN.match(text, position)
+        yield position, unicodedata.normalize('NFKC', match.group())
+        position = _TARGET_SEPARATORS.match(text, match.end()).end()
+
+
+def split_number_and_words(text: str, pretrained_numbers: Collection[str]) -> Tuple[List[str], List[str]]:
     """split_number_and_words with pretrained_numbers
 
+    The ranges (3-8), comma lists (3,8 or 3，8) and full-width digits are supported.
+
     Args:
         text (str): the source of numbers
-        pretrained_numbers (Set[str]): the pretrained numbers
+        pretrained_numbers (Collection[str]): the pretrained numbers
 
     Returns:
         Tuple[List[str], List[str]]: the result of numbers and words
     """
-    # 1. match the: #3-8 pattern
-    pattern = '[ ]?[0-9]+[ ]?-[ ]?[0-9]+'
-    result = re.findall(pattern, text)
-    if result:
-        source_text: str = result[0]
-        number_range = [int(item) for item in source_text.split('-')]
-        numbers: List[str] = [str(item) for item in range(number_range[0], number_range[1] + 1)]
-        words = text.replace(source_text, '').strip()
-        return numbers, [words]
- 
+    pretrained_numbers = set(pretrained_numbers)
     numbers, words = [], []
-    for token in text.split():
-        if not token:
-            continue
-        if token in pretrained_numbers:
+    for _, token in _iter_target_tokens(text):
+        expanded = _expand_range(token)
+        if expanded is not None:
+            numbers.extend(expanded)
+        elif token in pretrained_numbers:
             numbers.append(token)
         else:
             words.append(token)
     return numbers, words
 
 
+def parse_target_command(text: str, targets: TargetIndex) -> Tuple[List[str], str]:
+    """parse the leading numbers or names of the targets, eg: `3-8 12 15-20 通知内容`
+
+    Args:
+        text (str): the text of command without `#`
+        targets (TargetIndex): the index of number & name -> conversations
+
+    Returns:
+        Tuple[List[str], str]: the keys of targets, and the rest content
+    """
+    keys: List[str] = []
+    for offset, token in _iter_target_tokens(text):
+        expanded = _expand_range(token)
+        if expanded is not None:
+            keys.extend(expanded)
+        elif token in targets:
+            keys.append(token)
+        else:
+            return keys, text[offset:].strip()
+    return keys, ''
+
 
 class Conv2ConvsPlugin(WechatyPlugin):
     """
@@ -68,6 +116,8 @@ class Conv2ConvsPlugin(WechatyPlugin):
         expire_seconds: int = 60,
         command_prefix: str = '',
         trigger_with_at: bool = True,
+        pacer: Optional[AdaptivePacer] = None,
+        upload_once_media: bool = True,
     ) -> None:
         """init params for conversations to conversations configuration
 
@@ -77,12 +127,13 @@ class Conv2ConvsPlugin(WechatyPlugin):
             expire_seconds (int, optional): start to forward. Defaults to 60.
             command_prefix (str, optional): . Defaults to ''.
             trigger_with_at (bool, optional): _description_. Defaults to True.
+            pacer (AdaptivePacer, optional): the pacer of the sends. Defaults to the shared pacer.
+            upload_once_media (bool, optional): upload the media once and forward it to the others. Defaults to True.
         """
         super().__init__(options)
 
         self.cache_dir = f'.wechaty/{self.name}'
-        self.file_cache_dir = f'{self.cache_dir}/file'
-        os.makedirs(self.file_cache_dir, exist_ok=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
 
         # 2. save the log info into <plugin_name>.log file
         log_file = os.path.join(self.cache_dir, 'log.log')
@@ -91,10 +142,24 @@ class Conv2ConvsPlugin(WechatyPlugin):
         # 3. save the admin status
         self.admin_status: Dict[str, List[Conversation]] = {}
 
-        self.config_factory = ConfigFactory(config_file)
+        self.config_factory = config_registry.subscribe(config_file, self.on_config_changed)
         self.command_prefix = command_prefix
 
         self.trigger_with_at = trigger_with_at
+        self.broadcaster = Broadcaster(self.name, pacer=pacer, upload_once=upload_once_media)
+
+    async def init_plugin(self, wechaty: Wechaty) -> None:
+        config_registry.start()
+        return await super().init_plugin(wechaty)
+
+    async def on_login(self, contact: Contact) -> None:
+        """resume the broadcasts which are interrupted by the last exit"""
+        asyncio.ensure_future(self.broadcaster.resume(self.bot))
+
+    def on_config_changed(self, config_factory: ConfigFactory) -> None:
+        """the pending receivers may be removed from the new configuration"""
+        self.logger.info(f'config is reloaded with admins<{len(config_factory.get_admin_ids())}>')
+        self.admin_status.clear()
 
     async def forward_message(self, msg: Message, conversation_id: str):
         """forward the message to the target conversations
@@ -108,33 +173,27 @@ class Conv2ConvsPlugin(WechatyPlugin):
         if not conversations:
             return
 
-        file_box = None
         if msg.type() in [MessageType.MESSAGE_TYPE_IMAGE, MessageType.MESSAGE_TYPE_VIDEO, MessageType.MESSAGE_TYPE_ATTACHMENT]:
-            file_box = await msg.to_file_box()
-            file_path = os.path.join(self.file_cache_dir, file_box.name)
-
-            await file_box.to_file(file_path, overwrite=True)
-            file_box = FileBox.from_file(file_path)
-
-        for conversation in conversations:
-            if conversation.type == 'Room':
-                forwarder_target = await self.bot.Room.load(conversation.id)
-            elif conversation.type == 'Contact':
-                forwarder_target = await self.bot.Contact.load(conversation.id) 
-            else:
-                continue
-            
-            # TODO: 转发图片貌似还是有些问题
-            if file_box:
-                await forwarder_target.say(file_box)
-
-            # 如果是文本的话，是需要单独来转发
-            elif msg.type() == MessageType.MESSAGE_TYPE_TEXT:
-                await forwarder_target.say(msg.text())
-
-            elif forwarder_target:
-                await msg.forward(forwarder_target)
+            payload = file_payload(await media_cache.get_file(msg), msg.message_id)
+
+        # 如果是文本的话，是需要单独来转发
+        elif msg.type() == MessageType.MESSAGE_TYPE_TEXT:
+            payload = text_payload(msg.text())
 
+        else:
+            payload = forward_payload(msg.message_id)
+
+        targets = [
+            BroadcastTarget(id=str(conversation.id), name=conversation.name, type=conversation.type)
+            for conversation in conversations if conversation.type in ('Room', 'Contact')
+        ]
+        record = await self.broadcaster.submit(self.bot, msg, msg.room() or msg.talker(), payload, targets)
+        if record is None:
+            self.logger.warning(f'message<{msg.message_id}> has been forwarded')
+            return
+        await msg.say(record.summary())
+
+    @message_controller.subscribe(conversation_ids=lambda plugin: plugin.config_factory.get_admin_ids())
     @message_controller.may_disable_message
     async def on_message(self, msg: Message) -> None:
         talker = msg.talker()
@@ -180,11 +239,18 @@ class Conv2ConvsPlugin(WechatyPlugin):
             text = text[len(self.command_prefix):]
             text = text[text.index('#') + 1:].strip()
 
-            receivers = self.config_factory.get_receivers(conv)
+            receivers = await self.config_factory.get_receivers(conv)
             if not receivers:
                 return
 
-            self.admin_status[conversation_id] = receivers
+            # eg: #3-8 12 15-20 通知内容, forward to all of the receivers if there is no target
+            keys, text = parse_target_command(text, receivers.targets)
+            conversations = receivers.resolve(keys) if keys else list(receivers.conversations)
+            if not conversations:
+                await msg.say(f'未找到编号或名称为：{",".join(keys)} 的群聊')
+                return
+
+            self.admin_status[conversation_id] = conversations
 
             if text:
                 # set the words to the message
@@ -9,6 +9,7 @@ from wechaty.plugin import WechatyPlugin
 from wechaty_puppet import get_logger
 
 from antigen_bot.message_controller import message_controller
+from antigen_bot.name_cache import name_cache
 
 
 
@@ -36,7 +37,7 @@ class DingDongPlugin(WechatyPlugin):
         talker = msg.talker()
         text = msg.text()
         if msg.room():
-            topic = await msg.room().topic()
+            topic = await name_cache.get_topic(msg.room())
             if topic.startswith('嘉怡') and topic.endswith('号楼组群'):
                 return
             if topic == '嘉怡志愿者群':
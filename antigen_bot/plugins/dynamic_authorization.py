@@ -1,47 +1,25 @@
 """Dynamic Authorization Plugin"""
 from __future__ import annotations
 import os
-import json
 from datetime import datetime, timedelta
 from typing import (
-    Dict,
     Optional,
     List
 )
-import hashlib
 
 from wechaty import (
+    Wechaty,
     WechatyPlugin,
     WechatyPluginOptions,
     Message
 )
 from wechaty_puppet import get_logger
 
-from antigen_bot.forward_config import Conv2ConvsConfig, load_from_excel
+from antigen_bot.authorization_store import AuthorizationStore
+from antigen_bot.forward_config import config_registry
 from antigen_bot.utils import remove_at_info
 from antigen_bot.message_controller import message_controller
 
-class ConfigFactory:
-    """Config Factory"""
-    def __init__(self, config_file: str) -> None:
-        self.file = config_file
-        self.md5 = self._get_md5()
-
-        self.configs: List[Conv2ConvsConfig] = []
-    
-    def _get_md5(self) -> str:
-        """get the md5 sum of the configuration file"""
-        with open(self.file, 'rb') as f:
-            data = f.read()
-            md5 = hashlib.md5(data).hexdigest()
-        return md5
-    
-    def instance(self) -> List[Conv2ConvsConfig]:
-        """get the instance the configuration"""
-        if not self.configs or self._get_md5() != self.md5:
-            self.configs = load_from_excel(self.file)
-        return self.configs
-
 
 class DynamicAuthorizationPlugin(WechatyPlugin):
     """
@@ -70,47 +48,20 @@ class DynamicAuthorizationPlugin(WechatyPlugin):
         self.logger = get_logger(self.name, log_file)
 
         os.makedirs(os.path.dirname(self.config_file), exist_ok=True)
-        self.config_factory = ConfigFactory(conv_config_file)
-    
-    def _load_config(self) -> Dict[str, List[str]]:
-        """load the data from config file"""
-        if not os.path.exists(self.config_file):
-            self.logger.error('configuration file not found: %s', self.config_file)
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump({}, f, ensure_ascii=False)
-
-        with open(self.config_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data
-
-    def _save_config(self, config):
-        """save the data to config file"""
-        with open(self.config_file, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False)
-    
-    def authorize(self, date: str, contact_ids: List[str]):
-        """authorize the talkers"""
+        self.store = AuthorizationStore(self.config_file)
+        self.config_factory = config_registry.get_factory(conv_config_file)
 
-        config = self._load_config()
+    async def init_plugin(self, wechaty: Wechaty) -> None:
+        config_registry.start()
+        return await super().init_plugin(wechaty)
 
-        if date not in config:
-            config[date] = []
-
-        for contact_id in contact_ids:
-            if contact_id not in config[date]:
-                config[date].append(contact_id)
-        self._save_config(config)
+    def authorize(self, date: str, contact_ids: List[str]):
+        """authorize the talkers"""
+        self.store.authorize(date, contact_ids)
 
     def unauthorize(self, date: str, contact_ids: List[str]):
         """authorize the talkers"""
-
-        config = self._load_config()
-
-        if date not in config:
-            return
-
-        config[date] = list(set(config[date]) - set(contact_ids))
-        self._save_config(config)
+        self.store.unauthorize(date, contact_ids)
 
     def is_valid(self, contact_id: str) -> bool:
         """check if the talker is valid
@@ -121,10 +72,9 @@ class DynamicAuthorizationPlugin(WechatyPlugin):
         Returns:
             bool: the result of the code
         """
-        date = datetime.today().strftime('%Y-%m-%d')
-        config = self._load_config()
-        return contact_id in config.get(date, [])
+        return self.store.is_valid(contact_id)
 
+    @message_controller.subscribe(room=True)
     @message_controller.may_disable_message
     async def on_message(self, msg: Message) -> None:
         """handle the authorize"""
@@ -149,6 +99,7 @@ class DynamicAuthorizationPlugin(WechatyPlugin):
             date = datetime.today() + timedelta(days=1)
         else:
             await msg.say(f'如果您想授权此群友，请添加文字内容：今日授权、明日授权等关键\n{clear_text}为无效关键字')
+            return
 
         date_string = date.strftime('%Y-%m-%d')
         self.authorize(date_string, [contact.contact_id + room.room_id for contact in mention_list])
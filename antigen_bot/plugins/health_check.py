@@ -16,7 +16,10 @@ from wechaty import (
 )
 from quart import Quart, jsonify
 from wechaty_puppet import get_logger
+from antigen_bot.delivery import delivery_tracker
+from antigen_bot.media_cache import media_cache
 from antigen_bot.message_controller import message_controller
+from antigen_bot.pacer import send_pacer
 
 
 class HealthCheckerStatus(Enum):
@@ -238,3 +241,37 @@ class HealthCheckPlugin(WechatyPlugin):
                 "msg": msg,
                 "is_health": is_health
             })
+
+        @app.route('/broadcasts')
+        def get_broadcasts():
+            return jsonify({
+                "code": 200,
+                "data": dict(**delivery_tracker.to_dict(), pacer=send_pacer.stats())
+            })
+
+        @app.route('/broadcasts/<int:broadcast_id>')
+        def get_broadcast(broadcast_id: int):
+            record = delivery_tracker.get(broadcast_id)
+            if record is None:
+                return jsonify({
+                    "code": 404,
+                    "msg": f'broadcast<{broadcast_id}> not found'
+                }), 404
+            return jsonify({
+                "code": 200,
+                "data": record.to_dict(with_attempts=True)
+            })
+
+        @app.route('/media_cache_stats')
+        def get_media_cache_stats():
+            return jsonify({
+                "code": 200,
+                "data": media_cache.stats()
+            })
+
+        @app.route('/handler_stats')
+        def get_handler_stats():
+            return jsonify({
+                "code": 200,
+                "data": message_controller.metrics.to_dict()
+            })
@@ -81,7 +81,8 @@ class InfoDownloaderPlugin(WechatyPlugin):
         
         return infos
 
-    @message_controller.may_disable_message    
+    @message_controller.subscribe(room=False, prefixes=('#log-all-',))
+    @message_controller.may_disable_message
     async def on_message(self, msg: Message) -> None:
         if msg.room():
             return
@@ -25,6 +25,7 @@ from tap import Tap
 from antigen_bot.plugins.config import Conversation
 from antigen_bot.utils import remove_at_info
 from antigen_bot.message_controller import message_controller
+from antigen_bot.name_cache import name_cache
 
 
 TYPE_MAPS: Dict[str, MessageType] = {
@@ -93,11 +94,11 @@ class Rule:
         Returns:
             bool: if match the conversation
         """
-        await conv.ready()
+        entry = await name_cache.get(conv)
         if isinstance(conv, Contact):
-            conv_id, conv_name = conv.contact_id, conv.payload.name
+            conv_id, conv_name = conv.contact_id, entry.name
         else:
-            conv_id, conv_name = conv.room_id, conv.payload.topic
+            conv_id, conv_name = conv.room_id, entry.name
         
         # TODO: if convs is none, it will reply to anyone
         if not self.convs:
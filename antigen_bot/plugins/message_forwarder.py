@@ -3,14 +3,14 @@ import json
 import os
 import re
 import asyncio
+import warnings
 from typing import (
-    Any, Dict, Optional, List
+    Any, Dict, FrozenSet, Optional, List, Tuple
 )
-from datetime import datetime
+from dataclasses import dataclass, field
 from wechaty import (
     Wechaty,
     Contact,
-    FileBox,
     MessageType,
     WechatyPlugin,
     Room,
@@ -18,57 +18,38 @@ from wechaty import (
     WechatyPluginOptions
 )
 from wechaty_puppet import get_logger
-from wechaty_plugin_contrib.finders.room_finder import RoomFinder
+from antigen_bot.broadcast import BroadcastTarget, Broadcaster, file_payload, forward_payload
+from antigen_bot.matcher import Matcher, MatcherOption
+from antigen_bot.media_cache import media_cache
 from antigen_bot.message_controller import message_controller
+from antigen_bot.pacer import AdaptivePacer
+from antigen_bot.room_directory import room_directory
 
 
 
-class ForwardRecord:
-    """record the forward info"""
-    def __init__(self, msg: Message, talker: Contact, rooms: List[Room], max_interval_second: int = 4) -> None:
-        self.room_status = {room.room_id: False for room in rooms}
-        self.max_interval_seconds = max_interval_second
+@dataclass(frozen=True)
+class MessageForwarderConfig:
+    """the precompiled configuration of MessageForwarderPlugin"""
+    admin_ids: FrozenSet[str] = frozenset()
+    room_ids: FrozenSet[str] = frozenset()
+    room_regex: Tuple[str, ...] = ()
+    room_matcher: Optional[Matcher] = field(default=None, compare=False)
 
-        self.last_update_time: datetime = None
-        self.source_message = msg
-        
-        loop = asyncio.get_event_loop()
-        loop.create_task(self.monitor())
-        self.contact = talker
-
-    async def monitor(self):
-        """monitor the sended message by the bot"""
-        last_update_time = datetime.now() if not self.last_update_time else self.last_update_time
-        expired = (datetime.now() - last_update_time).seconds > self.max_interval_seconds
-        if not self.last_update_time or not expired:
-            await asyncio.sleep(self.max_interval_seconds)
-            await self.monitor()
-            return
-        
-        sended_rooms: List[Room] = [room for room, status in self.room_status.items() if status]
-        sended_rooms.sort(key=lambda room: room.payload.topic)
-
-        not_sended_rooms: List[Room] = [room for room, status in self.room_status.items() if not status]
-        not_sended_rooms.sort(key=lambda room: room.payload.topic)
-        info = [
-            f'已发送的群<{len(sended_rooms)}>:',
-            '\n'.join([f'{room.payload.topic}' for room in sended_rooms]),
-            '==========='
-            f'未发送的群<{len(not_sended_rooms)}>:',
-            '\n'.join([f'{room.payload.topic}' for room in not_sended_rooms]),
-        ]
-        await self.contact.say('\n'.join(info))
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'MessageForwarderConfig':
+        """compile the configuration from the json data"""
+        room_regex = tuple(data.get('room_regex', None) or [])
+        room_ids = tuple(data.get('room_ids', None) or [])
 
-    
-    def update_message(self, msg: Message):
-        """update the message"""
-        room = msg.room()
-        if msg.type() != self.source_message.type() or not room or room.room_id not in self.room_status:
-            return
+        options = [MatcherOption(text=regex, type='regex') for regex in room_regex]
+        options.extend(MatcherOption(text=room_id, type='id_or_name') for room_id in room_ids)
+        return cls(
+            admin_ids=frozenset(data.get('admin_ids', None) or []),
+            room_ids=frozenset(room_ids),
+            room_regex=room_regex,
+            room_matcher=Matcher(options) if options else None,
+        )
 
-        self.last_update_time = datetime.now()
-        self.room_status[room.room_id] = True
-    
 
 class MessageForwarderPlugin(WechatyPlugin):
     """
@@ -80,7 +61,9 @@ class MessageForwarderPlugin(WechatyPlugin):
         self,
         options: Optional[WechatyPluginOptions] = None,
         config_file: str = '.wechaty/message_forwarder.json',
-        file_box_interval_seconds: int = 2
+        file_box_interval_seconds: Optional[float] = None,
+        pacer: Optional[AdaptivePacer] = None,
+        upload_once_media: bool = True,
     ):
         super().__init__(options)
         # 1. init the configs file
@@ -88,23 +71,39 @@ class MessageForwarderPlugin(WechatyPlugin):
         # 2. save the log info into <plugin_name>.log file
         log_file = os.path.join('.wechaty', self.name + '.log')
         self.logger = get_logger(self.name, log_file)
-        self.file_box_interval_seconds: int = file_box_interval_seconds
 
-        self.cache_dir = f'.wechaty/forward_file_cached'
-        os.makedirs(self.cache_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(self.config_file), exist_ok=True)
+        self._config = MessageForwarderConfig()
+        self._config_signature: Optional[Tuple[int, int]] = None
+
+        # file_box_interval_seconds is deprecated, it's the min gap of the plugin's own pacer if pacer is not specified
+        if file_box_interval_seconds is not None:
+            warnings.warn(
+                'file_box_interval_seconds is deprecated, use pacer=AdaptivePacer(min_gap_seconds=...) instead',
+                DeprecationWarning, stacklevel=2
+            )
+            if pacer is None:
+                pacer = AdaptivePacer(
+                    min_gap_seconds=file_box_interval_seconds,
+                    max_gap_seconds=max(file_box_interval_seconds, 10.0),
+                    initial_gap_seconds=file_box_interval_seconds,
+                )
+        self.broadcaster = Broadcaster(self.name, pacer=pacer, upload_once=upload_once_media)
 
     async def init_plugin(self, wechaty: Wechaty) -> None:
         message_controller.init_plugins(wechaty)
         return await super().init_plugin(wechaty)
 
+    async def on_login(self, contact: Contact) -> None:
+        """resume the broadcasts which are interrupted by the last exit"""
+        asyncio.ensure_future(self.broadcaster.resume(self.bot))
+
     def _load_message_forwarder_configuration(self) -> Dict[str, Any]:
         """load the message forwarder configuration
 
         Returns:
             Dict[str, Any]: the message forwarder configuration
         """
-        os.makedirs(os.path.dirname(self.config_file), exist_ok=True)
-
         if not os.path.exists(self.config_file):
             self.logger.error('configuration file not found: %s', self.config_file)
             with open(self.config_file, 'w', encoding='utf-8') as f:
@@ -115,36 +114,68 @@ class MessageForwarderPlugin(WechatyPlugin):
             data = json.load(f)
         return data
 
-    def get_room_finder(self) -> Optional[RoomFinder]:
-        """get_room_finder with dynamic style
+    def get_config(self) -> MessageForwarderConfig:
+        """get the compiled configuration, which is only reloaded when the file changes
 
         Returns:
-            RoomFinder: the instance of RoomFinder
+            MessageForwarderConfig: the compiled configuration
         """
-        # 1. init the room finder
-        config = self._load_message_forwarder_configuration()
+        try:
+            stat = os.stat(self.config_file)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signature = None
 
-        options = []
-        if config.get('room_regex', []):
-            for regex in config['room_regex']:
-                options.append(re.compile(regex))
-        
-        if config.get('room_ids', []):
-            for room_id in config['room_ids']:
-                options.append(room_id)
-        if options:
-            return RoomFinder(options)
-        return None
+        if signature is not None and signature == self._config_signature:
+            return self._config
+
+        try:
+            self._config = MessageForwarderConfig.from_dict(self._load_message_forwarder_configuration())
+        except (OSError, ValueError, re.error) as error:
+            # keep the previous configuration when the file is broken
+            self.logger.error(f'can not load the configuration<{self.config_file}>: {error}')
+            return self._config
+
+        stat = os.stat(self.config_file)
+        self._config_signature = (stat.st_mtime_ns, stat.st_size)
+        return self._config
+
+    def get_room_matcher(self) -> Optional[Matcher]:
+        """get_room_matcher with dynamic style
+
+        Returns:
+            Matcher: the matcher of the target rooms
+        """
+        return self.get_config().room_matcher
     
-    def get_admin_ids(self) -> List[str]:
+    def get_admin_ids(self) -> FrozenSet[str]:
         """get the admin ids
 
         Returns:
-            List[str]: the admin ids
+            FrozenSet[str]: the admin ids
+        """
+        return self.get_config().admin_ids
+
+    async def resolve_rooms(self, room_matcher: Matcher) -> List[Room]:
+        """resolve the target rooms from the room directory, or all of the rooms before it's ready
+
+        Args:
+            room_matcher (Matcher): the matcher of the target rooms
+
+        Returns:
+            List[Room]: the target rooms
         """
-        config = self._load_message_forwarder_configuration()
-        return config.get('admin_ids', [])
+        if room_directory.ready:
+            return await room_directory.match(room_matcher)
 
+        result = await room_matcher.match_many(await self.bot.Room.find_all())
+        self.logger.info(
+            f'matched rooms<{len(result)}/{result.total}> '
+            f'load<{result.load_seconds * 1000:.1f}ms> match<{result.match_seconds * 1000:.1f}ms>'
+        )
+        return result.targets
+
+    @message_controller.subscribe(room=False)
     @message_controller.may_disable_message
     async def on_message(self, msg: Message) -> None:
         talker = msg.talker()
@@ -163,48 +194,43 @@ class MessageForwarderPlugin(WechatyPlugin):
             await msg.say('dong - ' + self.name)
             return
 
-        # 3. 检查RoomFinder是否存在
-        room_finder = self.get_room_finder()
+        # 3. 检查Matcher是否存在
+        config = self.get_config()
+        room_matcher = config.room_matcher
 
-        if room_finder is None:
+        if room_matcher is None:
             return
     
         # 4. 检查消息发送者是否是居委会成员
-        admin_ids = self.get_admin_ids()
-        self.logger.info(f'get admin ids: {",".join(admin_ids)}')
-        if not admin_ids or talker.contact_id not in admin_ids:
+        if talker.contact_id not in config.admin_ids:
             return
 
         self.logger.info('=================start to forward message=================')
         await talker.ready()
         self.logger.info('message: %s', msg)
 
-        rooms: List[Room] = await room_finder.match(self.bot)
+        rooms: List[Room] = await self.resolve_rooms(room_matcher)
         if rooms:
             self.logger.info(f'matching rooms<{len(rooms)}>')
             for room in rooms:
                 self.logger.info(room)
         else:
             self.logger.info('can not find any rooms ...')
-        file_box = None
         if msg.type() in [MessageType.MESSAGE_TYPE_IMAGE, MessageType.MESSAGE_TYPE_ATTACHMENT, MessageType.MESSAGE_TYPE_VIDEO]:
-            file_box = await msg.to_file_box()
-            
-            file_path = os.path.join(self.cache_dir, file_box.name)
-
-            await file_box.to_file(file_path, overwrite=True)
-            file_box = FileBox.from_file(file_path)
+            payload = file_payload(await media_cache.get_file(msg), msg.message_id)
+        else:
+            payload = forward_payload(msg.message_id)
 
         # 启用了此插件，则屏蔽掉所有其它插件
         message_controller.disable_all_plugins(msg)
-        
-        for room in rooms:
-            self.logger.info('forward to room: %s', room)
-            if file_box is None:
-                await msg.forward(room)
-                await asyncio.sleep(1)
-            else:
-                await room.say(file_box)
-                # sleep one second
-                await asyncio.sleep(self.file_box_interval_seconds)
+
+        targets = [
+            BroadcastTarget(id=room.room_id, name=room_directory.topics.get(room.room_id) or room.payload.topic)
+            for room in rooms
+        ]
+        record = await self.broadcaster.submit(self.bot, msg, talker, payload, targets)
+        if record is None:
+            self.logger.warning(f'message<{msg.message_id}> has been forwarded')
+            return
+        await talker.say(record.summary())
         self.logger.info('=================finish to forward message=================\n\n')
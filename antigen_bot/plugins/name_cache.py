@@ -0,0 +1,34 @@
+"""Keep the shared name cache up to date from the events"""
+from datetime import datetime
+from typing import List, Optional
+
+from wechaty import Contact, Message, Room, WechatyPluginOptions
+from wechaty.plugin import WechatyPlugin
+
+from antigen_bot.name_cache import name_cache
+
+
+class NameCachePlugin(WechatyPlugin):
+    """
+    功能点：
+        1. 从消息的payload中填充 id -> 名称/备注/群名称 的缓存，不产生额外的puppet调用
+        2. 群名称被修改时更新缓存，群成员变化时使成员的名称失效
+    """
+    def __init__(self, options: Optional[WechatyPluginOptions] = None):
+        super().__init__(options)
+
+    async def on_message(self, msg: Message) -> None:
+        """populate the cache from the payloads of message"""
+        name_cache.observe(msg.talker())
+        room = msg.room()
+        if room is not None:
+            name_cache.observe(room)
+
+    async def on_room_topic(self, room: Room, new_topic: str, old_topic: str, changer: Contact, date: datetime) -> None:
+        """update the topic of room"""
+        name_cache.set_topic(room.room_id, new_topic)
+
+    async def on_room_join(self, room: Room, invitees: List[Contact], inviter: Contact, date: datetime) -> None:
+        """the names of new members may be changed since they are cached"""
+        for contact in invitees:
+            name_cache.invalidate(contact.contact_id)
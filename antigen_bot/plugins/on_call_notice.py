@@ -1,30 +1,93 @@
 import json
 import os
 import re
-import time
+import uuid
 from typing import (
-    Dict, Optional, Any
+    Dict, Iterable, List, Optional, Tuple, Any
 )
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from wechaty import (
+    Contact,
     FileBox,
     MessageType,
+    Room,
+    Wechaty,
     WechatyPlugin,
     Message,
     WechatyPluginOptions
 )
 from wechaty_puppet import get_logger
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from antigen_bot.broadcast import UploadOnceFile
+from antigen_bot.building_index import building_index
+from antigen_bot.media_cache import media_cache
+from antigen_bot.room_directory import room_directory
+
+
+# eg: 3-15, 3~15, 3：15
+_BUILDING_RANGE = re.compile(r"\d+[\-:：~\u2014\u2026\uff5e\u3002]{1,2}\d+", re.A)
+_BUILDING_NUMBER = re.compile(r"\d+")
+
+# the plugins by name, which are used by the persistent jobs after restarting
+_plugins: Dict[str, 'OnCallNoticePlugin'] = {}
+
+
+async def run_scheduled_notice(plugin_name: str, **kwargs: Any) -> None:
+    """the job function of the scheduled notice, which must be importable to be stored in the job store"""
+    plugin = _plugins.get(plugin_name)
+    if plugin is None:
+        raise ValueError(f'plugin<{plugin_name}> is not found for the scheduled notice')
+    await plugin.send_scheduled_notice(**kwargs)
+
+
+def _parse_clock(clock: str, now: datetime) -> datetime:
+    """the next time of the clock, eg: 08:30 -> today or tomorrow at 08:30"""
+    parts = str(clock).split(':')
+    try:
+        hour, minute = int(parts[0]), int(parts[1])
+        run_date = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    except (IndexError, ValueError) as error:
+        raise ValueError(f'at should be 时:分, eg: 08:30, but receive <{clock}>') from error
+    if run_date <= now:
+        run_date += timedelta(days=1)
+    return run_date
+
+
+def _get_run_date(preset: Dict[str, Any], now: datetime) -> Optional[datetime]:
+    """get the time of the delayed (hold) or scheduled (at) notice, None to send it now
+
+    Raises:
+        ValueError: the hold or at is malformed
+    """
+    if "hold" in preset:
+        try:
+            return now + timedelta(seconds=float(preset["hold"]))
+        except (TypeError, ValueError, OverflowError) as error:
+            raise ValueError(f'hold should be the seconds, but receive <{preset["hold"]}>') from error
+    if "at" in preset:
+        return _parse_clock(preset["at"], now)
+    return None
 
 
 class OnCallNoticePlugin(WechatyPlugin):
     """
     功能点：
         1. 侦测"工作群"中或指定联系人的特定格式消息（key_words和楼号数字的任意组合），进行预设通知内容的触发
-        2. 应用于"[团购送达](https://github.com/ShanghaiITVolunteer/AntigenWechatBot/issues/25#issuecomment-1104817261)"、
+        2. 楼号与群的对应关系由群名称解析后建立索引（小区pre_fix -> 楼号 -> 群），随改名/进退群事件增量更新，通知时不再遍历所有群
+        3. 应用于"[团购送达](https://github.com/ShanghaiITVolunteer/AntigenWechatBot/issues/25#issuecomment-1104817261)"、
         "[核酸提醒](https://github.com/ShanghaiITVolunteer/AntigenWechatBot/issues/25#issuecomment-1104823018)"等需求场景
-        3. 配置文件：.wechaty/on_call_notice.json(存储keyword已经对应的回复文本（必须）、群聊名称pre_fix(必须）、回复媒体（存贮在media/）以及延迟时间）
+        4. 配置文件：.wechaty/on_call_notice.json(存储keyword已经对应的回复文本（必须）、群聊名称pre_fix(必须）、回复媒体（存贮在media/）以及延迟时间）
+        5. 延迟（hold：秒数）或定时（at：时:分）的通知存储在持久化的任务队列中，重启后依然有效；发送"定时列表"查看，"取消定时 编号"取消
     """
-    def __init__(self, options: Optional[WechatyPluginOptions] = None, config_file: str = '.wechaty/on_call_notice.json'):
+    def __init__(
+        self,
+        options: Optional[WechatyPluginOptions] = None,
+        config_file: str = '.wechaty/on_call_notice.json',
+        upload_once_media: bool = True,
+        job_store_url: str = 'sqlite:///.wechaty/on_call_notice_jobs.sqlite',
+    ):
         super().__init__(options)
         # 1. init the config file
         self.config_file = config_file
@@ -36,9 +99,39 @@ class OnCallNoticePlugin(WechatyPlugin):
         #self.dynamic_plugin = dynamic_plugin
 
         self.data = self._load_message_forwarder_configuration()
+        for spec in self.data.values():
+            if spec.get('pre_fix'):
+                building_index.add_prefix(spec['pre_fix'])
+        self.upload_once_media = upload_once_media
         self.listen_to_forward = {}   #记录转发状态
         self.last_loop = {}    #记录上一轮发送群名
 
+        # the jobs are paused until login, so the notices which are due during the restart are sent after login
+        self.scheduler = AsyncIOScheduler(
+            jobstores={'default': SQLAlchemyJobStore(url=job_store_url)},
+            job_defaults={'misfire_grace_time': None, 'coalesce': True},
+        )
+        _plugins[self.name] = self
+
+    async def init_plugin(self, wechaty: Wechaty) -> None:
+        self.start_scheduler()
+        return await super().init_plugin(wechaty)
+
+    def start_scheduler(self) -> None:
+        """start the scheduler in the running event loop"""
+        if not self.scheduler.running:
+            self.scheduler.start(paused=True)
+
+    async def on_login(self, contact: Contact) -> None:
+        """run the scheduled notices after login"""
+        self.start_scheduler()
+        self.scheduler.resume()
+
+    async def on_logout(self, contact: Contact) -> None:
+        """the notices can not be sent until the next login"""
+        if self.scheduler.running:
+            self.scheduler.pause()
+
     def _load_message_forwarder_configuration(self) -> Dict[str, Any]:
         """load the message forwarder configuration
 
@@ -59,42 +152,144 @@ class OnCallNoticePlugin(WechatyPlugin):
         for id in data.keys():
             if "auth" not in data[id].keys():
                 data[id]["auth"] = {date: []}
+            for word, preset in data[id].items():
+                if not isinstance(preset, dict) or word == "auth":
+                    continue
+                try:
+                    _get_run_date(preset, datetime.now())
+                except ValueError as error:
+                    self.logger.error(f'the preset<{word}> of <{id}> is malformed: {error}')
         return data
 
-    async def forward_message(self, id, msg: Message, regex):
+    async def resolve_rooms(self, pre_fix: str, words: Iterable[str]) -> List[Tuple[Room, str]]:
+        """resolve the rooms of the buildings from the building index, or all of the rooms before it's ready
+
+        Args:
+            pre_fix (str): the pre_fix of the community
+            words (Iterable[str]): the building numbers, the other words are matched with the topics in memory
+
+        Returns:
+            List[Tuple[Room, str]]: the rooms with the topics, sorted by topic
+        """
+        words = set(words) - {"转发"}
+        numbers = {word for word in words if _BUILDING_NUMBER.fullmatch(word)}
+        others = {word for word in words - numbers if not _BUILDING_RANGE.search(word)}
+        if not numbers and not others:
+            return []
+
+        if room_directory.ready:
+            room_ids = building_index.find(pre_fix, numbers) | building_index.scan(pre_fix, others)
+            rooms = [(room_directory.get(room_id), room_directory.topics.get(room_id)) for room_id in room_ids]
+            return sorted(
+                [(room, topic) for room, topic in rooms if room is not None and topic is not None],
+                key=lambda item: item[1]
+            )
+
+        regex = re.compile(r"{0}.*\D({1})\D.*".format(pre_fix, "|".join(map(re.escape, numbers | others))))
+        rooms = []
+        for room in await self.bot.Room.find_all():
+            await room.ready()
+            topic = room.payload.topic
+            if regex.search(topic):
+                rooms.append((room, topic))
+        return sorted(rooms, key=lambda item: item[1])
+
+    async def forward_message(self, id, msg: Message, target: Tuple[str, List[str]]):
         """forward the message to the target conversations
 
         Args:
             msg (Message): the message to forward
-            regex (the compile object): the conversation filter
+            target (Tuple[str, List[str]]): the pre_fix and the building words of the conversations
         """
-        rooms = await self.bot.Room.find_all()
+        rooms = await self.resolve_rooms(*target)
 
         self.last_loop[id] = []
 
         if msg.type() in [MessageType.MESSAGE_TYPE_IMAGE, MessageType.MESSAGE_TYPE_VIDEO, MessageType.MESSAGE_TYPE_ATTACHMENT]:
-            file_box = await msg.to_file_box()
-            file_path = '.wechaty/' + file_box.name
-            await file_box.to_file(file_path, overwrite=True)
-            file_box = FileBox.from_file(file_path)
-
-            for room in rooms:
-                await room.ready()
-                topic = room.payload.topic
-                if regex.search(topic) and file_box:
-                    await room.say(file_box)
-                    self.last_loop[id].append(topic)
+            send_file = UploadOnceFile(await media_cache.get_file_box(msg), enabled=self.upload_once_media)
+
+            for room, topic in rooms:
+                await send_file(room)
+                self.last_loop[id].append(topic)
 
         if msg.type() in [MessageType.MESSAGE_TYPE_TEXT, MessageType.MESSAGE_TYPE_URL, MessageType.MESSAGE_TYPE_MINI_PROGRAM]:
-            for room in rooms:
-                await room.ready()
-                topic = room.payload.topic
-                if regex.search(topic):
-                    await msg.forward(room)
-                    self.last_loop[id].append(topic)
+            for room, topic in rooms:
+                await msg.forward(room)
+                self.last_loop[id].append(topic)
 
         self.logger.info('=================finish to On_call_Notice=================\n\n')
 
+    async def notify_rooms(self, pre_fix: str, words: Iterable[str], reply: str, media: Optional[str]) -> List[str]:
+        """send the reply & media to the rooms of the buildings
+
+        Returns:
+            List[str]: the topics of the notified rooms
+        """
+        file_box = FileBox.from_file("media/" + media) if media else None
+        send_file = UploadOnceFile(file_box, enabled=self.upload_once_media) if file_box else None
+
+        topics = []
+        for room, topic in await self.resolve_rooms(pre_fix, words):
+            await room.say(reply)
+            if send_file:
+                await send_file(room)
+            topics.append(topic)
+        return topics
+
+    async def _say_result(self, conversation: Any, talker_id: str, topics: List[str]) -> None:
+        """send the result of the notice to the admin"""
+        info = "已转发，@我并发送查询，查看转发群记录" if topics else "呵呵，未找到可通知的群，请重试"
+        if isinstance(conversation, Room):
+            await conversation.say(info, [talker_id])
+        else:
+            await conversation.say(info)
+
+    def schedule_notice(self, run_date: datetime, word: str, **kwargs: Any) -> str:
+        """store the notice in the job store
+
+        Returns:
+            str: the id of job
+        """
+        job_id = uuid.uuid4().hex[:8]
+        self.scheduler.add_job(
+            run_scheduled_notice,
+            trigger='date',
+            run_date=run_date,
+            id=job_id,
+            name=f'{word} {",".join(sorted(kwargs["words"]))}',
+            kwargs=dict(plugin_name=self.name, **kwargs),
+            replace_existing=True,
+        )
+        return job_id
+
+    async def send_scheduled_notice(
+        self,
+        token: str,
+        talker_id: str,
+        conversation_id: str,
+        conversation_type: str,
+        pre_fix: str,
+        words: List[str],
+        reply: str,
+        media: Optional[str] = None,
+    ) -> None:
+        """send the notice when the job is due"""
+        self.logger.info('=================start to scheduled On_call_Notice=================')
+        topics = await self.notify_rooms(pre_fix, words, reply, media)
+        self.last_loop[talker_id] = topics
+        self.logger.info('=================finish to scheduled On_call_Notice=================\n\n')
+
+        if conversation_type == 'Room':
+            conversation = self.bot.Room.load(conversation_id)
+        else:
+            conversation = self.bot.Contact.load(conversation_id)
+        await self._say_result(conversation, talker_id, topics)
+
+    def get_scheduled_jobs(self, token: str) -> list:
+        """get the pending notices of the admin, the earliest first"""
+        jobs = [job for job in self.scheduler.get_jobs() if job.kwargs.get('token') == token]
+        return sorted(jobs, key=lambda job: job.next_run_time)
+
     async def on_message(self, msg: Message) -> None:
         if msg.is_self() or msg.talker().contact_id == "weixin":
             return
@@ -175,27 +370,51 @@ class OnCallNoticePlugin(WechatyPlugin):
             await msg.say("呵呵，你没有权限哦~")
             return
 
+        if text == "定时列表":
+            jobs = self.get_scheduled_jobs(token)
+            if jobs:
+                await msg.say("\n".join(
+                    "{0}\t{1:%m-%d %H:%M:%S}\t{2}".format(job.id, job.next_run_time, job.name) for job in jobs
+                ))
+            else:
+                await msg.say("当前没有待发送的定时通知")
+            return
+
+        if text.startswith("取消定时"):
+            job_id = text[len("取消定时"):].strip()
+            job = self.scheduler.get_job(job_id) if job_id else None
+            if job is None or job.kwargs.get('token') != token:
+                await msg.say("未找到编号为【{}】的定时通知".format(job_id))
+            else:
+                job.remove()
+                await msg.say("已取消定时通知【{0}】{1}".format(job_id, job.name))
+            return
+
         words = re.split(r"\s+?", text)
 
         # 4. 检查msg.text()是否包含关键词
         reply = ""
-        file_box = None
+        media = None
+        keyword = None
+        run_date = None
         for word in words:
             if word in spec.keys():
                 self.logger.info('=================start to On_call_Notice=================')
                 await talker.ready()
                 self.logger.info('message: %s', msg)
 
-                if "hold" in spec[word].keys():
-                    await msg.say("收到，等待{0}秒后，按预设【{1}】进行发送".format(spec[word]["hold"], word))
-                    time.sleep(spec[word]["hold"])
-                else:
+                keyword = word
+                try:
+                    run_date = _get_run_date(spec[word], datetime.now())
+                except ValueError as error:
+                    self.logger.error(f'the preset<{word}> of <{token}> is malformed: {error}')
+                    await msg.say("预设【{0}】的定时配置有误，通知未触发：{1}".format(word, error))
+                    return
+                if run_date is None:
                     await msg.say("收到，现在开始按预设【{}】进行发送".format(word))
 
                 reply = spec[word].get("reply")
-
-                if "media" in spec[word].keys():
-                    file_box = FileBox.from_file("media/" + spec[word]["media"])
+                media = spec[word].get("media")
                 words.remove(word)
 
         if (not reply) and ("转发" not in words):
@@ -210,7 +429,7 @@ class OnCallNoticePlugin(WechatyPlugin):
 
         words_more = []
         for word in words:
-            if re.search(r"\d+[\-:：~\u2014\u2026\uff5e\u3002]{1,2}\d+", word, re.A):
+            if _BUILDING_RANGE.search(word):
                 two_num = re.findall(r"\d+", word, re.A)
                 if len(two_num) == 2:
                     try:
@@ -228,38 +447,35 @@ class OnCallNoticePlugin(WechatyPlugin):
         words.extend(words_more)
         words = set(filter(None, words))
 
-        regex_words = "|".join(words)
-        if len(regex_words) == 0:
+        if not words:
             await msg.say("呵呵，未找到可通知的群，请重试")
             return
-        regex = re.compile(r"{0}.*\D({1})\D.*".format(pre_fix, regex_words))
 
         if "转发" in words:
-            self.listen_to_forward[talker.contact_id] = [regex, token, id]
+            self.listen_to_forward[talker.contact_id] = [(pre_fix, sorted(words)), token, id]
             #这一步分别存储 转发规则、授权来源和对话号，后二者用于后续鉴权
             return
 
-        rooms = await self.bot.Room.find_all()
+        if run_date is not None:
+            job_id = self.schedule_notice(
+                run_date,
+                keyword,
+                token=token,
+                talker_id=talker.contact_id,
+                conversation_id=id,
+                conversation_type='Room' if msg.room() else 'Contact',
+                pre_fix=pre_fix,
+                words=sorted(words),
+                reply=reply,
+                media=media,
+            )
+            await msg.say("收到，将于{0:%m-%d %H:%M:%S}按预设【{1}】进行发送，编号：{2}（发送\"取消定时 {2}\"可取消）".format(
+                run_date, keyword, job_id
+            ))
+            return
 
-        self.last_loop[talker.contact_id] = []
-        for room in rooms:
-            await room.ready()
-            topic = room.payload.topic
-            if regex.search(topic):
-                await room.say(reply)
-                if file_box:
-                    await room.say(file_box)
-                self.last_loop[talker.contact_id].append(topic)
+        self.last_loop[talker.contact_id] = await self.notify_rooms(pre_fix, words, reply, media)
 
         self.logger.info('=================finish to On_call_Notice=================\n\n')
 
-        if msg.room():
-            if self.last_loop.get(talker.contact_id, []):
-                await msg.room().say("已转发，@我并发送查询，查看转发群记录", [talker.contact_id])
-            else:
-                await msg.room().say("呵呵，未找到可通知的群，请重试", [talker.contact_id])
-        else:
-            if self.last_loop.get(talker.contact_id, []):
-                await msg.say("已转发，@我并发送查询，查看转发群记录")
-            else:
-                await msg.say("呵呵，未找到可通知的群，请重试")
\ No newline at end of file
+        await self._say_result(msg.room() or msg, talker.contact_id, self.last_loop[talker.contact_id])
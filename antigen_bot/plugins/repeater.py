@@ -22,6 +22,7 @@ class RepeaterPlugin(WechatyPlugin):
 
         self.room_ids = room_ids
 
+    @message_controller.subscribe(room_ids=lambda plugin: plugin.room_ids, types=(MessageType.MESSAGE_TYPE_TEXT,))
     @message_controller.may_disable_message
     async def on_message(self, msg: Message) -> None:
         """listen message event"""
@@ -0,0 +1,76 @@
+"""Keep the room directory up to date from the events"""
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+
+from wechaty import Contact, Message, Room, RoomInvitation, WechatyPluginOptions
+from wechaty.plugin import WechatyPlugin
+
+from antigen_bot.room_directory import room_directory
+
+
+class RoomDirectoryPlugin(WechatyPlugin):
+    """
+    功能点：
+        1. 登录后加载一次所有的群（id与群名称），之后只通过 room-join/room-leave/room-topic/room-invite 事件增量更新
+        2. 转发类插件直接在内存中匹配目标群，不再每次转发都遍历所有群
+    """
+    def __init__(self, options: Optional[WechatyPluginOptions] = None, invite_sync_delay_seconds: float = 5):
+        super().__init__(options)
+        self.invite_sync_delay_seconds = invite_sync_delay_seconds
+
+    def _is_self(self, contacts: List[Contact]) -> bool:
+        self_id = self.bot.user_self().contact_id
+        return any(contact.contact_id == self_id for contact in contacts)
+
+    async def build(self) -> None:
+        """build the directory from all of the rooms"""
+        rooms = await self.bot.Room.find_all()
+        await room_directory.build(rooms)
+
+    async def sync_new_rooms(self) -> None:
+        """add the rooms which are not in the directory, eg: after the invitation is accepted"""
+        for room in await self.bot.Room.find_all():
+            if room.room_id not in room_directory:
+                await self.add_room(room)
+
+    async def add_room(self, room: Room) -> None:
+        """add the room with its topic"""
+        await room.ready()
+        room_directory.set_room(room, room.payload.topic)
+
+    async def on_login(self, contact: Contact) -> None:
+        """build the directory in background, the forwarders fall back to enumerating rooms until it's ready"""
+        asyncio.ensure_future(self.build())
+
+    async def on_logout(self, contact: Contact) -> None:
+        """the rooms are reloaded after the next login"""
+        room_directory.clear()
+
+    async def on_message(self, msg: Message) -> None:
+        """add the room missed by the events"""
+        room = msg.room()
+        if room is not None and room_directory.ready and room.room_id not in room_directory and room.is_ready():
+            room_directory.set_room(room, room.payload.topic)
+
+    async def on_room_join(self, room: Room, invitees: List[Contact], inviter: Contact, date: datetime) -> None:
+        """the bot joins the room"""
+        if room.room_id not in room_directory and self._is_self(invitees):
+            await self.add_room(room)
+
+    async def on_room_leave(self, room: Room, leavers: List[Contact], remover: Contact, date: datetime) -> None:
+        """the bot leaves or is removed from the room"""
+        if self._is_self(leavers):
+            room_directory.remove_room(room.room_id)
+
+    async def on_room_topic(self, room: Room, new_topic: str, old_topic: str, changer: Contact, date: datetime) -> None:
+        """update the topic of room"""
+        room_directory.set_room(room, new_topic)
+
+    async def _sync_later(self) -> None:
+        await asyncio.sleep(self.invite_sync_delay_seconds)
+        await self.sync_new_rooms()
+
+    async def on_room_invite(self, room_invitation: RoomInvitation) -> None:
+        """the invitation may be accepted by other plugins, so sync the new rooms later"""
+        asyncio.ensure_future(self._sync_later())
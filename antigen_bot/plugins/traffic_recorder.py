@@ -0,0 +1,46 @@
+"""Record the production message traffic for load testing"""
+import os
+from typing import List, Optional
+
+from wechaty import Contact, Message, WechatyPluginOptions
+from wechaty.plugin import WechatyPlugin
+
+from antigen_bot.traffic import ADMIN_ALIAS_PREFIX, SELF_ALIAS, TraceWriter
+
+
+class TrafficRecorderPlugin(WechatyPlugin):
+    """
+    功能点：
+        1. 将收到的所有消息（类型、发送者、群、文本、艾特列表以及时间）记录到压缩的trace文件中，其中的id均已匿名化
+        2. 通过 benchmarks/replay.py 回放trace文件，从而在没有微信账号的情况下进行压测
+        3. 管理员（admin_ids 或环境变量 TRAFFIC_TRACE_ADMIN_IDS，逗号分隔）以及机器人自身使用固定的别名 admin-0/bot-self 记录，
+            回放时依此生成管理员配置，从而覆盖管理员的转发路径
+    """
+    def __init__(
+        self,
+        options: Optional[WechatyPluginOptions] = None,
+        trace_file: str = '.wechaty/traffic.jsonl.gz',
+        salt: Optional[str] = None,
+        admin_ids: Optional[List[str]] = None,
+    ):
+        super().__init__(options)
+        os.makedirs(os.path.dirname(trace_file) or '.', exist_ok=True)
+        salt = salt if salt is not None else os.environ.get('TRAFFIC_TRACE_SALT', '')
+        if admin_ids is None:
+            admin_ids = [item.strip() for item in os.environ.get('TRAFFIC_TRACE_ADMIN_IDS', '').split(',')]
+        aliases = {
+            admin_id: f'{ADMIN_ALIAS_PREFIX}{index}' for index, admin_id in enumerate(filter(None, admin_ids))
+        }
+        self.writer = TraceWriter(trace_file, salt=salt, aliases=aliases)
+
+    async def on_login(self, contact: Contact) -> None:
+        """record the bot itself with the alias, so the mentions of bot are kept in the replay"""
+        self.writer.aliases[contact.contact_id] = SELF_ALIAS
+
+    async def on_message(self, msg: Message) -> None:
+        """record the message event"""
+        self.writer.record(msg)
+
+    async def on_logout(self, contact: Contact) -> None:
+        """write the buffered events, they are written at exit too"""
+        self.writer.close()
@@ -0,0 +1,130 @@
+"""In-memory directory of the rooms which the bot is in"""
+from __future__ import annotations
+import asyncio
+import inspect
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from wechaty import Room
+from wechaty_puppet import get_logger
+
+from antigen_bot.matcher import Matcher
+from antigen_bot.name_cache import name_cache
+
+
+logger = get_logger('RoomDirectory')
+
+# listener(room, topic, old_topic): topic is None when the room is removed, old_topic is None when it's added
+RoomListener = Callable[[Room, Optional[str], Optional[str]], Any]
+
+
+class RoomDirectory:
+    """Keep the rooms with the id & topic indexes in memory.
+
+    It's built once after login by RoomDirectoryPlugin, and then updated by the room events,
+    so resolving the target rooms never enumerates the rooms through the puppet.
+    """
+    _instance: Optional[RoomDirectory] = None
+
+    def __init__(self) -> None:
+        self.rooms: Dict[str, Room] = {}
+        self.topics: Dict[str, str] = {}
+        self._ids_by_topic: Dict[str, Set[str]] = {}
+        self._listeners: List[RoomListener] = []
+        self.ready = False
+
+    @classmethod
+    def instance(cls) -> RoomDirectory:
+        """singleton pattern for RoomDirectory"""
+        if cls._instance is None:
+            cls._instance = RoomDirectory()
+        return cls._instance
+
+    def add_listener(self, listener: RoomListener) -> None:
+        """listen to the rooms added, removed or renamed"""
+        self._listeners.append(listener)
+
+    def _notify(self, room: Room, topic: Optional[str], old_topic: Optional[str]) -> None:
+        for listener in self._listeners:
+            try:
+                result = listener(room, topic, old_topic)
+                if inspect.isawaitable(result):
+                    asyncio.ensure_future(result)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.error(f'room listener failed: {error}')
+
+    async def build(self, rooms: List[Room], concurrency: int = 16) -> None:
+        """build the directory from all of the rooms, loading the topics concurrently"""
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+        async def load_topic(room: Room) -> str:
+            async with semaphore:
+                return await name_cache.get_topic(room)
+
+        topics = await asyncio.gather(*[load_topic(room) for room in rooms])
+        for room, topic in zip(rooms, topics):
+            self.set_room(room, topic)
+        self.ready = True
+        logger.info(f'room directory is built with rooms<{len(self.rooms)}>')
+
+    def set_room(self, room: Room, topic: str) -> None:
+        """add the room or update its topic"""
+        room_id = room.room_id
+        old_topic = self.topics.get(room_id)
+        if room_id in self.rooms and old_topic == topic:
+            return
+
+        if old_topic is not None:
+            ids = self._ids_by_topic.get(old_topic)
+            if ids is not None:
+                ids.discard(room_id)
+                if not ids:
+                    self._ids_by_topic.pop(old_topic)
+
+        self.rooms[room_id] = room
+        self.topics[room_id] = topic
+        self._ids_by_topic.setdefault(topic, set()).add(room_id)
+        self._notify(room, topic, old_topic)
+
+    def remove_room(self, room_id: str) -> None:
+        """remove the room which the bot leaves"""
+        room = self.rooms.pop(room_id, None)
+        if room is None:
+            return
+        topic = self.topics.pop(room_id)
+        ids = self._ids_by_topic.get(topic)
+        if ids is not None:
+            ids.discard(room_id)
+            if not ids:
+                self._ids_by_topic.pop(topic)
+        self._notify(room, None, topic)
+
+    def clear(self) -> None:
+        """remove all of the rooms, eg: after logout"""
+        self.rooms.clear()
+        self.topics.clear()
+        self._ids_by_topic.clear()
+        self.ready = False
+
+    def __contains__(self, room_id: str) -> bool:
+        return room_id in self.rooms
+
+    def __len__(self) -> int:
+        return len(self.rooms)
+
+    def get(self, room_id: str) -> Optional[Room]:
+        """get the room by id"""
+        return self.rooms.get(room_id)
+
+    def find_by_topic(self, topic: str) -> List[Room]:
+        """get the rooms with the topic"""
+        return [self.rooms[room_id] for room_id in self._ids_by_topic.get(topic, ())]
+
+    async def match(self, matcher: Matcher) -> List[Room]:
+        """resolve the rooms matched by ids or topics in memory"""
+        return [
+            room for room_id, room in list(self.rooms.items())
+            if await matcher.match_with_name(room, self.topics[room_id])
+        ]
+
+
+room_directory = RoomDirectory.instance()
@@ -0,0 +1,152 @@
+"""Record the incoming message events into a compact trace file, and read them back
+
+The trace is a gzipped json-lines file with one gzip member per flushed batch, so the file is always readable
+even if the bot is killed before closing it. One event per line:
+    {"t": 1.25, "ty": 6, "f": "c1f0...", "r": "9a3e...", "tp": "嘉怡3号楼组群", "x": "hello", "m": [], "s": false}
+
+    t: seconds since the first event      ty: the value of MessageType
+    f: anonymized talker id               r: anonymized room id, empty for private messages
+    tp: room topic if it is loaded        x: the text of message
+    m: anonymized mention ids             s: if the message is sent by the bot itself
+
+The ids in `aliases` are recorded with the stable names instead of the hashes, eg: the configured admins as
+`admin-0`, so the replay config can authorize them.
+"""
+from __future__ import annotations
+import atexit
+import gzip
+import hashlib
+import json
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+from wechaty import Message
+from wechaty_puppet import get_logger
+
+
+logger = get_logger('Traffic')
+
+ADMIN_ALIAS_PREFIX = 'admin-'
+SELF_ALIAS = 'bot-self'
+
+
+def anonymize(identifier: str, salt: str = '') -> str:
+    """map the id of contact/room to a stable anonymous id"""
+    if not identifier:
+        return ''
+    return hashlib.md5(f'{salt}{identifier}'.encode('utf-8')).hexdigest()[:16]
+
+
+@dataclass
+class TraceEvent:
+    """one message event in the trace"""
+    offset: float
+    type: int
+    talker_id: str
+    room_id: str = ''
+    topic: str = ''
+    text: str = ''
+    mention_ids: List[str] = field(default_factory=list)
+    is_self: bool = False
+
+    def to_dict(self) -> dict:
+        """get the compact dict of event"""
+        return dict(
+            t=round(self.offset, 3), ty=self.type, f=self.talker_id, r=self.room_id,
+            tp=self.topic, x=self.text, m=self.mention_ids, s=self.is_self
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> TraceEvent:
+        """load the event from the compact dict"""
+        return cls(
+            offset=data['t'], type=data['ty'], talker_id=data['f'], room_id=data.get('r', ''),
+            topic=data.get('tp', ''), text=data.get('x', ''), mention_ids=data.get('m', []),
+            is_self=data.get('s', False)
+        )
+
+
+class TraceWriter:
+    """append the message events into the trace file, every flush writes a complete gzip member"""
+    def __init__(
+        self,
+        file: str,
+        salt: str = '',
+        flush_every: int = 50,
+        flush_interval_seconds: float = 10,
+        aliases: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.file = file
+        self.salt = salt
+        self.aliases: Dict[str, str] = dict(aliases or {})
+        self.flush_every = flush_every
+        self.flush_interval_seconds = flush_interval_seconds
+
+        self._start: Optional[float] = None
+        self._lines: List[str] = []
+        self._last_flush = time.monotonic()
+        atexit.register(self.close)
+
+    def anonymize(self, identifier: str) -> str:
+        """get the alias of the id, or the anonymous id"""
+        if identifier in self.aliases:
+            return self.aliases[identifier]
+        return anonymize(identifier, self.salt)
+
+    def record(self, msg: Message) -> TraceEvent:
+        """record the message without any puppet call"""
+        now = time.monotonic()
+        if self._start is None:
+            self._start = now
+
+        room = msg.room()
+        topic = ''
+        if room is not None and room.is_ready():
+            topic = room.payload.topic
+
+        event = TraceEvent(
+            offset=now - self._start,
+            type=int(msg.type()),
+            talker_id=self.anonymize(msg.talker().contact_id),
+            room_id=self.anonymize(room.room_id) if room else '',
+            topic=topic,
+            text=msg.text(),
+            mention_ids=[self.anonymize(contact_id) for contact_id in (msg.payload.mention_ids or [])],
+            is_self=msg.is_self(),
+        )
+        self._lines.append(json.dumps(event.to_dict(), ensure_ascii=False) + '\n')
+
+        if len(self._lines) >= self.flush_every or now - self._last_flush >= self.flush_interval_seconds:
+            self.flush()
+        return event
+
+    def flush(self) -> None:
+        """write the buffered events as one gzip member"""
+        self._last_flush = time.monotonic()
+        if not self._lines:
+            return
+        data = gzip.compress(''.join(self._lines).encode('utf-8'))
+        with open(self.file, 'ab') as handler:
+            handler.write(data)
+        self._lines = []
+
+    def close(self) -> None:
+        """flush the buffered events, the writer keeps no file open between the flushes"""
+        self.flush()
+
+
+def read_trace(file: str) -> Iterator[TraceEvent]:
+    """read the events from the trace file, and stop at the truncated tail of a killed writer"""
+    with gzip.open(file, 'rt', encoding='utf-8') as handler:
+        try:
+            for line in handler:
+                if not line.endswith('\n'):
+                    logger.warning(f'trace<{file}> ends with an incomplete event')
+                    return
+                line = line.strip()
+                if line:
+                    yield TraceEvent.from_dict(json.loads(line))
+        except (EOFError, gzip.BadGzipFile, zlib.error) as error:
+            logger.warning(f'trace<{file}> is truncated: {error}')
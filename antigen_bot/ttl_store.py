@@ -0,0 +1,187 @@
+"""Bounded key-value store with time-based expiry"""
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Iterator, Optional, Tuple
+
+
+class SqliteBackend:
+    """persist the entries of TTLStore into a sqlite file
+
+    Writes are committed in batches, so that the per-message cost stays small. At most
+    `commit_interval` seconds of entries can be lost when the process is killed.
+    """
+    def __init__(self, file: str, commit_interval: float = 1.0, commit_size: int = 500) -> None:
+        dir_name = os.path.dirname(file)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+
+        self.file = file
+        self.commit_interval = commit_interval
+        self.commit_size = commit_size
+
+        self._conn = sqlite3.connect(file)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, expire_at REAL)'
+        )
+        self._conn.commit()
+
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def load(self, now: float) -> Iterator[Tuple[str, Any, float]]:
+        """load the entries which are not expired, ordered by the expire time"""
+        self._conn.execute('DELETE FROM entries WHERE expire_at <= ?', (now,))
+        self._conn.commit()
+        rows = self._conn.execute('SELECT key, value, expire_at FROM entries ORDER BY expire_at')
+        for key, value, expire_at in rows:
+            yield key, json.loads(value), expire_at
+
+    def set(self, key: str, value: Any, expire_at: float) -> None:
+        """insert or update the entry"""
+        self._conn.execute(
+            'INSERT OR REPLACE INTO entries (key, value, expire_at) VALUES (?, ?, ?)',
+            (key, json.dumps(value, ensure_ascii=False), expire_at)
+        )
+        self._touch()
+
+    def delete(self, key: str) -> None:
+        """delete the entry"""
+        self._conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+        self._touch()
+
+    def _touch(self) -> None:
+        self._pending += 1
+        if self._pending >= self.commit_size or time.monotonic() - self._last_commit >= self.commit_interval:
+            self.commit()
+
+    def commit(self) -> None:
+        """flush the pending writes into the sqlite file"""
+        self._conn.commit()
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def close(self) -> None:
+        """commit and close the connection"""
+        self.commit()
+        self._conn.close()
+
+
+class TTLStore:
+    """Store the entries with time-to-live and a hard size limit
+
+    Entries are kept in an OrderedDict in expiry order: every write moves the key to the
+    end, so the expired and the oldest entries are always at the head and a sweep only
+    touches the entries it removes.
+    """
+    def __init__(
+        self,
+        ttl_seconds: float = 24 * 60 * 60,
+        max_size: int = 100_000,
+        backend: Optional[SqliteBackend] = None,
+    ) -> None:
+        if ttl_seconds <= 0:
+            raise ValueError('ttl_seconds should greater than 0')
+        if max_size <= 0:
+            raise ValueError('max_size should greater than 0')
+
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.backend = backend
+
+        self._data: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+
+        if backend is not None:
+            for key, value, expire_at in backend.load(time.time()):
+                self._data[key] = (expire_at, value)
+            self._evict_overflow()
+
+    def _sweep(self, now: float) -> None:
+        """remove the expired entries at the head of the store"""
+        data = self._data
+        while data:
+            key, (expire_at, _) = next(iter(data.items()))
+            if expire_at > now:
+                break
+            data.popitem(last=False)
+            if self.backend is not None:
+                self.backend.delete(key)
+
+    def _evict_overflow(self) -> None:
+        """remove the oldest entries which exceed the max size"""
+        while len(self._data) > self.max_size:
+            key, _ = self._data.popitem(last=False)
+            if self.backend is not None:
+                self.backend.delete(key)
+
+    def set(self, key: str, value: Any = True) -> None:
+        """set the value and refresh the expire time of the key"""
+        now = time.time()
+        expire_at = now + self.ttl_seconds
+
+        self._data[key] = (expire_at, value)
+        self._data.move_to_end(key)
+        if self.backend is not None:
+            self.backend.set(key, value, expire_at)
+
+        self._sweep(now)
+        self._evict_overflow()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """get the value of the key if it is not expired"""
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expire_at, value = item
+        if expire_at <= time.time():
+            return default
+        return value
+
+    def add(self, key: str) -> bool:
+        """add the key if it not exists
+
+        Returns:
+            bool: if the key already exists
+        """
+        if key in self:
+            return True
+        self.set(key)
+        return False
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        """remove the key and return the value of it"""
+        item = self._data.pop(key, None)
+        if item is None:
+            return default
+        if self.backend is not None:
+            self.backend.delete(key)
+        expire_at, value = item
+        if expire_at <= time.time():
+            return default
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        item = self._data.get(key)
+        return item is not None and item[0] > time.time()
+
+    def __getitem__(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None or item[0] <= time.time():
+            raise KeyError(key)
+        return item[1]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.set(key, value)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def close(self) -> None:
+        """close the backend"""
+        if self.backend is not None:
+            self.backend.close()
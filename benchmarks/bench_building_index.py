@@ -0,0 +1,51 @@
+"""Benchmark resolving the OnCallNotice buildings from the building index against scanning all rooms
+
+Usage:
+    python -m benchmarks.bench_building_index
+"""
+from __future__ import annotations
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from antigen_bot.plugins.on_call_notice import OnCallNoticePlugin
+from antigen_bot.room_directory import room_directory
+from benchmarks import fakes
+from benchmarks.fakes import FakeBot, FakeRoom
+
+
+async def measure(plugin: OnCallNoticePlugin, words, rounds: int = 5) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await plugin.resolve_rooms('嘉怡', words)
+    return (time.perf_counter() - start) / rounds
+
+
+async def main():
+    fakes.RPC_LATENCY = 0.002
+    words = [str(number) for number in range(3, 16)]
+    with tempfile.TemporaryDirectory() as work_dir:
+        config_file = os.path.join(work_dir, 'on_call_notice.json')
+        with open(config_file, 'w', encoding='utf-8') as f:
+            json.dump({'admin': {'pre_fix': '嘉怡'}}, f)
+
+        for count in (100, 400, 1600):
+            rooms = [FakeRoom(f'room-{index}', topic=f'嘉怡小区{index}号楼') for index in range(count)]
+            plugin = OnCallNoticePlugin(config_file=config_file, job_store_url=f'sqlite:///{work_dir}/jobs.sqlite')
+            FakeBot(plugins=[plugin], rooms=rooms)
+
+            room_directory.clear()
+            scan_seconds = await measure(plugin, words)
+
+            await room_directory.build(rooms)
+            index_seconds = await measure(plugin, words)
+
+            print(f'rooms<{count}> buildings<3-15> rpc<{fakes.RPC_LATENCY * 1000:.0f}ms>')
+            print(f'  scan rooms:      {scan_seconds * 1000:8.1f} ms/notice')
+            print(f'  building index:  {index_seconds * 1000:8.3f} ms/notice')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
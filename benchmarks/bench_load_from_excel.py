@@ -0,0 +1,122 @@
+"""Benchmark building the conv2convs configuration from the group & admin sheets,
+and the startup time with and without the snapshot
+
+Usage:
+    python -m benchmarks.bench_load_from_excel
+"""
+from __future__ import annotations
+import os
+import tempfile
+import time
+from typing import List, Tuple
+
+from pandas import DataFrame, ExcelWriter, read_excel
+
+from antigen_bot.forward_config import Conv2ConvsConfig, Conversation, build_configs, load_from_excel
+
+
+def legacy_build_configs(group_df: DataFrame, admin_df: DataFrame) -> List[Conv2ConvsConfig]:
+    """the building before vectorization: filter both sheets for every group and iterrows"""
+    configs: List[Conv2ConvsConfig] = []
+    group_names = list(set(group_df.group_name))
+
+    for group_name in group_names:
+        config: Conv2ConvsConfig = Conv2ConvsConfig(name=group_name)
+
+        group_df_group_name = group_df[group_df.group_name == group_name]
+        for _, row in group_df_group_name.iterrows():
+            config.target_conversations[str(row.id)] = Conversation(
+                name=row['name'], id=row['id'], type=row['type'], no=row['no']
+            )
+        admin_df_group_name = admin_df[admin_df.group_name == group_name]
+        for _, row in admin_df_group_name.iterrows():
+            config.admins[str(row.id)] = Conversation(
+                name=row['name'], id=row['id'], type=row['type'], no=row['no']
+            )
+        configs.append(config)
+    return configs
+
+
+def build_sheets(rows: int, group_size: int = 30, admins_per_group: int = 3) -> Tuple[DataFrame, DataFrame]:
+    """a district-level sheet: every community has `group_size` building rooms"""
+    groups = max(rows // group_size, 1)
+    group_df = DataFrame(dict(
+        group_name=[f'小区-{index // group_size}' for index in range(rows)],
+        name=[f'小区-{index // group_size}-{index % group_size}号楼' for index in range(rows)],
+        id=[f'{index}@chatroom' for index in range(rows)],
+        type=['Room'] * rows,
+        no=[index % group_size for index in range(rows)],
+    ))
+    admin_rows = groups * admins_per_group
+    admin_df = DataFrame(dict(
+        group_name=[f'小区-{index // admins_per_group}' for index in range(admin_rows)],
+        name=[f'管理员-{index}' for index in range(admin_rows)],
+        id=[f'wxid_{index}' for index in range(admin_rows)],
+        type=['Contact'] * admin_rows,
+        no=['-'] * admin_rows,
+    ))
+    return group_df, admin_df
+
+
+def assert_identical(configs: List[Conv2ConvsConfig], expected: List[Conv2ConvsConfig]) -> None:
+    """the order of the configs is not defined by the legacy building"""
+    assert sorted(configs, key=lambda config: config.name) == sorted(expected, key=lambda config: config.name)
+
+
+def main():
+    for file in ['./tests/data/conv2convs_config.xlsx', './tests/data/conv2convs_multi_config.xlsx']:
+        group_df = read_excel(file, sheet_name='group')
+        admin_df = read_excel(file, sheet_name='admins')
+        assert_identical(build_configs(group_df, admin_df), legacy_build_configs(group_df, admin_df))
+    print('identical output on the test workbooks')
+
+    for rows in (10_000, 100_000):
+        group_df, admin_df = build_sheets(rows)
+
+        start = time.perf_counter()
+        legacy = legacy_build_configs(group_df, admin_df)
+        legacy_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        configs = build_configs(group_df, admin_df)
+        seconds = time.perf_counter() - start
+
+        assert_identical(configs, legacy)
+        print(f'rows<{rows}> groups<{len(configs)}>')
+        print(f'  legacy:     {legacy_seconds * 1000:10.1f} ms')
+        print(f'  vectorized: {seconds * 1000:10.1f} ms  ({legacy_seconds / seconds:.0f}x)')
+
+    startup_main()
+
+
+def measure_startup(file: str, snapshot_dir: str) -> None:
+    """the cold start parses the workbook, the warm start loads the snapshot"""
+    start = time.perf_counter()
+    parsed = load_from_excel(file, snapshot_dir=None)
+    parse_seconds = time.perf_counter() - start
+
+    load_from_excel(file, snapshot_dir=snapshot_dir)
+    start = time.perf_counter()
+    configs = load_from_excel(file, snapshot_dir=snapshot_dir)
+    snapshot_seconds = time.perf_counter() - start
+
+    assert_identical(configs, parsed)
+    print(f'startup <{os.path.basename(file)}> groups<{len(configs)}>')
+    print(f'  parse xlsx: {parse_seconds * 1000:10.1f} ms')
+    print(f'  snapshot:   {snapshot_seconds * 1000:10.1f} ms  ({parse_seconds / snapshot_seconds:.0f}x)')
+
+
+def startup_main():
+    with tempfile.TemporaryDirectory() as work_dir:
+        measure_startup('./tests/data/conv2convs_multi_config.xlsx', work_dir)
+
+        file = os.path.join(work_dir, 'district_10k.xlsx')
+        group_df, admin_df = build_sheets(10_000)
+        with ExcelWriter(file) as writer:
+            group_df.to_excel(writer, sheet_name='group', index=False)
+            admin_df.to_excel(writer, sheet_name='admins', index=False)
+        measure_startup(file, work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Benchmark the compiled Matcher against the linear option scan, and match_many against sequential awaits
+
+Usage:
+    python -m benchmarks.bench_matcher
+"""
+from __future__ import annotations
+import asyncio
+import time
+from typing import List
+
+from antigen_bot.matcher import Conversation, Matcher, MatcherOption
+from antigen_bot.name_cache import name_cache
+from benchmarks import fakes
+from benchmarks.fakes import FakeRoom
+
+
+def build_options(count: int) -> List[MatcherOption]:
+    """half of the options are ids or names, the other half are regex"""
+    options = []
+    for index in range(count // 2):
+        options.append(MatcherOption(text=f'room-{index * 7}' if index % 2 else f'嘉怡{index}号楼组群', type='id_or_name'))
+        options.append(MatcherOption(text=f'^小区{index}-.*号楼', type='regex'))
+    return options
+
+
+async def linear_match(options: List[MatcherOption], conversation: Conversation) -> bool:
+    """the matching before compiling: await every option one by one"""
+    for option in options:
+        if await option.match(conversation):
+            return True
+    return False
+
+
+async def main():
+    fakes.RPC_LATENCY = 0
+    options = build_options(5000)
+    rooms = [FakeRoom(f'room-{index}', topic=f'水岸{index}号楼组群') for index in range(2000)]
+
+    start = time.perf_counter()
+    matcher = Matcher(options)
+    compile_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    linear_result = [await linear_match(options, Conversation(room)) for room in rooms]
+    linear_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled_result = [await matcher.match(room) for room in rooms]
+    compiled_seconds = time.perf_counter() - start
+
+    assert linear_result == compiled_result
+    print(f'options<{len(options)}> rooms<{len(rooms)}> matched<{sum(compiled_result)}>')
+    print(f'  compile: {compile_seconds * 1000:8.1f} ms')
+    print(f'  linear:  {linear_seconds * 1000:8.1f} ms  {linear_seconds / len(rooms) * 1e6:8.1f} us/room')
+    print(f'  compiled:{compiled_seconds * 1000:8.1f} ms  {compiled_seconds / len(rooms) * 1e6:8.1f} us/room')
+
+    await batch_main()
+
+
+async def batch_main():
+    """resolve the targets of a 300-room community with cold names and 2ms rpc"""
+    fakes.RPC_LATENCY = 0.002
+    rooms = [FakeRoom(f'community-{index}', topic=f'嘉怡{index}号楼组群') for index in range(300)]
+    matcher = Matcher([MatcherOption(text=r'^嘉怡\d+号楼', type='regex')])
+
+    def clear_names():
+        for room in rooms:
+            name_cache.invalidate(room.room_id)
+
+    clear_names()
+    start = time.perf_counter()
+    sequential = [room for room in rooms if await matcher.match(room)]
+    sequential_seconds = time.perf_counter() - start
+
+    print(f'rooms<{len(rooms)}> rpc<{fakes.RPC_LATENCY * 1000:.0f}ms> matched<{len(sequential)}>')
+    print(f'  sequential match:   {sequential_seconds * 1000:8.1f} ms')
+    for concurrency in (1, 16, 64):
+        clear_names()
+        result = await matcher.match_many(rooms, concurrency=concurrency)
+        assert result.targets == sequential
+        print(
+            f'  match_many<{concurrency:>3}>:  {(result.load_seconds + result.match_seconds) * 1000:8.1f} ms'
+            f'  (load {result.load_seconds * 1000:.1f} ms, match {result.match_seconds * 1000:.1f} ms)'
+        )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+"""Benchmark the poster fan-out: uploading to every room against uploading once and forwarding
+
+Usage:
+    python -m benchmarks.bench_media_fanout
+"""
+from __future__ import annotations
+import asyncio
+import base64
+import time
+
+from wechaty import FileBox
+
+from antigen_bot.broadcast import UploadOnceFile
+from benchmarks import fakes
+from benchmarks.fakes import FakeBot, FakeRoom
+
+# the upstream bandwidth of the puppet host, in bytes/second
+UPLOAD_BANDWIDTH = 20 * 1024 * 1024
+
+
+class UploadingRoom(FakeRoom):
+    """the sent file takes the time of uploading its bytes"""
+    uploaded_bytes = 0
+
+    async def say(self, some_thing, mention_ids=None):
+        if isinstance(some_thing, FileBox):
+            size = len(base64.b64decode(some_thing.base64))
+            UploadingRoom.uploaded_bytes += size
+            await asyncio.sleep(size / UPLOAD_BANDWIDTH)
+        return await super().say(some_thing, mention_ids)
+
+
+async def fan_out(rooms, send) -> float:
+    start = time.perf_counter()
+    for room in rooms:
+        await send(room)
+    return time.perf_counter() - start
+
+
+async def main():
+    fakes.RPC_LATENCY = 0.002
+    poster = FileBox.from_base64(base64.b64encode(b'\0' * 2 * 1024 * 1024), name='poster.jpg')
+
+    for count in (30, 300):
+        rooms = [UploadingRoom(f'room-{index}') for index in range(count)]
+        FakeBot(rooms=rooms)
+
+        print(f'rooms<{count}> poster<2MB> bandwidth<20MB/s> rpc<{fakes.RPC_LATENCY * 1000:.0f}ms>')
+        for name, send in (
+            ('upload to every room', UploadOnceFile(poster, enabled=False)),
+            ('upload once', UploadOnceFile(poster)),
+        ):
+            UploadingRoom.uploaded_bytes = 0
+            seconds = await fan_out(rooms, send)
+            print(
+                f'  {name:<22}{seconds * 1000:9.1f} ms  {seconds / count * 1000:6.1f} ms/room  '
+                f'uploaded<{UploadingRoom.uploaded_bytes / 1024 / 1024:.0f}MB>'
+            )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
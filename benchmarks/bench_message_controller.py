@@ -0,0 +1,37 @@
+"""Benchmark the per-message cost of MessageController de-duplication
+
+Usage:
+    python -m benchmarks.bench_message_controller
+"""
+from __future__ import annotations
+import os
+import tempfile
+import time
+
+from antigen_bot.ttl_store import SqliteBackend, TTLStore
+
+
+def bench(store: TTLStore, total: int, chunk: int) -> None:
+    """add `total` unique ids and print the cost of every chunk"""
+    start = time.perf_counter()
+    for index in range(total):
+        store.add(f'message-{index}')
+        if (index + 1) % chunk == 0:
+            end = time.perf_counter()
+            print(f'  ids<{index + 1:>9}>  size<{len(store):>7}>  {(end - start) / chunk * 1e9:8.1f} ns/op')
+            start = time.perf_counter()
+
+
+def main():
+    print('memory store, max_size=200k')
+    bench(TTLStore(max_size=200_000), total=4_000_000, chunk=1_000_000)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print('sqlite store, max_size=200k')
+        store = TTLStore(max_size=200_000, backend=SqliteBackend(os.path.join(tmp_dir, 'ids.db')))
+        bench(store, total=1_000_000, chunk=250_000)
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
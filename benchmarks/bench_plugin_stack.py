@@ -0,0 +1,145 @@
+"""Benchmark messages/sec through the run.py plugin stack
+
+Usage:
+    python -m benchmarks.bench_plugin_stack
+"""
+from __future__ import annotations
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import List, Optional, Sequence
+
+import pandas as pd
+from wechaty import WechatyPluginOptions
+from wechaty_puppet import MessageType
+
+from antigen_bot.message_controller import message_controller
+from benchmarks import fakes
+from benchmarks.fakes import FakeBot, FakeContact, FakeMessage, FakeRoom
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'data')
+
+
+def write_conv_config(file: str, admin_ids: Sequence[str], admin_room_ids: Sequence[str] = ()) -> None:
+    """write the conv2convs config of test data with the admins"""
+    group = pd.read_excel(os.path.join(DATA_DIR, 'conv2convs_config.xlsx'), sheet_name='group')
+    rows = [('测试小区', conv_id, conv_id, 'Contact', conv_id) for conv_id in admin_ids]
+    rows.extend(('测试小区', conv_id, conv_id, 'Room', conv_id) for conv_id in admin_room_ids)
+    admins = pd.DataFrame(rows, columns=['group_name', 'name', 'id', 'type', 'no'])
+    with pd.ExcelWriter(file) as writer:
+        group.to_excel(writer, sheet_name='group', index=False)
+        admins.to_excel(writer, sheet_name='admins', index=False)
+
+
+def build_plugins(
+    work_dir: str,
+    admin_ids: Optional[Sequence[str]] = None,
+    admin_room_ids: Sequence[str] = (),
+) -> list:
+    """build the same plugins as run.py
+
+    Args:
+        work_dir (str): the directory of the config files
+        admin_ids (Optional[Sequence[str]]): the admin contact ids, None to use the admins of test data
+        admin_room_ids (Sequence[str]): the admin room ids of conv2convs
+    """
+    # pylint: disable=import-outside-toplevel
+    from antigen_bot.plugins.message_forwarder import MessageForwarderPlugin
+    from antigen_bot.plugins.conv2convs import Conv2ConvsPlugin
+    from antigen_bot.plugins.health_check import HealthCheckPlugin
+    from antigen_bot.plugins.dynamic_authorization import DynamicAuthorizationPlugin
+    from antigen_bot.plugins.ding_dong import DingDongPlugin
+    from antigen_bot.plugins.name_cache import NameCachePlugin
+    from antigen_bot.plugins.room_directory import RoomDirectoryPlugin
+
+    conv_config_file = os.path.join(work_dir, 'conv2convs_config.xlsx')
+    if admin_ids is None:
+        shutil.copy(os.path.join(DATA_DIR, 'conv2convs_config.xlsx'), conv_config_file)
+        admin_ids = ['admin-0']
+    else:
+        write_conv_config(conv_config_file, admin_ids, admin_room_ids)
+    forwarder_config = dict(admin_ids=list(admin_ids), room_regex=['^嘉怡.*号楼组群$'])
+    for name in ['message_forwarder_v2.json', 'message_forwarder_test.json']:
+        with open(os.path.join(work_dir, name), 'w', encoding='utf-8') as f:
+            json.dump(forwarder_config, f, ensure_ascii=False)
+
+    dynamic_plugin = DynamicAuthorizationPlugin(
+        config_file=os.path.join(work_dir, 'dynamic_authorise.json'),
+        conv_config_file=conv_config_file
+    )
+    plugins = [NameCachePlugin(), RoomDirectoryPlugin(), DingDongPlugin()]
+    try:
+        from antigen_bot.plugins.committee import CommitteePlugin
+        plugins.append(CommitteePlugin(config_file=conv_config_file))
+    except ImportError:
+        print('CommitteePlugin is skipped: group_purchase is not installed')
+
+    plugins.extend([
+        MessageForwarderPlugin(config_file=os.path.join(work_dir, 'message_forwarder_v2.json')),
+        MessageForwarderPlugin(
+            options=WechatyPluginOptions(name='MessageForwarderTestPlugin'),
+            config_file=os.path.join(work_dir, 'message_forwarder_test.json')
+        ),
+        Conv2ConvsPlugin(config_file=conv_config_file),
+        dynamic_plugin,
+        HealthCheckPlugin(),
+    ])
+    return plugins
+
+
+def build_traffic(bot: FakeBot, count: int, seed: int = 7) -> List[FakeMessage]:
+    """residents chatting in building rooms, with a few private messages and images"""
+    rng = random.Random(seed)
+    rooms = list(bot.rooms.values())
+    residents = [FakeContact(f'resident-{index}') for index in range(2000)]
+    messages = []
+    for _ in range(count):
+        talker = rng.choice(residents)
+        dice = rng.random()
+        if dice < 0.90:
+            messages.append(FakeMessage(talker=talker, room=rng.choice(rooms), text='请问今天几点发物资？'))
+        elif dice < 0.95:
+            messages.append(FakeMessage(talker=talker, room=rng.choice(rooms), type=MessageType.MESSAGE_TYPE_IMAGE))
+        else:
+            messages.append(FakeMessage(talker=talker, text='你好'))
+    return messages
+
+
+async def run(bot: FakeBot, messages: List[FakeMessage]) -> float:
+    """emit the messages and return the messages/sec"""
+    start = time.perf_counter()
+    for msg in messages:
+        await bot.emit_message(msg)
+    return len(messages) / (time.perf_counter() - start)
+
+
+async def main():
+    source_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            plugins = build_plugins(work_dir)
+            rooms = [FakeRoom(f'room-{index}', topic=f'嘉怡{index}号楼组群') for index in range(400)]
+            bot = FakeBot(plugins, rooms=rooms)
+            message_controller.init_plugins(bot)
+
+            for rpc_latency in [0.0, 0.002]:
+                fakes.RPC_LATENCY = rpc_latency
+                for enable_filters in [False, True]:
+                    message_controller.enable_filters = enable_filters
+                    messages = build_traffic(bot, count=2000)
+                    speed = await run(bot, messages)
+                    print(
+                        f'rpc-latency<{rpc_latency * 1000:.0f}ms> filters<{"on" if enable_filters else "off"}>: '
+                        f'{speed:8.1f} messages/sec'
+                    )
+        finally:
+            os.chdir(source_dir)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
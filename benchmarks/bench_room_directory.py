@@ -0,0 +1,54 @@
+"""Benchmark resolving the forward targets from the room directory against enumerating all rooms
+
+Usage:
+    python -m benchmarks.bench_room_directory
+"""
+from __future__ import annotations
+import asyncio
+import os
+import tempfile
+import time
+
+from antigen_bot.name_cache import name_cache
+from antigen_bot.plugins.message_forwarder import MessageForwarderPlugin
+from antigen_bot.room_directory import room_directory
+from benchmarks import fakes
+from benchmarks.fakes import FakeBot, FakeRoom
+
+
+async def measure(plugin: MessageForwarderPlugin, rooms, rounds: int = 5) -> float:
+    """the average seconds to resolve the targets, with cold names as the first forward after startup"""
+    matcher = plugin.get_room_matcher()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for room in rooms:
+            name_cache.invalidate(room.room_id)
+        await plugin.resolve_rooms(matcher)
+    return (time.perf_counter() - start) / rounds
+
+
+async def main():
+    fakes.RPC_LATENCY = 0.002
+    with tempfile.TemporaryDirectory() as work_dir:
+        config_file = os.path.join(work_dir, 'message_forwarder.json')
+        with open(config_file, 'w', encoding='utf-8') as f:
+            f.write('{"admin_ids": ["admin"], "room_regex": ["^嘉怡1\\\\d号楼"]}')
+
+        for count in (100, 400, 1600):
+            rooms = [FakeRoom(f'room-{index}', topic=f'嘉怡{index}号楼组群') for index in range(count)]
+            plugin = MessageForwarderPlugin(config_file=config_file)
+            FakeBot(plugins=[plugin], rooms=rooms)
+
+            room_directory.clear()
+            enumerate_seconds = await measure(plugin, rooms)
+
+            await room_directory.build(rooms)
+            directory_seconds = await measure(plugin, rooms)
+
+            print(f'rooms<{count}> rpc<{fakes.RPC_LATENCY * 1000:.0f}ms>')
+            print(f'  enumerate rooms:  {enumerate_seconds * 1000:8.1f} ms/forward')
+            print(f'  room directory:   {directory_seconds * 1000:8.1f} ms/forward')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,205 @@
+"""In-memory Contact/Room/Message/Wechaty doubles for driving the plugins without a puppet
+
+Every call which is a puppet round-trip in production awaits `RPC_LATENCY` seconds.
+"""
+from __future__ import annotations
+import asyncio
+import itertools
+from typing import Dict, List, Optional, Sequence, Union
+
+from wechaty import Contact, FileBox, Message, Room
+from wechaty_puppet import ContactPayload, MessagePayload, MessageType, RoomPayload
+
+
+RPC_LATENCY: float = 0.002
+
+_message_ids = itertools.count()
+
+
+async def _rpc() -> None:
+    if RPC_LATENCY > 0:
+        await asyncio.sleep(RPC_LATENCY)
+
+
+class FakeContact(Contact):
+    """Contact without puppet"""
+    abstract = False
+
+    def __init__(self, contact_id: str, name: str = '', alias: str = '') -> None:
+        super().__init__(contact_id)
+        self._payload = ContactPayload(id=contact_id, name=name or contact_id, alias=alias)
+        self.sent: List = []
+
+    def is_ready(self) -> bool:
+        return True
+
+    async def ready(self, force_sync: bool = False) -> None:
+        await _rpc()
+
+    async def say(self, message) -> Optional[Message]:
+        await _rpc()
+        self.sent.append(message)
+        return FakeMessage(talker=FakeBot.current.self_contact, room=None, text=str(message))
+
+
+class FakeRoom(Room):
+    """Room without puppet"""
+    abstract = False
+
+    def __init__(self, room_id: str, topic: str = '') -> None:
+        super().__init__(room_id)
+        self._payload = RoomPayload(id=room_id, topic=topic)
+        self.sent: List = []
+
+    def is_ready(self) -> bool:
+        return True
+
+    async def ready(self, force_sync: bool = False, load_members: bool = False) -> None:
+        await _rpc()
+
+    async def topic(self, new_topic: str = None) -> Optional[str]:
+        await _rpc()
+        if new_topic:
+            self._payload.topic = new_topic
+        return self._payload.topic
+
+    async def say(self, some_thing, mention_ids: Optional[List[str]] = None) -> Optional[Message]:
+        await _rpc()
+        self.sent.append(some_thing)
+        return FakeMessage(talker=FakeBot.current.self_contact, room=self, text=str(some_thing))
+
+
+class FakeMessage(Message):
+    """Message without puppet"""
+    abstract = False
+
+    def __init__(
+        self,
+        talker: FakeContact,
+        room: Optional[FakeRoom] = None,
+        text: str = '',
+        type: MessageType = MessageType.MESSAGE_TYPE_TEXT,
+        mention_ids: Sequence[str] = (),
+        message_id: Optional[str] = None,
+    ) -> None:
+        super().__init__(message_id or f'message-{next(_message_ids)}')
+        self._talker = talker
+        self._room = room
+        self._payload = MessagePayload(
+            id=self.message_id,
+            text=text,
+            type=type,
+            from_id=talker.contact_id,
+            room_id=room.room_id if room else '',
+            mention_ids=list(mention_ids),
+        )
+
+    def talker(self) -> Contact:
+        return self._talker
+
+    def room(self) -> Optional[Room]:
+        return self._room
+
+    def is_self(self) -> bool:
+        return self._talker.contact_id == FakeBot.current.self_contact.contact_id
+
+    async def ready(self) -> None:
+        pass
+
+    async def mention_self(self) -> bool:
+        return FakeBot.current.self_contact.contact_id in self._payload.mention_ids
+
+    async def mention_list(self) -> List[Contact]:
+        return [FakeBot.current.contacts[contact_id] for contact_id in self._payload.mention_ids
+                if contact_id in FakeBot.current.contacts]
+
+    async def mention_text(self) -> str:
+        return self.text()
+
+    async def say(self, msg, mention_ids: Optional[List[str]] = None) -> Optional[Message]:
+        target = self._room or self._talker
+        return await target.say(msg)
+
+    async def forward(self, to: Union[Room, Contact]) -> None:
+        await _rpc()
+        to.sent.append(self)
+
+    async def to_file_box(self) -> FileBox:
+        await _rpc()
+        return FileBox.from_base64(b'ZmFrZQ==', name=f'{self.message_id}.jpg')
+
+
+class _FakeRoomClass:
+    def __init__(self, bot: FakeBot) -> None:
+        self.bot = bot
+
+    def load(self, room_id: str) -> FakeRoom:
+        return self.bot.rooms.setdefault(room_id, FakeRoom(room_id))
+
+    async def find_all(self, query=None) -> List[FakeRoom]:
+        await _rpc()
+        return list(self.bot.rooms.values())
+
+
+class _FakeContactClass:
+    def __init__(self, bot: FakeBot) -> None:
+        self.bot = bot
+
+    def load(self, contact_id: str) -> FakeContact:
+        return self.bot.contacts.setdefault(contact_id, FakeContact(contact_id))
+
+    async def find_all(self, query=None) -> List[FakeContact]:
+        await _rpc()
+        return list(self.bot.contacts.values())
+
+
+class _FakeMessageClass:
+    def __init__(self, bot: FakeBot) -> None:
+        self.bot = bot
+
+    def load(self, message_id: str) -> FakeMessage:
+        return self.bot.messages[message_id]
+
+
+class _FakePuppet:
+    async def ding(self, data: str = '') -> None:
+        await _rpc()
+
+
+class _FakePluginManager:
+    def __init__(self, plugins) -> None:
+        self._plugins = {plugin.name: plugin for plugin in plugins}
+
+
+class FakeBot:
+    """the minimal Wechaty surface used by the plugins"""
+    current: FakeBot
+
+    def __init__(self, plugins=(), rooms: Sequence[FakeRoom] = (), contacts: Sequence[FakeContact] = ()) -> None:
+        self.self_contact = FakeContact('bot-self', name='AntigenBot')
+        self.rooms: Dict[str, FakeRoom] = {room.room_id: room for room in rooms}
+        self.contacts: Dict[str, FakeContact] = {contact.contact_id: contact for contact in contacts}
+        self.contacts[self.self_contact.contact_id] = self.self_contact
+        self.messages: Dict[str, FakeMessage] = {}
+
+        self.Room = _FakeRoomClass(self)
+        self.Contact = _FakeContactClass(self)
+        self.Message = _FakeMessageClass(self)
+        self.puppet = _FakePuppet()
+        self._plugin_manager = _FakePluginManager(plugins)
+
+        self.plugins = list(plugins)
+        for plugin in self.plugins:
+            plugin.set_bot(self)
+        FakeBot.current = self
+
+    def user_self(self) -> FakeContact:
+        return self.self_contact
+
+    def on(self, event: str, handler) -> None:
+        """the events are not emitted by the fake bot"""
+
+    async def emit_message(self, msg: Message) -> None:
+        """run the plugins sequentially as the wechaty plugin manager does"""
+        for plugin in self.plugins:
+            await plugin.on_message(msg)
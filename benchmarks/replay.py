@@ -0,0 +1,165 @@
+"""Replay the recorded message trace through the run.py plugin stack
+
+Usage:
+    # record with TrafficRecorderPlugin, or synthesize a morning peak of 400 building rooms
+    python -m benchmarks.replay --synthesize .wechaty/peak.jsonl.gz --events 20000 --duration 600
+
+    # replay at 1x, 10x or the maximum speed (0)
+    python -m benchmarks.replay .wechaty/peak.jsonl.gz --speed 10
+
+The admins recorded with the stable aliases (admin-0, admin-1, ...) are configured as the admins of the
+replayed plugins, and the bot itself is replayed as `bot-self`, so the admin paths are exercised too.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Set, Tuple
+
+from wechaty_puppet import MessageType
+
+from antigen_bot.message_controller import message_controller
+from antigen_bot.traffic import ADMIN_ALIAS_PREFIX, TraceEvent, read_trace
+from benchmarks.bench_plugin_stack import build_plugins
+from benchmarks.fakes import FakeBot, FakeMessage
+
+
+def synthesize_trace(file: str, events: int, duration: float, rooms: int = 400, seed: int = 7) -> None:
+    """write a trace which every building room is active at the same time"""
+    rng = random.Random(seed)
+    offsets = sorted(rng.uniform(0, duration) for _ in range(events))
+    with gzip.open(file, 'wt', encoding='utf-8') as handler:
+        for offset in offsets:
+            room_index = rng.randrange(rooms)
+            dice = rng.random()
+            event = TraceEvent(
+                offset=offset,
+                type=int(MessageType.MESSAGE_TYPE_IMAGE if dice < 0.05 else MessageType.MESSAGE_TYPE_TEXT),
+                talker_id=f'resident-{rng.randrange(rooms * 50)}',
+                room_id='' if dice > 0.95 else f'room-{room_index}',
+                topic='' if dice > 0.95 else f'嘉怡{room_index}号楼组群',
+                text='请问今天几点发物资？',
+            )
+            handler.write(json.dumps(event.to_dict(), ensure_ascii=False) + '\n')
+
+
+def find_admins(events: List[TraceEvent]) -> Tuple[List[str], List[str]]:
+    """find the aliased admin contacts and rooms in the trace
+
+    Returns:
+        Tuple[List[str], List[str]]: the admin contact ids and the admin room ids
+    """
+    admin_ids: Set[str] = set()
+    admin_room_ids: Set[str] = set()
+    for event in events:
+        if event.talker_id.startswith(ADMIN_ALIAS_PREFIX):
+            admin_ids.add(event.talker_id)
+        if event.room_id.startswith(ADMIN_ALIAS_PREFIX):
+            admin_room_ids.add(event.room_id)
+    return sorted(admin_ids), sorted(admin_room_ids)
+
+
+def build_messages(bot: FakeBot, events: List[TraceEvent]) -> List[Tuple[float, FakeMessage]]:
+    """build the fake messages of the trace events"""
+    messages = []
+    for event in events:
+        talker = bot.Contact.load(event.talker_id)
+        room = None
+        if event.room_id:
+            room = bot.Room.load(event.room_id)
+            if event.topic:
+                room.payload.topic = event.topic
+        msg = FakeMessage(
+            talker=talker, room=room, text=event.text,
+            type=MessageType(event.type), mention_ids=event.mention_ids
+        )
+        messages.append((event.offset, msg))
+    return messages
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+async def replay(bot: FakeBot, messages: List[Tuple[float, FakeMessage]], speed: float) -> Dict[str, float]:
+    """emit the messages at the recorded pace, and return the throughput and latency"""
+    latencies: List[float] = []
+
+    async def emit(msg: FakeMessage) -> None:
+        start = time.perf_counter()
+        await bot.emit_message(msg)
+        latencies.append(time.perf_counter() - start)
+
+    tasks = []
+    start = time.perf_counter()
+    for offset, msg in messages:
+        if speed > 0:
+            delay = offset / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(emit(msg)))
+    await asyncio.gather(*tasks)
+    seconds = time.perf_counter() - start
+
+    return dict(
+        events=len(messages),
+        seconds=seconds,
+        messages_per_second=len(messages) / seconds if seconds else 0.0,
+        p50_ms=_percentile(latencies, 50) * 1000,
+        p95_ms=_percentile(latencies, 95) * 1000,
+        p99_ms=_percentile(latencies, 99) * 1000,
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('trace_file', nargs='?')
+    parser.add_argument('--speed', type=float, default=0, help='1 for real time, 10 for 10x, 0 for the maximum')
+    parser.add_argument('--synthesize', help='write a synthetic morning-peak trace into this file')
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--duration', type=float, default=600)
+    args = parser.parse_args()
+
+    if args.synthesize:
+        synthesize_trace(args.synthesize, events=args.events, duration=args.duration)
+        print(f'synthetic trace is saved into {args.synthesize}')
+        return
+
+    trace_file = os.path.abspath(args.trace_file)
+    events = list(read_trace(trace_file))
+    source_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            admin_ids, admin_room_ids = find_admins(events)
+            plugins = build_plugins(work_dir, admin_ids=admin_ids, admin_room_ids=admin_room_ids)
+            bot = FakeBot(plugins)
+            message_controller.init_plugins(bot)
+            messages = build_messages(bot, events)
+
+            result = await replay(bot, messages, speed=args.speed)
+        finally:
+            os.chdir(source_dir)
+
+    print(
+        f'events<{result["events"]}> speed<{args.speed or "max"}> {result["seconds"]:.1f}s '
+        f'{result["messages_per_second"]:.1f} messages/sec, end-to-end '
+        f'p50<{result["p50_ms"]:.1f}ms> p95<{result["p95_ms"]:.1f}ms> p99<{result["p99_ms"]:.1f}ms>'
+    )
+    for name, stats in message_controller.metrics.to_dict().items():
+        print(
+            f'  {name:<32} calls<{stats["calls"]:>6}> p50<{stats["p50_ms"]:.2f}ms> '
+            f'p95<{stats["p95_ms"]:.2f}ms> p99<{stats["p99_ms"]:.2f}ms> exceptions<{stats["exceptions"]}>'
+        )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -14,6 +14,10 @@ from antigen_bot.plugins.dynamic_authorization import DynamicAuthorizationPlugin
 from antigen_bot.plugins.ding_dong import DingDongPlugin
 # from antigen_bot.plugins.keyword_reply import KeyWordReplyPlugin
 from antigen_bot.plugins.committee import CommitteePlugin
+from antigen_bot.plugins.traffic_recorder import TrafficRecorderPlugin
+from antigen_bot.plugins.name_cache import NameCachePlugin
+from antigen_bot.plugins.room_directory import RoomDirectoryPlugin
+from antigen_bot.message_controller import message_controller
 
 
 async def final_failure_handler(*args, **kwargs):
@@ -26,9 +30,15 @@ if __name__ == "__main__":
         port=int(os.environ.get('PORT', 8004)),
     )
     bot = Wechaty(options)
+    message_controller.persist_to('.wechaty/message_ids.db')
     conv_config_file = '.wechaty/conv2convs_config.xlsx'
     dynamic_plugin = DynamicAuthorizationPlugin(config_file='.wechaty/dynamic_authorise.json', conv_config_file=conv_config_file)
+    # record the message traffic for load testing, eg: TRAFFIC_TRACE_FILE=.wechaty/traffic.jsonl.gz
+    if os.environ.get('TRAFFIC_TRACE_FILE'):
+        bot.use(TrafficRecorderPlugin(trace_file=os.environ['TRAFFIC_TRACE_FILE']))
     bot.use([
+        NameCachePlugin(),
+        RoomDirectoryPlugin(),
         DingDongPlugin(),
         CommitteePlugin(),
         MessageForwarderPlugin(
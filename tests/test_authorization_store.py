@@ -0,0 +1,42 @@
+"""Unit test for authorization_store.py"""
+import asyncio
+import json
+
+import pytest
+
+from antigen_bot.authorization_store import AuthorizationStore
+
+
+def _read(file) -> dict:
+    with open(file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_prune_expired_dates(tmp_path):
+    """the dates before today are removed when loading"""
+    file = tmp_path / 'authorization.json'
+    file.write_text(json.dumps({'2022-05-03': ['a'], '2999-01-01': ['b']}), encoding='utf-8')
+
+    store = AuthorizationStore(str(file))
+    assert not store.is_valid('a', date='2022-05-03')
+    assert store.is_valid('b', date='2999-01-01')
+    assert _read(file) == {'2999-01-01': ['b']}
+
+
+@pytest.mark.asyncio
+async def test_write_behind(tmp_path):
+    """the changes of concurrent coroutines are written once after the delay"""
+    file = tmp_path / 'authorization.json'
+    store = AuthorizationStore(str(file), flush_delay_seconds=0.05)
+
+    async def authorize(index: int):
+        await asyncio.sleep(0)
+        store.authorize('2999-01-01', [f'id-{index}'])
+
+    await asyncio.gather(*[authorize(index) for index in range(100)])
+    store.unauthorize('2999-01-01', ['id-0'])
+    assert store.is_valid('id-1', date='2999-01-01')
+    assert not file.exists()
+
+    await asyncio.sleep(0.1)
+    assert len(_read(file)['2999-01-01']) == 99
@@ -0,0 +1,116 @@
+"""Unit test for broadcast.py"""
+import pytest
+from wechaty import FileBox
+
+from antigen_bot.broadcast import (
+    BroadcastJobStore, BroadcastTarget, Broadcaster, UploadOnceFile, text_payload
+)
+from antigen_bot.pacer import AdaptivePacer
+from benchmarks import fakes
+from benchmarks.fakes import FakeBot, FakeContact, FakeMessage, FakeRoom
+
+
+class CrashingRoom(FakeRoom):
+    """the process exits while sending to the room"""
+    async def say(self, some_thing, mention_ids=None):
+        raise SystemExit()
+
+
+@pytest.fixture(autouse=True)
+def bot():
+    fakes.RPC_LATENCY = 0
+    rooms = [FakeRoom(f'room-{index}', f'嘉怡{index}号楼') for index in range(4)]
+    return FakeBot(rooms=rooms, contacts=[FakeContact('admin')])
+
+
+def _broadcaster(store):
+    return Broadcaster('Plugin', store, pacer=AdaptivePacer(min_gap_seconds=0, initial_gap_seconds=0))
+
+
+def _targets(bot):
+    return [BroadcastTarget(id=room.room_id, name=room.payload.topic) for room in bot.rooms.values()]
+
+
+@pytest.mark.asyncio
+async def test_broadcast_is_idempotent(bot, tmp_path):
+    """the same message is broadcast once"""
+    broadcaster = _broadcaster(BroadcastJobStore(str(tmp_path / 'jobs.db')))
+    admin = bot.contacts['admin']
+    msg = FakeMessage(talker=admin, text='通知')
+
+    record = await broadcaster.submit(bot, msg, admin, text_payload('通知'), _targets(bot))
+    assert len(record.sent) == 4
+    assert await broadcaster.submit(bot, msg, admin, text_payload('通知'), _targets(bot)) is None
+    assert all(room.sent == ['通知'] for room in bot.rooms.values())
+
+
+@pytest.mark.asyncio
+async def test_resume_unfinished_broadcast(bot, tmp_path):
+    """only the targets which are not sent are resumed after restarting"""
+    db_file = str(tmp_path / 'jobs.db')
+    admin = bot.contacts['admin']
+    msg = FakeMessage(talker=admin, text='通知')
+
+    crashing_room = CrashingRoom('room-2', '嘉怡2号楼')
+    bot.rooms['room-2'] = crashing_room
+    store = BroadcastJobStore(db_file)
+    with pytest.raises(SystemExit):
+        await _broadcaster(store).submit(bot, msg, admin, text_payload('通知'), _targets(bot))
+    store.close()
+    assert [len(room.sent) for room in bot.rooms.values()] == [1, 1, 0, 0]
+
+    # restart with the healthy room
+    bot.rooms['room-2'] = FakeRoom('room-2', '嘉怡2号楼')
+    store = BroadcastJobStore(db_file)
+    records = await _broadcaster(store).resume(bot)
+    assert [attempt.target_id for attempt in records[0].sent] == ['room-2', 'room-3']
+    assert [len(room.sent) for room in bot.rooms.values()] == [1, 1, 1, 1]
+    assert '断点续发' in admin.sent[-1]
+
+    # the finished job is never resumed again
+    assert store.get_unfinished('Plugin') == []
+    assert await _broadcaster(store).resume(bot) == []
+
+
+class NoReceiptRoom(FakeRoom):
+    """the puppet doesn't return the sent message"""
+    async def say(self, some_thing, mention_ids=None):
+        await super().say(some_thing, mention_ids)
+        return None
+
+
+class BrokenForwardMessage(FakeMessage):
+    """the sent message can not be forwarded"""
+    async def forward(self, to):
+        raise RuntimeError('forward is not supported')
+
+
+class BrokenForwardRoom(FakeRoom):
+    async def say(self, some_thing, mention_ids=None):
+        await super().say(some_thing, mention_ids)
+        return BrokenForwardMessage(talker=FakeBot.current.self_contact, room=self)
+
+
+@pytest.mark.asyncio
+async def test_upload_once_file(bot):
+    """the file is uploaded to the first target and forwarded to the others"""
+    file_box = FileBox.from_base64(b'ZmFrZQ==', name='poster.jpg')
+    rooms = [NoReceiptRoom('room-0'), *[FakeRoom(f'room-{index}') for index in range(1, 4)]]
+
+    send = UploadOnceFile(file_box)
+    for room in rooms:
+        await send(room)
+    assert (send.uploads, send.forwards) == (2, 2)
+    assert rooms[1].sent == [file_box]
+    assert all(isinstance(room.sent[0], FakeMessage) for room in rooms[2:])
+
+    # fall back to upload when the forwarding fails
+    send = UploadOnceFile(file_box)
+    for room in [BrokenForwardRoom('room-4'), FakeRoom('room-5'), FakeRoom('room-6')]:
+        await send(room)
+    assert (send.uploads, send.forwards) == (2, 1)
+
+    send = UploadOnceFile(file_box, enabled=False)
+    for room in rooms:
+        await send(room)
+    assert (send.uploads, send.forwards) == (4, 0)
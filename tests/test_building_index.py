@@ -0,0 +1,45 @@
+"""Unit test for building_index.py"""
+import pytest
+
+from antigen_bot.building_index import BuildingIndex
+from antigen_bot.room_directory import RoomDirectory
+from benchmarks import fakes
+from benchmarks.fakes import FakeRoom
+
+
+def test_parse_numbers():
+    """the numbers follow the rule of `{pre_fix}.*\\D(number)\\D.*`"""
+    index = BuildingIndex(RoomDirectory())
+    index.add_prefix('嘉怡')
+    pattern = index._prefixes['嘉怡']
+    assert index.parse_numbers(pattern, '嘉怡小区3号楼1单元') == {'3', '1'}
+    assert index.parse_numbers(pattern, '嘉怡12号楼') == set()
+    assert index.parse_numbers(pattern, '嘉怡小区3') == set()
+    assert index.parse_numbers(pattern, '3号楼嘉怡小区') == set()
+
+
+@pytest.mark.asyncio
+async def test_building_index_is_updated_incrementally():
+    """the index follows the rooms added, renamed or removed in the room directory"""
+    fakes.RPC_LATENCY = 0
+    directory = RoomDirectory()
+    index = BuildingIndex(directory)
+    index.add_prefix('嘉怡')
+
+    rooms = [FakeRoom(f'building-{number}', f'嘉怡小区{number}号楼') for number in range(1, 21)]
+    rooms.append(FakeRoom('building-shop', '嘉怡小区 商铺 群'))
+    await directory.build(rooms)
+
+    assert index.find('嘉怡', [str(number) for number in range(3, 16)]) == {f'building-{n}' for n in range(3, 16)}
+    assert index.scan('嘉怡', ['商铺']) == {'building-shop'}
+    # the pre_fix which is not known yet is indexed lazily
+    assert index.find('嘉', ['5']) == {'building-5'}
+
+    directory.set_room(rooms[2], '水岸小区3号楼')
+    directory.remove_room('building-4')
+    assert index.find('嘉怡', ['3', '4', '5']) == {'building-5'}
+    assert index.find('水岸', ['3']) == {'building-3'}
+
+    # the rooms which are gone before relogin are not returned
+    directory.clear()
+    assert index.find('嘉怡', ['5']) == set()
@@ -1,22 +1,32 @@
 """Unit test for room2rooms.py"""
 import os
+import shutil
 from typing import List
 import pytest
+from pandas import DataFrame
+from antigen_bot import forward_config
+from antigen_bot.forward_config import (
+    ConfigFactory,
+    ConfigRegistry,
+    Conv2ConvsConfig,
+    Conversation,
+    ReceiverIndex,
+    build_configs,
+    build_target_index,
+    load_from_excel
+)
 from antigen_bot.plugins.conv2convs import (
     Conv2ConvsPlugin,
+    parse_target_command,
     split_number_and_words
 )
-from antigen_bot.plugins.dynamic_authorization import (
-    Conv2ConvsConfig,
-    load_from_excel
-)
 from antigen_bot.utils import remove_at_info
 
 
-def test_config():
+def test_config(tmp_path):
     """test the configuration load"""
     file = './tests/data/conv2convs_config.xlsx'
-    configs: List[Conv2ConvsConfig] = load_from_excel(file=file)
+    configs: List[Conv2ConvsConfig] = load_from_excel(file=file, snapshot_dir=str(tmp_path))
     assert len(configs) == 1
 
     config: Conv2ConvsConfig = configs[0]
@@ -43,6 +53,146 @@ def test_multi_config():
     assert config.is_admin('1101')
 
 
+def test_build_configs():
+    """the configs are built in the order of group sheet, and the admins without group are ignored"""
+    group_df = DataFrame(dict(
+        group_name=['b', 'a', 'b'], name=['b-1', 'a-1', 'b-2'], id=[1, 2, 3], type=['Room'] * 3, no=[1, 1, 2]
+    ))
+    admin_df = DataFrame(dict(
+        group_name=['a', 'c'], name=['admin-a', 'admin-c'], id=['x', 'y'], type=['Contact'] * 2, no=['', '']
+    ))
+    configs = build_configs(group_df, admin_df)
+    assert [config.name for config in configs] == ['b', 'a']
+    assert list(configs[0].target_conversations) == ['1', '3']
+    assert not configs[0].admins
+    assert configs[1].is_admin('x')
+
+
+def test_config_snapshot(tmp_path, monkeypatch):
+    """the workbook should be parsed only when it changes"""
+    file = './tests/data/conv2convs_multi_config.xlsx'
+    snapshot_dir = str(tmp_path)
+    configs = forward_config.load_from_excel(file, snapshot_dir=snapshot_dir)
+    assert os.path.exists(forward_config.get_snapshot_file(file, snapshot_dir))
+
+    def fail_to_parse(file):
+        raise AssertionError('the snapshot should be used')
+
+    with monkeypatch.context() as context:
+        context.setattr(forward_config, '_parse_excel', fail_to_parse)
+        assert forward_config.load_from_excel(file, snapshot_dir=snapshot_dir) == configs
+
+    # the stale snapshot is ignored
+    monkeypatch.setattr(forward_config, 'get_file_hash', lambda file: 'changed')
+    parsed = []
+    monkeypatch.setattr(forward_config, '_parse_excel', lambda file: parsed.append(file) or [])
+    assert forward_config.load_from_excel(file, snapshot_dir=snapshot_dir) == []
+    assert parsed == [file]
+
+
+@pytest.mark.asyncio
+async def test_receiver_index(tmp_path):
+    """the receivers of admin are merged from all of its configs"""
+    group_df = DataFrame(dict(
+        group_name=['a', 'a', 'b'], name=['a-1', 'a-2', 'b-1'], id=[1, 'c-1', 3],
+        type=['Room', 'Contact', 'Room'], no=[1, 2, 1]
+    ))
+    admin_df = DataFrame(dict(
+        group_name=['a', 'b', 'b'], name=['x', 'x', 'y'], id=['x', 'x', 'y'], type=['Contact'] * 3, no=['', '', '']
+    ))
+    index = ReceiverIndex(build_configs(group_df, admin_df))
+    assert index.admin_ids == {'x', 'y'}
+
+    receivers = index.get('x')
+    assert receivers.room_ids == ('1', '3')
+    assert receivers.contact_ids == ('c-1',)
+    assert receivers.config_names == ('a', 'b')
+    assert index.get('y').room_ids == ('3',)
+    assert not index.get('z')
+
+    factory = ConfigFactory('./tests/data/conv2convs_config.xlsx', snapshot_dir=str(tmp_path))
+    # the first read in the event loop doesn't parse the workbook, it schedules the loading
+    assert not await factory.is_admin('1101')
+    await factory._loading
+    assert await factory.is_admin('1101')
+    receivers = await factory.get_receivers('1101')
+    assert len(receivers.conversations) == 13
+    assert factory.get_index() is factory.get_index()
+
+
+@pytest.mark.asyncio
+async def test_config_registry(tmp_path):
+    """the factory is shared by file, and only reloaded by the polling"""
+    file = str(tmp_path / 'conv2convs_config.xlsx')
+    shutil.copy('./tests/data/conv2convs_config.xlsx', file)
+
+    registry = ConfigRegistry()
+    changes = []
+    factory = registry.subscribe(file, changes.append)
+    assert registry.get_factory(file) is factory
+    assert factory.get_configs() == []
+    await factory._loading
+    configs = factory.get_configs()
+    assert configs
+    # the snapshot is saved next to the config file by default
+    assert os.path.exists(forward_config.get_snapshot_file(file, str(tmp_path / '.snapshots')))
+    assert await registry.poll() == []
+
+    shutil.copy('./tests/data/conv2convs_multi_config.xlsx', file)
+    os.utime(file, (0, 0))
+    # reading configs doesn't check the file
+    assert factory.get_configs() is configs
+
+    assert await registry.poll() == [factory]
+    assert changes == [factory]
+    assert len(factory.get_configs()) == 2
+
+
+@pytest.mark.asyncio
+async def test_config_reload_failure(tmp_path):
+    """the broken file keeps the previous configuration"""
+    file = str(tmp_path / 'conv2convs_config.xlsx')
+    shutil.copy('./tests/data/conv2convs_config.xlsx', file)
+
+    factory = ConfigFactory(file, snapshot_dir=str(tmp_path / 'snapshots'))
+    assert await factory.reload_async()
+    configs = factory.get_configs()
+
+    with open(file, 'wb') as f:
+        f.write(b'broken workbook')
+    os.utime(file, (0, 0))
+    assert not await factory.reload_async()
+    assert factory.get_configs() is configs
+    assert await factory.is_admin('1101')
+
+    # the broken file is not parsed again until it changes
+    assert factory._get_changed_mtime() is None
+
+    shutil.copy('./tests/data/conv2convs_multi_config.xlsx', file)
+    os.utime(file, (1, 1))
+    assert await factory.reload_async()
+    assert len(factory.get_configs()) == 2
+
+
+@pytest.mark.asyncio
+async def test_config_missing_file(tmp_path):
+    """the missing file is loaded once, and loaded again after it's created"""
+    file = str(tmp_path / 'conv2convs_config.xlsx')
+    factory = ConfigFactory(file, snapshot_dir=str(tmp_path / 'snapshots'))
+
+    assert factory.get_configs() == []
+    await factory._loading
+    assert factory._failed_mtime == forward_config.MISSING_MTIME
+    # the failure is recorded, so the readers don't schedule the loading again
+    assert factory.get_configs() == []
+    assert factory._loading is None
+    assert not await factory.reload_async()
+
+    shutil.copy('./tests/data/conv2convs_config.xlsx', file)
+    assert await factory.reload_async()
+    assert await factory.is_admin('1101')
+
+
 @pytest.mark.asyncio
 async def test_remove_at_info():
     """test remove at info"""
@@ -102,6 +252,36 @@ def test_split_numbers_and_words():
     assert numbers == [str(number) for number in range(3, 9)]
     assert words == ['您好']
 
+def test_split_multiple_ranges():
+    """the ranges, comma lists and full-width digits are parsed in one pass"""
+    numbers, words = split_number_and_words('3-4，6,８ 10－11 你好', pretrained_numbers=['6', '8'])
+    assert numbers == ['3', '4', '6', '8', '10', '11']
+    assert words == ['你好']
+
+
+def test_parse_target_command():
+    """the leading numbers and names are resolved, the rest is the content"""
+    targets = build_target_index([
+        Conversation(name=f'{number}号楼', id=f'room-{number}', no=number) for number in range(1, 21)
+    ] + [Conversation(name='物业群', id='room-wy', no=float('nan'))])
+
+    keys, content = parse_target_command('3-8 12 15-20 通知内容 明天 8 点', targets)
+    assert keys == [str(number) for number in [*range(3, 9), 12, *range(15, 21)]]
+    assert content == '通知内容 明天 8 点'
+
+    keys, content = parse_target_command('１２，物业群 消毒通知', targets)
+    assert keys == ['12', '物业群']
+    assert content == '消毒通知'
+
+    assert parse_target_command('通知内容', targets) == ([], '通知内容')
+    assert parse_target_command('3号楼', targets) == (['3号楼'], '')
+
+    # the range glued to the text is a part of content
+    assert parse_target_command('5-10日停水通知', targets) == ([], '5-10日停水通知')
+    assert parse_target_command('3 5-10日停水通知', targets) == (['3'], '5-10日停水通知')
+    assert parse_target_command('5-10，12', targets) == (['5', '6', '7', '8', '9', '10', '12'], '')
+
+
 def test_name_split():
     """test name split"""
     file_name = 'aa.jpg'
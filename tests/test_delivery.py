@@ -0,0 +1,52 @@
+"""Unit test for delivery.py"""
+import pytest
+
+from antigen_bot.delivery import DeliveryTracker
+from benchmarks import fakes
+from benchmarks.fakes import FakeBot, FakeRoom
+
+
+@pytest.fixture(autouse=True)
+def bot():
+    fakes.RPC_LATENCY = 0
+    return FakeBot()
+
+
+@pytest.mark.asyncio
+async def test_broadcast_record():
+    """every send is recorded, and the failure doesn't stop the broadcast"""
+    tracker = DeliveryTracker()
+    rooms = [FakeRoom('room-1', '嘉怡1号楼'), FakeRoom('room-2', '嘉怡2号楼')]
+    record = tracker.start('MessageForwarderPlugin', 'message-id', len(rooms) + 1)
+
+    for room in rooms:
+        assert await record.deliver(room.room_id, room.payload.topic, lambda room=room: room.say('hello'))
+
+    async def broken_send():
+        raise ConnectionError('puppet is gone')
+
+    assert not await record.deliver('room-3', '嘉怡3号楼', broken_send)
+    record.finish()
+
+    assert [attempt.target_id for attempt in record.sent] == ['room-1', 'room-2']
+    assert record.failed[0].error == 'ConnectionError: puppet is gone'
+    assert rooms[0].sent == ['hello']
+
+    summary = record.summary()
+    assert '已发送的群<2>' in summary
+    assert '未发送的群<1>' in summary and '嘉怡3号楼' in summary
+
+    data = record.to_dict(with_attempts=True)
+    assert (data['sent'], data['failed'], data['total_targets']) == (2, 1, 3)
+    assert len(data['attempts']) == 3
+    assert tracker.get(record.broadcast_id) is record
+
+
+def test_tracker_is_bounded():
+    """only the last records are kept, the latest first"""
+    tracker = DeliveryTracker(max_records=2)
+    records = [tracker.start('Conv2ConvsPlugin', f'message-{index}', 1) for index in range(3)]
+
+    assert tracker.get(records[0].broadcast_id) is None
+    broadcasts = tracker.to_dict()['broadcasts']
+    assert [item['message_id'] for item in broadcasts] == ['message-2', 'message-1']
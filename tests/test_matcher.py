@@ -1,8 +1,11 @@
 from __future__ import annotations
+import pytest
 from antigen_bot.matcher import (
     Matcher,
-    MatcherOption
+    MatcherOption,
+    compile_regex_options
 )
+from benchmarks.fakes import FakeRoom
 
 
 def test_init_matcher_option():
@@ -36,3 +39,50 @@ def test_matcher_equal():
 
     assert matcher_1 == matcher_2
     assert matcher_1 == matcher_3
+
+
+@pytest.mark.asyncio
+async def test_compiled_matcher():
+    """test the compiled matcher with id, name, regex and method options"""
+    room = FakeRoom('room-id', topic='嘉怡3号楼组群')
+    matcher = Matcher([
+        MatcherOption(text='other-id', type='id_or_name'),
+        MatcherOption(text=r'^水岸\d+号楼', type='regex'),
+    ])
+    assert not await matcher.match(room)
+
+    assert await Matcher(MatcherOption(text='room-id', type='id_or_name')).match(room)
+    assert await Matcher(MatcherOption(text='嘉怡3号楼组群', type='id_or_name')).match(room)
+    assert await Matcher([
+        MatcherOption(text=r'^水岸\d+号楼', type='regex'),
+        MatcherOption(text=r'(?P<name>嘉怡)\d+号楼', type='regex'),
+        MatcherOption(text=r'(?P<name>其它)', type='regex'),
+    ]).match(room)
+    assert await Matcher(MatcherOption(text=lambda conv: conv.get_id() == 'room-id', type='method')).match(room)
+
+
+def test_compile_regex_options():
+    """the regex options should be combined unless they can not be"""
+    options = [MatcherOption(text=text, type='regex') for text in ['a', 'b', r'(c)\1']]
+    patterns = compile_regex_options(options)
+    assert len(patterns) == 2
+    assert patterns[0].match('b')
+    assert patterns[1].match('cc')
+
+
+@pytest.mark.asyncio
+async def test_match_many():
+    """match_many should match the same conversations as match"""
+    rooms = [FakeRoom(f'room-{index}', topic=f'嘉怡{index}号楼组群') for index in range(50)]
+    matcher = Matcher([
+        MatcherOption(text='room-1', type='id_or_name'),
+        MatcherOption(text='嘉怡2号楼组群', type='id_or_name'),
+        MatcherOption(text=r'^嘉怡4\d号楼', type='regex'),
+        MatcherOption(text=lambda conv: conv.get_id() == 'room-3', type='method'),
+    ])
+    result = await matcher.match_many(rooms, concurrency=4)
+
+    assert result.total == len(rooms)
+    assert result.ids == {'room-1', 'room-2', 'room-3'} | {f'room-{index}' for index in range(40, 50)}
+    assert result.targets == [room for room in rooms if await matcher.match(room)]
+    assert result.load_seconds >= 0 and result.match_seconds >= 0
@@ -0,0 +1,82 @@
+"""Unit test for media_cache.py"""
+import asyncio
+import base64
+import os
+
+import pytest
+from wechaty import FileBox
+
+from antigen_bot.media_cache import MediaCache
+from benchmarks import fakes
+from benchmarks.fakes import FakeBot, FakeContact, FakeMessage
+
+
+class PosterMessage(FakeMessage):
+    """the image message with the given content"""
+    def __init__(self, content: bytes, name: str = 'poster.jpg', message_id=None) -> None:
+        super().__init__(talker=FakeBot.current.self_contact, message_id=message_id)
+        self.content = content
+        self.name = name
+        self.downloads = 0
+
+    async def to_file_box(self) -> FileBox:
+        self.downloads += 1
+        await asyncio.sleep(0)
+        return FileBox.from_base64(base64.b64encode(self.content), name=self.name)
+
+
+@pytest.fixture(autouse=True)
+def bot():
+    fakes.RPC_LATENCY = 0
+    return FakeBot(contacts=[FakeContact('admin')])
+
+
+@pytest.mark.asyncio
+async def test_same_message_is_downloaded_once(tmp_path):
+    """the concurrent and later requests of the same message share one download"""
+    cache = MediaCache(cache_dir=str(tmp_path))
+    msg = PosterMessage(b'poster')
+
+    files = await asyncio.gather(cache.get_file(msg), cache.get_file(msg))
+    assert files[0] == files[1]
+    assert (await cache.get_file(msg)).path == files[0].path
+    assert msg.downloads == 1
+    assert cache.stats()['hits'] == 2
+
+    file_box = files[0].to_file_box()
+    assert file_box.name == 'poster.jpg'
+
+
+@pytest.mark.asyncio
+async def test_same_content_is_stored_once(tmp_path):
+    """the same content in different messages takes the disk once"""
+    cache = MediaCache(cache_dir=str(tmp_path))
+    first = await cache.get_file(PosterMessage(b'poster', name='a.jpg'))
+    second = await cache.get_file(PosterMessage(b'poster', name='b.jpg'))
+
+    assert first.path == second.path
+    assert (first.name, second.name) == ('a.jpg', 'b.jpg')
+    assert os.listdir(tmp_path) == [os.path.basename(first.path)]
+    assert cache.stats()['duplicates'] == 1
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction(tmp_path):
+    """the least recently used files are removed under the size cap"""
+    cache = MediaCache(cache_dir=str(tmp_path), max_bytes=10)
+    first_msg = PosterMessage(b'a' * 4)
+    first = await cache.get_file(first_msg)
+    second = await cache.get_file(PosterMessage(b'b' * 4))
+    # touch the first file
+    await cache.get_file(first_msg)
+    third = await cache.get_file(PosterMessage(b'c' * 4))
+
+    assert os.path.exists(first.path) and os.path.exists(third.path)
+    assert not os.path.exists(second.path)
+    assert cache.stats()['evictions'] == 1
+    assert cache.total_bytes == 8
+
+    # the files are indexed again after restarting
+    restarted = MediaCache(cache_dir=str(tmp_path), max_bytes=10)
+    restarted._ensure_loaded()
+    assert restarted.total_bytes == 8
@@ -0,0 +1,69 @@
+"""Unit test for message_controller.py"""
+from __future__ import annotations
+from wechaty import WechatyPlugin
+from wechaty_puppet import MessageType
+
+from antigen_bot.message_controller import MessageController, MessageFeatures, MessageFilter
+
+
+def _features(room_id=None, talker_id='talker', text='hello', is_self=False,
+              type=MessageType.MESSAGE_TYPE_TEXT) -> MessageFeatures:
+    return MessageFeatures(
+        message_id='message-id', is_self=is_self, talker_id=talker_id,
+        room_id=room_id, type=type, text=text
+    )
+
+
+def test_filter_room_and_self():
+    """test the room and self-message filter"""
+    plugin = WechatyPlugin()
+    private_filter = MessageFilter(room=False)
+    assert private_filter.match(plugin, _features())
+    assert not private_filter.match(plugin, _features(room_id='room-id'))
+    assert not private_filter.match(plugin, _features(is_self=True))
+    assert MessageFilter(self_message=True).match(plugin, _features(is_self=True))
+
+
+def test_filter_ids():
+    """test the admin, room and conversation ids filter"""
+    plugin = WechatyPlugin()
+    admin_filter = MessageFilter(admins=lambda _: {'admin'})
+    assert admin_filter.match(plugin, _features(talker_id='admin'))
+    assert not admin_filter.match(plugin, _features())
+
+    room_filter = MessageFilter(room_ids={'room-id'})
+    assert room_filter.match(plugin, _features(room_id='room-id'))
+    assert not room_filter.match(plugin, _features())
+
+    conversation_filter = MessageFilter(conversation_ids={'room-id', 'admin'})
+    assert conversation_filter.match(plugin, _features(room_id='room-id'))
+    assert conversation_filter.match(plugin, _features(talker_id='admin'))
+    assert not conversation_filter.match(plugin, _features(room_id='other-room', talker_id='admin'))
+
+
+def test_filter_types_and_prefixes():
+    """test the message type and text prefix filter"""
+    plugin = WechatyPlugin()
+    message_filter = MessageFilter(types=(MessageType.MESSAGE_TYPE_TEXT,), prefixes=('#log-all-',))
+    assert message_filter.match(plugin, _features(text='#log-all-rooms'))
+    assert not message_filter.match(plugin, _features(text='hello'))
+    assert not message_filter.match(plugin, _features(text='#log-all-rooms', type=MessageType.MESSAGE_TYPE_IMAGE))
+
+
+def test_duplicate_message(tmp_path):
+    """the message id is stored once for all of plugins, and the replayed message is skipped after restarting"""
+    file = str(tmp_path / 'message_ids.db')
+    controller = MessageController()
+    controller.persist_to(file)
+    assert not controller.is_duplicate('message-id', 'plugin-a')
+    assert not controller.is_duplicate('message-id', 'plugin-b')
+    assert controller.is_duplicate('message-id', 'plugin-a')
+    assert len(controller.ids) == 1
+    controller.ids.close()
+
+    restarted = MessageController()
+    restarted.persist_to(file)
+    assert restarted.is_duplicate('message-id', 'plugin-a')
+    assert restarted.is_duplicate('message-id', 'plugin-b')
+    assert not restarted.is_duplicate('other-message-id', 'plugin-a')
+    restarted.ids.close()
@@ -0,0 +1,54 @@
+"""Unit test for message_forwarder.py"""
+import json
+import os
+
+import pytest
+
+from antigen_bot.pacer import send_pacer
+from antigen_bot.plugins.message_forwarder import MessageForwarderPlugin
+
+
+def _write(file, data) -> None:
+    with open(file, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+def test_config_is_cached_until_changed(tmp_path):
+    """the configuration is compiled once and reloaded when the file changes"""
+    config_file = str(tmp_path / 'message_forwarder.json')
+    _write(config_file, dict(admin_ids=['admin'], room_ids=['room-1'], room_regex=['^嘉怡']))
+
+    plugin = MessageForwarderPlugin(config_file=config_file)
+    config = plugin.get_config()
+    assert config.admin_ids == {'admin'}
+    assert config.room_ids == {'room-1'}
+    assert plugin.get_config() is config
+    assert plugin.get_room_matcher() is config.room_matcher
+
+    _write(config_file, dict(admin_ids=['admin', 'other']))
+    os.utime(config_file, ns=(0, 1))
+    config = plugin.get_config()
+    assert config.admin_ids == {'admin', 'other'}
+    assert config.room_matcher is None
+
+    # the broken file keeps the previous configuration
+    with open(config_file, 'w', encoding='utf-8') as f:
+        f.write('{')
+    assert plugin.get_config() is config
+
+
+def test_file_box_interval_seconds_is_deprecated(tmp_path):
+    """the deprecated interval is the min gap of the plugin's own pacer"""
+    config_file = str(tmp_path / 'message_forwarder.json')
+    assert MessageForwarderPlugin(config_file=config_file).broadcaster.pacer is send_pacer
+
+    with pytest.warns(DeprecationWarning):
+        plugin = MessageForwarderPlugin(config_file=config_file, file_box_interval_seconds=2)
+    assert plugin.broadcaster.pacer is not send_pacer
+    assert plugin.broadcaster.pacer.min_gap_seconds == 2
+    assert plugin.broadcaster.pacer.gap_seconds == 2
+
+    # the positional argument of the old signature is still supported
+    with pytest.warns(DeprecationWarning):
+        plugin = MessageForwarderPlugin(None, config_file, 20)
+    assert plugin.broadcaster.pacer.min_gap_seconds == plugin.broadcaster.pacer.max_gap_seconds == 20
@@ -0,0 +1,21 @@
+"""Unit test for metrics.py"""
+from __future__ import annotations
+from antigen_bot.metrics import HandlerMetrics
+
+
+def test_handler_stats():
+    """test the percentile and counters of handler stats"""
+    metrics = HandlerMetrics()
+    stats = metrics.get('DingDongPlugin')
+    for index in range(100):
+        stats.record((index + 1) / 1000)
+    stats.record(2.0, failed=True, slow=True)
+
+    assert metrics.get('DingDongPlugin') is stats
+    summary = metrics.to_dict()['DingDongPlugin']
+    assert summary['calls'] == 101
+    assert summary['exceptions'] == 1
+    assert summary['slow_calls'] == 1
+    assert round(summary['p50_ms']) == 51
+    assert summary['p99_ms'] >= summary['p95_ms'] >= summary['p50_ms']
+    assert summary['max_ms'] == 2000
@@ -0,0 +1,38 @@
+"""Unit test for name_cache.py"""
+from __future__ import annotations
+import pytest
+
+from antigen_bot.name_cache import NameCache
+from benchmarks.fakes import FakeContact, FakeRoom
+
+
+@pytest.mark.asyncio
+async def test_name_cache():
+    """the names should be cached until they are updated or invalidated"""
+    cache = NameCache()
+    room = FakeRoom('room-id', topic='嘉怡3号楼组群')
+    contact = FakeContact('contact-id', name='name', alias='3-301')
+
+    assert await cache.get_topic(room) == '嘉怡3号楼组群'
+    assert await cache.get_name(contact) == '3-301'
+    assert (await cache.get(contact)).name == 'name'
+
+    room.payload.topic = '嘉怡5号楼组群'
+    assert await cache.get_topic(room) == '嘉怡3号楼组群'
+    cache.set_topic('room-id', '嘉怡5号楼组群')
+    assert await cache.get_topic(room) == '嘉怡5号楼组群'
+
+    contact.payload.alias = '3-302'
+    cache.invalidate('contact-id')
+    assert await cache.get_name(contact) == '3-302'
+
+
+def test_observe():
+    """the cache should be populated from the loaded payload"""
+    cache = NameCache()
+    cache.observe(FakeRoom('room-id', topic='嘉怡3号楼组群'))
+    assert cache.store.get('room-id').name == '嘉怡3号楼组群'
+
+    cache.set_topic('room-id', 'new topic')
+    cache.observe(FakeRoom('room-id', topic='嘉怡3号楼组群'))
+    assert cache.store.get('room-id').name == 'new topic'
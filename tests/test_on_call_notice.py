@@ -0,0 +1,124 @@
+"""Unit test for on_call_notice.py"""
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+from antigen_bot.plugins.on_call_notice import OnCallNoticePlugin, _parse_clock, run_scheduled_notice
+from antigen_bot.room_directory import room_directory
+from benchmarks import fakes
+from benchmarks.fakes import FakeBot, FakeContact, FakeMessage, FakeRoom
+
+
+@pytest.fixture
+def plugin_factory(tmp_path):
+    config_file = tmp_path / 'on_call_notice.json'
+    with open(config_file, 'w', encoding='utf-8') as f:
+        json.dump({'admin': {'pre_fix': '嘉怡', '核酸': {'reply': '请下楼做核酸', 'hold': 600}}}, f, ensure_ascii=False)
+
+    def factory() -> OnCallNoticePlugin:
+        return OnCallNoticePlugin(config_file=str(config_file), job_store_url=f'sqlite:///{tmp_path / "jobs.sqlite"}')
+
+    return factory
+
+
+def _bot(plugin):
+    fakes.RPC_LATENCY = 0
+    room_directory.clear()
+    rooms = [FakeRoom(f'notice-room-{number}', f'嘉怡小区{number}号楼') for number in range(1, 5)]
+    return FakeBot(plugins=[plugin], rooms=rooms, contacts=[FakeContact('admin')])
+
+
+def test_parse_clock():
+    now = datetime(2022, 5, 1, 9, 0)
+    assert _parse_clock('18:30', now) == datetime(2022, 5, 1, 18, 30)
+    assert _parse_clock('08:00', now) == datetime(2022, 5, 2, 8, 0)
+    for clock in ['8', '25:00', '八点', 830]:
+        with pytest.raises(ValueError):
+            _parse_clock(clock, now)
+
+
+@pytest.mark.asyncio
+async def test_malformed_preset_is_replied(tmp_path):
+    """the malformed hold or at is replied to the admin instead of raising in on_message"""
+    config_file = tmp_path / 'on_call_notice.json'
+    with open(config_file, 'w', encoding='utf-8') as f:
+        json.dump({'admin': {
+            'pre_fix': '嘉怡', '核酸': {'reply': '请下楼做核酸', 'at': '8'}, '物资': {'reply': '请下楼领物资', 'hold': '十分钟'}
+        }}, f, ensure_ascii=False)
+    plugin = OnCallNoticePlugin(config_file=str(config_file), job_store_url=f'sqlite:///{tmp_path / "jobs.sqlite"}')
+    bot = _bot(plugin)
+    plugin.start_scheduler()
+    admin = bot.contacts['admin']
+
+    await plugin.on_message(FakeMessage(talker=admin, text='核酸 2'))
+    assert '预设【核酸】的定时配置有误' in admin.sent[-1] and '<8>' in admin.sent[-1]
+    await plugin.on_message(FakeMessage(talker=admin, text='物资 2'))
+    assert '预设【物资】的定时配置有误' in admin.sent[-1] and '<十分钟>' in admin.sent[-1]
+
+    assert plugin.get_scheduled_jobs('admin') == []
+    assert not any(room.sent for room in bot.rooms.values())
+    plugin.scheduler.shutdown(wait=False)
+
+
+@pytest.mark.asyncio
+async def test_hold_notice_is_scheduled(plugin_factory):
+    """the delayed notice doesn't block the loop, and can be listed, resumed & cancelled"""
+    plugin = plugin_factory()
+    bot = _bot(plugin)
+    plugin.start_scheduler()
+    admin = bot.contacts['admin']
+
+    start = asyncio.get_event_loop().time()
+    await plugin.on_message(FakeMessage(talker=admin, text='核酸 2-3'))
+    assert asyncio.get_event_loop().time() - start < 1
+    assert '编号' in admin.sent[-1]
+    assert not any(room.sent for room in bot.rooms.values())
+
+    jobs = plugin.get_scheduled_jobs('admin')
+    assert len(jobs) == 1 and {'2', '3'} <= set(jobs[0].kwargs['words'])
+    job_id = jobs[0].id
+
+    await plugin.on_message(FakeMessage(talker=admin, text='定时列表'))
+    assert job_id in admin.sent[-1]
+
+    # the job is persistent after restarting
+    plugin.scheduler.shutdown(wait=False)
+    restarted = plugin_factory()
+    bot = _bot(restarted)
+    restarted.start_scheduler()
+    assert [job.id for job in restarted.get_scheduled_jobs('admin')] == [job_id]
+
+    await restarted.on_message(FakeMessage(talker=bot.contacts['admin'], text=f'取消定时 {job_id}'))
+    assert '已取消' in bot.contacts['admin'].sent[-1]
+    assert restarted.get_scheduled_jobs('admin') == []
+    restarted.scheduler.shutdown(wait=False)
+
+
+@pytest.mark.asyncio
+async def test_run_scheduled_notice(plugin_factory):
+    """the due job sends the notice to the rooms of the buildings"""
+    plugin = plugin_factory()
+    bot = _bot(plugin)
+
+    await run_scheduled_notice(
+        plugin.name, token='admin', talker_id='admin', conversation_id='admin', conversation_type='Contact',
+        pre_fix='嘉怡', words=['2', '3'], reply='请下楼做核酸',
+    )
+    assert [room.room_id for room in bot.rooms.values() if room.sent == ['请下楼做核酸']] == ['notice-room-2', 'notice-room-3']
+    assert plugin.last_loop['admin'] == ['嘉怡小区2号楼', '嘉怡小区3号楼']
+    assert bot.contacts['admin'].sent[-1].startswith('已转发')
+
+
+@pytest.mark.asyncio
+async def test_notice_from_building_index(plugin_factory):
+    """the rooms of the buildings are resolved from the index without the puppet"""
+    plugin = plugin_factory()
+    bot = _bot(plugin)
+    await room_directory.build(list(bot.rooms.values()))
+    bot.rooms.clear()
+
+    rooms = await plugin.resolve_rooms('嘉怡', ['1', '3', '2-3', '转发'])
+    assert [topic for _, topic in rooms] == ['嘉怡小区1号楼', '嘉怡小区3号楼']
+    room_directory.clear()
@@ -0,0 +1,47 @@
+"""Unit test for pacer.py"""
+import time
+
+import pytest
+
+from antigen_bot.pacer import AdaptivePacer
+
+
+def test_aimd_gap():
+    """the gap is decreased additively and increased multiplicatively in [min, max]"""
+    pacer = AdaptivePacer(
+        min_gap_seconds=0.5, max_gap_seconds=4, initial_gap_seconds=1,
+        decrease_step_seconds=0.25, slow_send_seconds=3,
+    )
+    for _ in range(10):
+        pacer.record(0.1, True)
+    assert pacer.gap_seconds == 0.5
+
+    pacer.record(0.1, False)
+    assert pacer.gap_seconds == 1
+    # the slow send is the signal of throttling too
+    pacer.record(3.5, True)
+    assert pacer.gap_seconds == 2
+    for _ in range(5):
+        pacer.record(0.1, False)
+    assert pacer.gap_seconds == 4
+
+    stats = pacer.stats()
+    assert (stats['sends'], stats['failures'], stats['slow_sends']) == (17, 6, 1)
+
+    with pytest.raises(ValueError):
+        AdaptivePacer(min_gap_seconds=2, max_gap_seconds=1)
+
+
+@pytest.mark.asyncio
+async def test_wait_spaces_the_sends():
+    """the sends are spaced by the gap from the end of the previous send"""
+    pacer = AdaptivePacer(min_gap_seconds=0.05, initial_gap_seconds=0.05, decrease_step_seconds=0)
+
+    start = time.monotonic()
+    await pacer.wait()
+    assert time.monotonic() - start < 0.04
+
+    pacer.record(0, True)
+    await pacer.wait()
+    await pacer.wait()
+    assert time.monotonic() - start >= 0.09
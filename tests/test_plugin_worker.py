@@ -0,0 +1,75 @@
+"""Unit test for plugin_worker.py"""
+from __future__ import annotations
+import asyncio
+import logging
+
+import pytest
+
+from antigen_bot.metrics import HandlerStats
+from antigen_bot.plugin_worker import IsolationOptions, PluginWorker
+
+
+def _worker(**kwargs) -> PluginWorker:
+    return PluginWorker('TestPlugin', IsolationOptions(**kwargs), HandlerStats(), logging.getLogger('test'))
+
+
+@pytest.mark.asyncio
+async def test_worker_keeps_order():
+    """the jobs of one plugin should be handled in order"""
+    worker = _worker()
+    handled = []
+
+    def make_job(index):
+        async def job():
+            await asyncio.sleep(0.001 * (5 - index))
+            handled.append(index)
+        return job
+
+    for index in range(5):
+        await worker.submit(make_job(index))
+    await worker.join()
+    worker.stop()
+    assert handled == list(range(5))
+
+
+@pytest.mark.asyncio
+async def test_worker_timeout():
+    """the slow handler should be cancelled and counted"""
+    worker = _worker(timeout_seconds=0.01)
+
+    async def slow_job():
+        await asyncio.sleep(1)
+
+    await worker.submit(slow_job)
+    await worker.join()
+    worker.stop()
+    assert worker.stats.timeouts == 1
+
+
+@pytest.mark.asyncio
+async def test_worker_overflow():
+    """the overflow policy should decide which message is dropped"""
+    for overflow, expected in [('drop_oldest', [0, 2, 3]), ('drop_newest', [0, 1, 2])]:
+        worker = _worker(queue_size=2, overflow=overflow)
+        handled = []
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        def make_job(index):
+            async def job():
+                if index == 0:
+                    started.set()
+                    await release.wait()
+                handled.append(index)
+            return job
+
+        await worker.submit(make_job(0))
+        await started.wait()
+        for index in range(1, 4):
+            await worker.submit(make_job(index))
+        release.set()
+        await worker.join()
+        worker.stop()
+
+        assert handled == expected
+        assert worker.stats.dropped == 1
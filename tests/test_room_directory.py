@@ -0,0 +1,55 @@
+"""Unit test for room_directory.py"""
+from datetime import datetime
+
+import pytest
+
+from antigen_bot.matcher import Matcher, MatcherOption
+from antigen_bot.plugins.room_directory import RoomDirectoryPlugin
+from antigen_bot.room_directory import RoomDirectory, room_directory
+from benchmarks import fakes
+from benchmarks.fakes import FakeBot, FakeRoom
+
+
+@pytest.mark.asyncio
+async def test_room_directory_indexes():
+    """the id & topic indexes are updated incrementally"""
+    directory = RoomDirectory()
+    changes = []
+    directory.add_listener(lambda room, topic, old_topic: changes.append((room.room_id, topic, old_topic)))
+
+    fakes.RPC_LATENCY = 0
+    rooms = [FakeRoom(f'room-{index}', topic=f'嘉怡{index}号楼组群') for index in range(3)]
+    await directory.build(rooms)
+    assert directory.ready and len(directory) == 3
+
+    directory.set_room(rooms[0], '水岸1号楼组群')
+    assert directory.find_by_topic('嘉怡0号楼组群') == []
+    assert directory.find_by_topic('水岸1号楼组群') == [rooms[0]]
+
+    directory.remove_room('room-1')
+    assert 'room-1' not in directory
+    assert changes[-2:] == [('room-0', '水岸1号楼组群', '嘉怡0号楼组群'), ('room-1', None, '嘉怡1号楼组群')]
+
+    matcher = Matcher([MatcherOption(text='^嘉怡', type='regex'), MatcherOption(text='room-0', type='id_or_name')])
+    assert await directory.match(matcher) == [rooms[0], rooms[2]]
+
+
+@pytest.mark.asyncio
+async def test_room_directory_plugin():
+    """the rooms are added or removed only when the bot joins or leaves"""
+    fakes.RPC_LATENCY = 0
+    plugin = RoomDirectoryPlugin()
+    bot = FakeBot(plugins=[plugin], rooms=[FakeRoom('room-1', topic='嘉怡1号楼组群')])
+    room_directory.clear()
+    await plugin.build()
+    assert 'room-1' in room_directory
+
+    new_room = FakeRoom('room-2', topic='嘉怡2号楼组群')
+    await plugin.on_room_join(new_room, [bot.contacts['bot-self']], bot.self_contact, datetime.now())
+    assert room_directory.get('room-2') is new_room
+
+    await plugin.on_room_leave(new_room, [bot.self_contact], bot.self_contact, datetime.now())
+    assert 'room-2' not in room_directory
+
+    await plugin.on_logout(bot.self_contact)
+    assert not room_directory.ready and len(room_directory) == 0
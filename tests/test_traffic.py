@@ -0,0 +1,107 @@
+"""Unit test for traffic.py"""
+from __future__ import annotations
+import gzip
+import json
+
+import pytest
+
+from antigen_bot.forward_config import load_from_excel
+from antigen_bot.plugins.traffic_recorder import TrafficRecorderPlugin
+from antigen_bot.traffic import TraceEvent, TraceWriter, anonymize, read_trace
+from benchmarks import fakes
+from benchmarks.bench_plugin_stack import write_conv_config
+from benchmarks.fakes import FakeBot, FakeContact, FakeMessage, FakeRoom
+from benchmarks.replay import find_admins
+
+
+def test_anonymize():
+    """the anonymous id should be stable and depend on the salt"""
+    assert anonymize('wxid_xxx') == anonymize('wxid_xxx')
+    assert anonymize('wxid_xxx') != anonymize('wxid_xxx', salt='salt')
+    assert 'wxid' not in anonymize('wxid_xxx')
+    assert anonymize('') == ''
+
+
+def test_read_trace(tmp_path):
+    """the events should be loaded from the compact trace file"""
+    file = str(tmp_path / 'trace.jsonl.gz')
+    events = [
+        TraceEvent(offset=0, type=6, talker_id='a', room_id='r', topic='嘉怡3号楼组群', text='hello', mention_ids=['b']),
+        TraceEvent(offset=1.5, type=2, talker_id='b'),
+    ]
+    with gzip.open(file, 'wt', encoding='utf-8') as handler:
+        for event in events:
+            handler.write(json.dumps(event.to_dict(), ensure_ascii=False) + '\n')
+
+    assert list(read_trace(file)) == events
+
+
+def test_read_unclosed_trace(tmp_path):
+    """the trace of a killed bot is read until the truncated tail"""
+    file = str(tmp_path / 'trace.jsonl.gz')
+    events = [TraceEvent(offset=index, type=6, talker_id=f'talker-{index}', text='hello') for index in range(3)]
+
+    handler = gzip.open(file, 'wt', encoding='utf-8')
+    for event in events:
+        handler.write(json.dumps(event.to_dict(), ensure_ascii=False) + '\n')
+    handler.flush()
+    # the process is killed before closing the file, so there is no end-of-stream marker
+    with open(file, 'rb') as f:
+        unclosed = f.read()
+    handler.close()
+    with open(file, 'wb') as f:
+        f.write(unclosed)
+
+    assert list(read_trace(file)) == events
+
+
+def test_trace_writer_flushes_members(tmp_path):
+    """every flushed batch is readable without closing the writer"""
+    file = str(tmp_path / 'trace.jsonl.gz')
+    fakes.RPC_LATENCY = 0
+    bot = FakeBot(rooms=[FakeRoom('room', '嘉怡3号楼组群')], contacts=[FakeContact('resident')])
+
+    writer = TraceWriter(file, flush_every=2)
+    for text in ('a', 'b', 'c'):
+        writer.record(FakeMessage(talker=bot.contacts['resident'], room=bot.rooms['room'], text=text))
+    assert [event.text for event in read_trace(file)] == ['a', 'b']
+
+    # the partially written member of a killed writer is skipped
+    writer.close()
+    with open(file, 'ab') as f:
+        f.write(gzip.compress(b'{"t": 9, "ty": 6, "f": "x"}\n')[:12])
+    assert [event.text for event in read_trace(file)] == ['a', 'b', 'c']
+
+
+@pytest.mark.asyncio
+async def test_admins_survive_anonymization(tmp_path):
+    """the configured admins and bot are recorded with the stable aliases, which the replay config authorizes"""
+    file = str(tmp_path / 'trace.jsonl.gz')
+    fakes.RPC_LATENCY = 0
+    bot = FakeBot(
+        rooms=[FakeRoom('admin-room', '居委会工作群'), FakeRoom('room', '嘉怡3号楼组群')],
+        contacts=[FakeContact('wxid_admin'), FakeContact('resident')]
+    )
+    plugin = TrafficRecorderPlugin(trace_file=file, salt='salt', admin_ids=['wxid_admin', 'admin-room'])
+    await plugin.on_login(bot.self_contact)
+    await plugin.on_message(FakeMessage(talker=bot.contacts['wxid_admin'], text='今天下午发物资'))
+    await plugin.on_message(FakeMessage(
+        talker=bot.contacts['resident'], room=bot.rooms['admin-room'], text='@AntigenBot 收到',
+        mention_ids=['bot-self']
+    ))
+    await plugin.on_message(FakeMessage(talker=bot.contacts['resident'], room=bot.rooms['room'], text='hello'))
+    await plugin.on_logout(bot.self_contact)
+
+    events = list(read_trace(file))
+    assert events[0].talker_id == 'admin-0'
+    assert (events[1].room_id, events[1].mention_ids) == ('admin-1', ['bot-self'])
+    assert events[2].room_id == anonymize('room', 'salt')
+    assert find_admins(events) == (['admin-0'], ['admin-1'])
+
+    conv_config_file = str(tmp_path / 'conv2convs_config.xlsx')
+    write_conv_config(conv_config_file, *find_admins(events))
+    admins = {
+        conversation.id: conversation.type
+        for config in load_from_excel(conv_config_file, snapshot_dir=None) for conversation in config.admins.values()
+    }
+    assert admins == {'admin-0': 'Contact', 'admin-1': 'Room'}
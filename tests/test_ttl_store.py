@@ -0,0 +1,52 @@
+"""Unit test for ttl_store.py"""
+from __future__ import annotations
+import time
+
+from antigen_bot.ttl_store import SqliteBackend, TTLStore
+
+
+def test_add_and_exist():
+    """test the de-duplication of keys"""
+    store = TTLStore(ttl_seconds=60, max_size=10)
+    assert not store.add('a')
+    assert store.add('a')
+    assert 'a' in store
+    assert 'b' not in store
+
+
+def test_max_size():
+    """the oldest entries should be evicted"""
+    store = TTLStore(ttl_seconds=60, max_size=3)
+    for key in ['a', 'b', 'c', 'd']:
+        store.add(key)
+    assert len(store) == 3
+    assert 'a' not in store
+    assert 'd' in store
+
+
+def test_expire(monkeypatch):
+    """the expired entries should be swept"""
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now)
+    store = TTLStore(ttl_seconds=10, max_size=100)
+    store['a'] = ['plugin']
+    assert store['a'] == ['plugin']
+
+    monkeypatch.setattr(time, 'time', lambda: now + 11)
+    assert 'a' not in store
+    assert store.get('a') is None
+
+    store.add('b')
+    assert len(store) == 1
+
+
+def test_sqlite_backend(tmp_path):
+    """the entries should survive the restarting"""
+    file = str(tmp_path / 'ids.db')
+    store = TTLStore(ttl_seconds=60, max_size=100, backend=SqliteBackend(file))
+    store.add('message-id')
+    store.close()
+
+    store = TTLStore(ttl_seconds=60, max_size=100, backend=SqliteBackend(file))
+    assert store.add('message-id')
+    store.close()